@@ -0,0 +1,176 @@
+"""
+Benchmark del costo de arranque de cada comando de main.py.
+
+Cada medición corre en un intérprete nuevo: importa main.py y los módulos
+que el comando carga al ejecutarse (sin ejecutarlo) y reporta el tiempo de
+import y la cantidad de módulos cargados. Falla (código 1) si un comando
+supera su presupuesto de tiempo o carga un módulo pesado que no necesita
+(pywinrm, requests, cryptography, smtplib, el reporte HTML...).
+
+Uso:
+    python bench_startup.py                      # todos los comandos, 5 repeticiones
+    python bench_startup.py --budget query=40    # presupuesto en ms para un comando
+    python bench_startup.py --detail run         # top de módulos por tiempo (-X importtime)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que no debe cargar un comando que no recolecta
+HEAVY = ("winrm", "requests", "cryptography", "spnego", "smtplib", "email.mime", "monitor.report_html")
+
+# Comando -> (módulos que importa al ejecutarse, módulos prohibidos)
+COMMANDS = {
+    "query": (("monitor.query",), HEAVY + ("monitor.collectors",)),
+    "backtest": (("monitor.backtest",), HEAVY + ("monitor.collectors",)),
+    "serve": (("monitor.api_server",), HEAVY + ("monitor.collectors",)),
+    "exporter": (
+        ("monitor.archive", "monitor.collectors", "monitor.config_loader", "monitor.exporter", "monitor.sessions"),
+        HEAVY,
+    ),
+    "worker": (
+        (
+            "monitor.collectors", "monitor.registry", "monitor.remote_jobs", "monitor.sessions",
+            "monitor.work_queue",
+        ),
+        ("winrm", "requests", "cryptography", "spnego", "smtplib", "monitor.report_html"),
+    ),
+    # pywinrm se carga al abrir la primera sesión real, no al arrancar
+    "run": (
+        (
+            "monitor.analyzers", "monitor.archive", "monitor.binary_index", "monitor.checkpoint",
+            "monitor.collectors", "monitor.correlation", "monitor.forecast", "monitor.models",
+            "monitor.planner", "monitor.profiling", "monitor.registry", "monitor.remote_jobs",
+            "monitor.scheduler", "monitor.service_inventory", "monitor.sessions", "monitor.state_store",
+        ),
+        ("winrm", "requests", "cryptography", "spnego", "smtplib", "monitor.report_html"),
+    ),
+}
+
+DEFAULT_BUDGET_MS = 150
+
+_PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+import main
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "modules": len(sys.modules),
+    "forbidden": [m for m in {forbidden!r} if m in sys.modules],
+}}))
+"""
+
+
+def _probe_code(command: str) -> str:
+    modules, forbidden = COMMANDS[command]
+    return _PROBE.format(modules=modules, forbidden=forbidden)
+
+
+def measure(command: str, repeat: int) -> dict:
+    """Mejor de `repeat` ejecuciones (import y proceso completo) en un intérprete nuevo."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", _probe_code(command)],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        process_ms = (time.perf_counter() - started) * 1000
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["process_ms"] = process_ms
+        if best is None or result["import_ms"] < best["import_ms"]:
+            best = result
+    return best
+
+
+def measure_baseline(repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def import_detail(command: str, top: int = 15) -> list:
+    """Módulos con más tiempo acumulado de import (python -X importtime)."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _probe_code(command)],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de arranque de los comandos de main.py")
+    parser.add_argument("commands", nargs="*", metavar="CMD",
+                        help=f"Comandos a medir: {', '.join(COMMANDS)} (por defecto todos)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", action="append", default=[], metavar="CMD=MS",
+                        help=f"Presupuesto de import en ms por comando (por defecto {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--detail", metavar="CMD", choices=list(COMMANDS), default=None,
+                        help="Mostrar los módulos más lentos de un comando")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+    unknown = [c for c in args.commands if c not in COMMANDS]
+    if unknown:
+        parser.error(f"comando desconocido: {', '.join(unknown)}")
+
+    if args.detail:
+        for cumulative_us, name in import_detail(args.detail):
+            print(f"{cumulative_us / 1000:9.1f} ms  {name}")
+        return 0
+
+    budgets = {c: DEFAULT_BUDGET_MS for c in COMMANDS}
+    for item in args.budget:
+        command, _, ms = item.partition("=")
+        budgets[command] = float(ms)
+
+    baseline = measure_baseline(args.repeat)
+    results = []
+    failed = False
+    for command in args.commands or list(COMMANDS):
+        r = measure(command, args.repeat)
+        ok = r["import_ms"] <= budgets[command] and not r["forbidden"]
+        failed |= not ok
+        results.append({
+            "command": command,
+            "import_ms": round(r["import_ms"], 1),
+            "process_ms": round(r["process_ms"], 1),
+            "budget_ms": budgets[command],
+            "modules": r["modules"],
+            "forbidden": r["forbidden"],
+            "ok": ok,
+        })
+
+    if args.json:
+        print(json.dumps({"python_startup_ms": round(baseline, 1), "commands": results}, indent=2))
+    else:
+        print(f"Arranque del intérprete (python -c pass): {baseline:.1f} ms")
+        print(f"{'Comando':<10}{'Import (ms)':>13}{'Proceso (ms)':>14}{'Límite':>9}{'Módulos':>9}  Estado")
+        for r in results:
+            status = "OK" if r["ok"] else "FALLA"
+            if r["forbidden"]:
+                status += f" (carga {', '.join(r['forbidden'])})"
+            print(f"{r['command']:<10}{r['import_ms']:>13}{r['process_ms']:>14}{r['budget_ms']:>9g}{r['modules']:>9}  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,163 +1,713 @@
-from monitor.config_loader import load_config
-from monitor.state_store import load_state, save_state
-from monitor.collectors import (
-    create_session,
-    get_system_resources,
-    get_critical_services_status,
-    get_recent_events,
-    get_security_updates_status,
-    get_active_connections,
-    get_critical_events_summary,
-    get_paths_size,
-    get_unsigned_or_invalid_binaries,   # <--- NUEVO
-)
-
-from monitor.analyzers import (
-    summarize_logons,
-    evaluate_resources,
-    summarize_connections,
-    summarize_critical_events,
-    evaluate_log_growth,
-    compute_risk_score,
-)
-from monitor.report_html import build_html_report
-from monitor.mailer import send_html_email
-
-
-def run_daily_monitor():
+from __future__ import annotations
+
+from monitor.config_loader import load_config, load_monitor_config
+from datetime import datetime
+import argparse
+import json
+import threading
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from monitor.sessions import SessionCache
+
+# Punto de entrada. Aquí solo se importa lo liviano: cada comando importa
+# sus módulos al ejecutarse, de modo que "query", "backtest" o "serve" no
+# cargan la recolección, el reporte ni el correo, y pywinrm (requests,
+# cryptography, NTLM/spnego) se carga recién al abrir la primera sesión
+# WinRM real. bench_startup.py mide y controla el costo de arranque de
+# cada comando.
+
+
+def build_error_server_data(name: str) -> dict:
+    from monitor.registry import default_outputs
+
+    # En caso de error, generamos un registro mínimo pero igualmente visible
+    # (cada check registrado aporta los valores por defecto de sus secciones)
+    return {"name": name, **default_outputs()}
+
+
+def collect_server(s: dict, prev_server_state: dict, thresholds: dict, depth: str = "deep",
+                   previous_snapshot: dict = None, max_shells: int = 1, session_cache: SessionCache = None,
+                   shared: dict = None):
+    """
+    Recolecta y evalúa un servidor. Devuelve (server_data, new_server_state).
+    En modo "light" solo se ejecutan los checks livianos (recursos y
+    servicios); el resto de las secciones se reutiliza del último snapshot
+    archivado (si existe).
+    """
+    from monitor.analyzers import compute_risk_score
+    from monitor.registry import FLEET_OUTPUTS, CheckContext, execute_checks, get_checks, risk_rules
+    from monitor.sessions import SessionCache
+
+    name = s["Name"]
+
+    session_cache = session_cache or SessionCache()
+
+    # Partimos de la última recolección (modo liviano) o de un registro vacío.
+    # Las salidas de las etapas de flota (campañas, pronóstico, binarios
+    # nuevos) no se heredan: las vuelve a calcular esta ejecución
+    server_data = build_error_server_data(name)
+    reused_from = None
+    if depth != "deep" and previous_snapshot:
+        reused_from = previous_snapshot.get("collected_at")
+        for key, value in previous_snapshot.items():
+            if key not in ("name", "risk", "collection", "collected_at") and key not in FLEET_OUTPUTS:
+                server_data[key] = value
+    new_server_state = dict(prev_server_state)
+
+    ctx = CheckContext(
+        server_conf=s,
+        thresholds=thresholds,
+        prev_state=prev_server_state,
+        new_state=new_server_state,
+        shared=shared or {},
+    )
+    server_data.update(execute_checks(
+        get_checks(depth),
+        lambda: session_cache.acquire(s),
+        ctx,
+        max_shells=max_shells,
+        release_session=lambda session, ok: session_cache.release(s, session, ok),
+    ))
+
+    server_data["collection"] = {"status": "ok", "depth": depth, "reused_from": reused_from}
+
+    # Resumen de riesgo
+    server_data["risk"] = compute_risk_score(server_data, thresholds, rules=risk_rules())
+    return server_data, new_server_state
+
+
+def run_collection_job(s: dict, prev_server_state: dict, thresholds: dict, depth: str, run_ts: str,
+                       previous_snapshot: dict = None, max_shells: int = 1, session_cache: SessionCache = None,
+                       shared: dict = None):
+    """
+    collect_server más la actualización del estado del servidor. La usan
+    la recolección local y los workers de la cola (monitor/work_queue.py).
+    """
+    from monitor.planner import update_change_history
+
+    started = time.monotonic()
+    server_data, new_server_state = collect_server(
+        s, prev_server_state, thresholds, depth=depth,
+        previous_snapshot=previous_snapshot, max_shells=max_shells,
+        session_cache=session_cache, shared=shared,
+    )
+    server_data["collected_at"] = run_ts
+
+    # Actualizar estado para este servidor
+    print(f"  - Actualizando estado del servidor {s['Name']}...")
+    if depth == "deep":
+        new_server_state["last_deep"] = run_ts
+    new_server_state["collect_seconds"] = round(time.monotonic() - started, 1)
+    update_change_history(prev_server_state, new_server_state, server_data, run_ts)
+    return server_data, new_server_state
+
+
+def build_failed_server_data(name: str, thresholds: dict, error: str) -> dict:
+    from monitor.analyzers import compute_risk_score
+    from monitor.registry import risk_rules
+
+    server_data = build_error_server_data(name)
+    server_data["collection"] = {"status": "error", "error": error}
+    server_data["risk"] = compute_risk_score(server_data, thresholds, rules=risk_rules())
+    return server_data
+
+
+# Objetos compartidos de la ejecución cuyo aporte por servidor se guarda en el checkpoint
+INVENTORY_STORES = ("binary_index", "service_inventory")
+
+
+def run_daily_monitor(send_email: bool = True, monitor_config=None, session_cache: SessionCache = None,
+                      resume: bool = False):
+    from monitor.analyzers import compute_risk_score
+    from monitor.archive import archive_run, load_snapshot
+    from monitor.binary_index import BinaryIndex, apply_new_binaries
+    from monitor.checkpoint import RunCheckpoint
+    from monitor.collectors import configure_transfer, transfer_stats
+    from monitor.correlation import apply_campaigns, correlate_failed_logons
+    from monitor.forecast import ForecastStore, forecast_fleet
+    from monitor.models import ServerResult
+    from monitor.planner import plan_collection
+    from monitor import profiling
+    from monitor.profiling import stage
+    from monitor.registry import load_plugins, risk_rules
+    from monitor.remote_jobs import RemoteJobRunner
+    from monitor.scheduler import run_scheduled
+    from monitor.service_inventory import ServiceInventoryStore
+    from monitor.sessions import SessionCache
+    from monitor.state_store import load_state, save_state
+    from monitor.work_queue import WorkQueue, run_queued
 
     print("Iniciando monitoreo diario de servidores Windows...")
     print("---------------------------------------------------")
-    print("Cargando configuración...")
-    config = load_config()
+    if monitor_config is None:
+        print("Cargando configuración...")
+        monitor_config = load_monitor_config()
+    config = monitor_config.raw
     smtp_conf = config["Smtp"]
     servers_conf = config["Servers"]
-    thresholds = config.get("Thresholds", {})
+    run_ts = datetime.utcnow().replace(microsecond=0).isoformat()
+
+    collectors_conf = config.get("Collectors", {})
+    load_plugins(collectors_conf.get("Plugins", []))
+    max_shells = collectors_conf.get("MaxShellsPerHost", 1)
+    configure_transfer(collectors_conf.get("CompressOutput", False))
+    transfer_stats.reset()
 
-    state = load_state(config)         # estado anterior
-    new_state_servers = {}            # para guardar nuevo estado
-    all_data = []
+    # Sesiones WinRM reutilizables; el exportador pasa su propia caché para
+    # conservarlas entre recolecciones
+    owns_cache = session_cache is None
+    if owns_cache:
+        session_cache = SessionCache(config.get("Auth", {}), max_idle_per_host=max_shells)
 
-    for s in servers_conf:
+    with stage("setup"):
+        # Cada servidor terminado queda en el checkpoint; con resume se
+        # retoma la ejecución interrumpida (mismo run_ts)
+        checkpoint = RunCheckpoint.start(config, run_ts, resume=resume)
+        run_ts = checkpoint.run_ts
+
+        state = load_state(config)         # estado anterior
+        new_state_servers = {}            # para guardar nuevo estado
+        all_data = []
+
+        queue = None
+        queue_conf = config.get("WorkQueue", {})
+        if queue_conf.get("Enabled"):
+            # validate_config rechaza BinaryInventory / ServiceInventory con la cola
+            queue = WorkQueue(config)
+
+        # Objetos compartidos por todos los servidores de la ejecución
+        shared = {}
+        inventory_conf = config.get("BinaryInventory", {})
+        if inventory_conf.get("Enabled"):
+            shared["binary_index"] = BinaryIndex(
+                config, run_ts, wait_seconds=inventory_conf.get("WaitSeconds", 300)
+            )
+        if config.get("ServiceInventory", {}).get("Enabled"):
+            shared["service_inventory"] = ServiceInventoryStore(config, run_ts)
+        perf_conf = collectors_conf.get("PerfCounters", {})
+        if perf_conf.get("Enabled"):
+            shared["perf_counters"] = perf_conf
+        remote_jobs_conf = config.get("RemoteJobs", {})
+        if remote_jobs_conf.get("Enabled"):
+            shared["remote_jobs"] = RemoteJobRunner(remote_jobs_conf)
+
+        # El costo de cada check depende de los modos activos (objetos compartidos)
+        plan = plan_collection(servers_conf, state, config.get("Planner", {}), shared=shared)
+
+        # Servidores ya recolectados (checkpoint): sus aportes a los inventarios
+        for name, inventory in checkpoint.inventory.items():
+            for key, data in inventory.items():
+                if key in shared:
+                    shared[key].replay(name, data)
+
+    def inventory_for(name):
+        # Lo que el servidor aportó a los inventarios de la ejecución, para el checkpoint
+        inventory = {}
+        for key in INVENTORY_STORES:
+            if key in shared:
+                data = shared[key].checkpoint_data(name)
+                if data:
+                    inventory[key] = data
+        return inventory
+
+    def monitor_server(s):
         name = s["Name"]
-        print(f"Analizando servidor: {name}")
+        if name in checkpoint.completed:
+            print(f"Servidor ya recolectado en esta ejecución (checkpoint): {name}")
+            return checkpoint.completed[name]
+        depth = plan[name]["depth"]
+        print(f"Analizando servidor: {name} (recolección {depth}: {plan[name]['reason']})")
         prev_server_state = state.get("servers", {}).get(name, {})
-        prev_log_sizes = prev_server_state.get("log_sizes", {})
         try:
-            session = create_session(
-                host=s["Host"],
-                username=s["Username"],
-                password=s["Password"]
+            server_data, new_server_state = run_collection_job(
+                s, prev_server_state, monitor_config.thresholds_for(name), depth, run_ts,
+                previous_snapshot=previous_snapshot_for(name, depth), max_shells=max_shells,
+                session_cache=session_cache, shared=shared,
             )
-
-            # Recursos
-            print("  - Obteniendo recursos del sistema...")
-            resources = get_system_resources(session)
-            res_eval = evaluate_resources(resources, thresholds)
-
-            # Eventos de seguridad y logons
-            print("  - Obteniendo eventos de seguridad...")
-            events_sec = get_recent_events(session, "Security", 24, 300)
-            logons = summarize_logons(events_sec)
-
-            # Servicios críticos
-            print("  - Verificando servicios críticos...")
-            services = get_critical_services_status(session, s.get("CriticalServices", []))
-
-            # Actualizaciones
-            print("  - Verificando actualizaciones de seguridad...")
-            updates = get_security_updates_status(session)
-
-            # Conexiones activas
-            print("  - Obteniendo conexiones activas...")
-            connections = get_active_connections(session, max_results=200)
-            conn_summary = summarize_connections(connections)
-
-            # Eventos críticos (System/Application/Security)
-            print("  - Obteniendo resumen de eventos críticos...")
-            crit_raw = get_critical_events_summary(session, hours=24, max_events_per_log=200)
-            crit_summary = summarize_critical_events(crit_raw)
-
-            # Tamaños de logs
-            print("  - Evaluando crecimiento de logs...")
-            log_paths = s.get("LogPaths", [])
-            current_log_sizes = get_paths_size(session, log_paths)
-            log_growth = evaluate_log_growth(current_log_sizes, prev_log_sizes, thresholds)
-
-            # Binarios sin firma / firma inválida
-            print("  - Buscando binarios sin firma o con firma inválida...")
-            unsigned_bins = get_unsigned_or_invalid_binaries(session, check_processes=True, max_items=200)
-            
-            # Compilar datos del servidor
-            server_data = {
-                "name": name,
-                "resources": resources,
-                "resources_eval": res_eval,
-                "logons": logons,
-                "services": services,
-                "updates": updates,
-                "connections_summary": conn_summary,
-                "critical_events_raw": crit_raw,
-                "critical_events_summary": crit_summary,
-                "log_growth": log_growth,
-                "unsigned_binaries": unsigned_bins,   # <--- NUEVO
-            }
-
-            # Resumen de riesgo
-            risk = compute_risk_score(server_data)
-            server_data["risk"] = risk
-
-            all_data.append(server_data)
-
-            # Actualizar estado para este servidor
-            print("  - Actualizando estado del servidor...")
-            new_state_servers[name] = {
-                "log_sizes": current_log_sizes
-            }
-
             print(f"Analisis de {name} completado.\n")
+            return server_data, new_server_state
         except Exception as ex:
             print(f"Error monitoreando {name}: {ex}")
-            # En caso de error, generamos un registro mínimo pero igualmente visible
-            server_data = {
-                "name": name,
-                "resources": {},
-                "resources_eval": {"cpu_status": "critical", "mem_status": "critical", "disk_warnings": []},
-                "logons": {"logons_ok_count": 0, "logons_fail_count": 0, "logons_fail_samples": []},
-                "services": [],
-                "updates": {"PendingCount": None, "PendingSecurityCount": None, "PendingTitles": [], "RecentInstalled": []},
-                "connections_summary": {"total": 0, "by_state": {}},
-                "critical_events_raw": {},
-                "critical_events_summary": {"total": 0, "per_log": {}},
-                "log_growth": {"global_status": "unknown", "details": []},
-                "unsigned_binaries": [],   # <--- NUEVO
-            }
-            risk = compute_risk_score(server_data)
-            server_data["risk"] = risk
-            all_data.append(server_data)
-
-            # mantenemos estado anterior si hubo error
-            print("  - Manteniendo estado previo del servidor debido a error.")
-            new_state_servers[name] = prev_server_state
+            return failed_server(s, str(ex))
+
+    def accept_server(s, result):
+        # El scheduler lo llama solo con resultados llegados antes del plazo
+        name = s["Name"]
+        server_data, new_server_state = result
+        if name in checkpoint.completed or (server_data.get("collection") or {}).get("status") != "ok":
+            return
+        checkpoint.record(name, server_data, new_server_state, inventory=inventory_for(name))
+
+    def previous_snapshot_for(name, depth):
+        # Las recolecciones livianas parten del último snapshot archivado
+        if depth == "deep":
+            return None
+        try:
+            previous_snapshot = load_snapshot(config, name)
+        except Exception as ex:
+            print(f"  - No se pudo leer el último snapshot archivado: {ex}")
+            return None
+        if previous_snapshot and (previous_snapshot.get("collection") or {}).get("status", "ok") != "ok":
+            return None
+        return previous_snapshot
+
+    def failed_server(s, error):
+        name = s["Name"]
+        # mantenemos estado anterior si hubo error
+        print(f"  - Manteniendo estado previo de {name} debido a error.")
+        return (
+            build_failed_server_data(name, monitor_config.thresholds_for(name), error),
+            state.get("servers", {}).get(name, {}),
+        )
+
+    def queued_job(s):
+        name = s["Name"]
+        depth = plan[name]["depth"]
+        return {
+            "depth": depth,
+            "reason": plan[name]["reason"],
+            "thresholds": monitor_config.thresholds_for(name),
+            "prev_state": state.get("servers", {}).get(name, {}),
+            "previous_snapshot": previous_snapshot_for(name, depth),
+        }
+
+    def queued_failed(s, error):
+        print(f"Error monitoreando {s['Name']} (cola de trabajo): {error}")
+        return failed_server(s, error or "Error desconocido en el worker")
+
+    def queued_done(name, server_data, new_server_state):
+        print(f"Resultado recibido de la cola: {name}")
+        checkpoint.record(name, server_data, new_server_state)
+
+    def skip_server(s):
+        name = s["Name"]
+        print(f"Servidor omitido por plazo de ejecución: {name}")
+        server_data = build_error_server_data(name)
+        server_data["collection"] = {"status": "skipped"}
+        server_data["risk"] = {
+            "score": 0,
+            "level": "SKIPPED",
+            "notes": ["Omitido: se alcanzó el plazo máximo de la ejecución."],
+        }
+        return server_data, state.get("servers", {}).get(name, {})
+
+    try:
+        with stage("collect"):
+            if queue is not None:
+                # Modo coordinador: los workers recolectan, aquí solo se esperan los resultados
+                results = run_queued(
+                    queue, run_ts, servers_conf, state, config.get("Scheduler", {}),
+                    queued_job, queued_failed, skip_server, done_fn=queued_done,
+                    poll_seconds=queue_conf.get("PollSeconds", 2), completed=checkpoint.completed,
+                )
+            else:
+                results = run_scheduled(
+                    servers_conf, state, config.get("Scheduler", {}), monitor_server, skip_server,
+                    accept_fn=accept_server,
+                )
+    finally:
+        if owns_cache:
+            session_cache.close_all()
+
+    transfer = transfer_stats.snapshot()
+    if transfer["compressed_calls"]:
+        print(
+            f"Salida comprimida: {transfer['raw_bytes'] / 1024:.0f} KiB en "
+            f"{transfer['wire_bytes'] / 1024:.0f} KiB (ratio {transfer['ratio']}, "
+            f"{transfer['compressed_calls']}/{transfer['calls']} llamadas, {transfer['fallbacks']} sin compresión)"
+        )
+
+    with stage("fleet"):
+        # El reporte y el estado conservan el orden de la configuración
+        servers_dicts = []
+        for s in servers_conf:
+            server_data, new_server_state = results.pop(s["Name"])
+            servers_dicts.append(server_data)
+            new_state_servers[s["Name"]] = new_server_state
+
+        # Correlación de logons fallidos entre servidores (y ejecuciones previas)
+        campaigns, logon_history = correlate_failed_logons(
+            servers_dicts, state.get("logon_correlation"), config.get("Correlation", {}), run_ts
+        )
+        if campaigns:
+            print(f"Campañas distribuidas de logons fallidos detectadas: {len(campaigns)}")
+        affected = apply_campaigns(servers_dicts, campaigns)
+
+        # Diff del inventario de binarios de la flota contra la ejecución anterior
+        new_binaries = []
+        binary_index = shared.get("binary_index")
+        if binary_index is not None:
+            new_binaries = binary_index.new_binaries()
+            if new_binaries:
+                print(f"Binarios nuevos en la flota: {len(new_binaries)}")
+            try:
+                binary_index.save()
+            except Exception as ex:
+                print(f"Error guardando el inventario de binarios: {ex}")
+        apply_new_binaries(servers_dicts, new_binaries)
+
+        if "service_inventory" in shared:
+            try:
+                shared["service_inventory"].save()
+            except Exception as ex:
+                print(f"Error guardando el inventario de servicios: {ex}")
+
+        # Pronóstico de capacidad de discos y LogPaths (series incrementales)
+        forecast_conf = config.get("Forecast", {})
+        if forecast_conf.get("Enabled"):
+            try:
+                store = ForecastStore(config, half_life_days=forecast_conf.get("HalfLifeDays", 30))
+                flagged = forecast_fleet(
+                    servers_dicts, store, run_ts, monitor_config.thresholds_for,
+                    min_points=forecast_conf.get("MinPoints", 3),
+                )
+                store.save()
+                if flagged:
+                    print(f"Servidores que cruzan el umbral de espacio libre en el horizonte: {len(flagged)}")
+                affected |= flagged
+            except Exception as ex:
+                print(f"Error en el pronóstico de capacidad: {ex}")
+        for server_data in servers_dicts:
+            if server_data["name"] in affected and server_data["risk"].get("level") != "SKIPPED":
+                server_data["risk"] = compute_risk_score(
+                    server_data, monitor_config.thresholds_for(server_data["name"]), rules=risk_rules()
+                )
+            all_data.append(ServerResult.from_dict(server_data))
+        del servers_dicts
 
     # Guardar nuevo estado
     new_state = {
-        "servers": new_state_servers
+        "servers": new_state_servers,
+        "logon_correlation": logon_history,
     }
-    save_state(config, new_state)
-
-    # Construir reporte y enviar correo
-    print("Construyendo reporte HTML...")
-    html = build_html_report(all_data)
-    send_html_email(
-        subject="Reporte Diario Seguridad & Recursos Servidores Windows",
-        html_body=html,
-        smtp_config=smtp_conf,
-    )
+    with stage("state"):
+        save_state(config, new_state)
 
-if __name__ == "__main__":
-    run_daily_monitor()
-    print("Monitoreo diario completado.")
+    # Archivar snapshot crudo de la ejecución
+    print("Archivando datos recolectados...")
+    try:
+        with stage("archive"):
+            archive_run(config, run_ts, (r.to_dict() for r in all_data))
+    except Exception as ex:
+        print(f"Error archivando datos de la ejecución: {ex}")
+
+    # Construir reporte y enviar correo (en modo perfil el reporte se arma igual)
+    profiles = config.get("ReportProfiles") or []
+    if send_email:
+        from monitor.mailer import send_html_email
+    if profiles:
+        if send_email or profiling.active():
+            from monitor.report_profiles import run_report_profiles
+
+            print(f"Construyendo {len(profiles)} reportes por perfil...")
+            with stage("report"):
+                run_report_profiles(
+                    profiles, all_data, servers_conf, smtp_conf,
+                    send=send_html_email if send_email else None,
+                    max_workers=config.get("Reports", {}).get("MaxWorkers", 4),
+                )
+    else:
+        if send_email or profiling.active():
+            from monitor.report_html import build_html_report
+
+            print("Construyendo reporte HTML...")
+            with stage("report"):
+                html = build_html_report(all_data)
+        if send_email:
+            with stage("email"):
+                send_html_email(
+                    subject="Reporte Diario Seguridad & Recursos Servidores Windows",
+                    html_body=html,
+                    smtp_config=smtp_conf,
+                )
+
+    checkpoint.finish()
+    return all_data
+
+
+def run_exporter(args):
+    from monitor.archive import load_snapshot
+    from monitor.collectors import transfer_stats
+    from monitor.config_loader import ConfigWatcher
+    from monitor.exporter import MetricsSnapshot, start_exporter
+    from monitor.sessions import SessionCache
+
+    snapshot = MetricsSnapshot()
+
+    # La configuración se recarga entre recolecciones si cambia el archivo
+    watcher = ConfigWatcher()
+
+    # Arranque en caliente: publicamos el último snapshot archivado de cada servidor
+    config = watcher.current.raw
+    archived = []
+    for s in config["Servers"]:
+        data = load_snapshot(config, s["Name"])
+        if data is not None:
+            archived.append(data)
+    if archived:
+        snapshot.update(archived)
+
+    def new_session_cache(monitor_config):
+        return SessionCache(
+            monitor_config.section("Auth"),
+            max_idle_per_host=monitor_config.section("Collectors").get("MaxShellsPerHost", 1),
+        )
+
+    session_cache = new_session_cache(watcher.current)
+
+    server = start_exporter(snapshot, host=args.host, port=args.port)
+    try:
+        while True:
+            started = time.monotonic()
+            previous_auth = watcher.current.section("Auth")
+            if watcher.reload_if_changed() and watcher.current.section("Auth") != previous_auth:
+                # Cambió la autenticación global: descartamos las sesiones calientes
+                session_cache.close_all()
+                session_cache = new_session_cache(watcher.current)
+            try:
+                all_data = run_daily_monitor(
+                    send_email=args.email,
+                    monitor_config=watcher.current,
+                    session_cache=session_cache,
+                )
+                snapshot.update(all_data, transfer=transfer_stats.snapshot())
+            except Exception as ex:
+                print(f"Error en la recolección del exportador: {ex}")
+            elapsed = time.monotonic() - started
+            time.sleep(max(0, args.interval - elapsed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        session_cache.close_all()
 
 
+def run_worker(args):
+    import os
+    import socket
+    from concurrent.futures import ThreadPoolExecutor
+    from fnmatch import fnmatch
+
+    from monitor.collectors import configure_transfer
+    from monitor.registry import load_plugins
+    from monitor.remote_jobs import RemoteJobRunner
+    from monitor.sessions import SessionCache
+    from monitor.work_queue import WorkQueue
+
+    config = load_monitor_config().raw
+    queue_conf = config.get("WorkQueue", {})
+    queue = WorkQueue(config)
+    worker_id = args.id or f"{socket.gethostname()}-{os.getpid()}"
+
+    collectors_conf = config.get("Collectors", {})
+    load_plugins(collectors_conf.get("Plugins", []))
+    max_shells = collectors_conf.get("MaxShellsPerHost", 1)
+    configure_transfer(collectors_conf.get("CompressOutput", False))
+
+    # Solo se toman jobs de servidores de la configuración local (credenciales
+    # y transporte propios) que coinciden con WorkerServers
+    patterns = queue_conf.get("WorkerServers") or []
+    servers_conf = {
+        s["Name"]: s for s in config["Servers"]
+        if not patterns or any(fnmatch(s["Name"].lower(), p.lower()) for p in patterns)
+    }
+    if not servers_conf:
+        print("El worker no tiene servidores asignados (WorkQueue.WorkerServers).")
+        return
+
+    shared = {}
+    perf_conf = collectors_conf.get("PerfCounters", {})
+    if perf_conf.get("Enabled"):
+        shared["perf_counters"] = perf_conf
+    remote_jobs_conf = config.get("RemoteJobs", {})
+    if remote_jobs_conf.get("Enabled"):
+        shared["remote_jobs"] = RemoteJobRunner(remote_jobs_conf)
+
+    session_cache = SessionCache(config.get("Auth", {}), max_idle_per_host=max_shells)
+    poll_seconds = queue_conf.get("PollSeconds", 2)
+    parallel = args.parallel or queue_conf.get("WorkerParallelHosts", 1)
+    print(f"Worker {worker_id}: {len(servers_conf)} servidores, {parallel} jobs en paralelo, cola {queue.path}")
+
+    def run_job(job):
+        name, payload = job["server"], job["payload"]
+        print(f"[{worker_id}] Analizando servidor: {name} (recolección {payload['depth']}: "
+              f"{payload['reason']}, intento {job['attempts']})")
+        try:
+            with queue.keep_leased(job, worker_id):
+                server_data, new_server_state = run_collection_job(
+                    servers_conf[name], payload["prev_state"], payload["thresholds"], payload["depth"],
+                    job["run_ts"], previous_snapshot=payload.get("previous_snapshot"), max_shells=max_shells,
+                    session_cache=session_cache, shared=shared,
+                )
+        except Exception as ex:
+            print(f"[{worker_id}] Error monitoreando {name}: {ex}")
+            queue.fail(job, worker_id, str(ex))
+            return
+        if queue.complete(job, worker_id, {"server_data": server_data, "new_state": new_server_state}):
+            print(f"[{worker_id}] Analisis de {name} completado.")
+        else:
+            print(f"[{worker_id}] Resultado de {name} descartado: el lease ya no es de este worker.")
+
+    stop = threading.Event()
+
+    def worker_loop():
+        try:
+            while not stop.is_set():
+                job = queue.claim(worker_id, servers=list(servers_conf))
+                if job is not None:
+                    run_job(job)
+                elif args.once:
+                    return
+                else:
+                    stop.wait(poll_seconds)
+        except BaseException:
+            # Un hilo que falla detiene a los demás; el error se relanza en fut.result()
+            stop.set()
+            raise
+
+    try:
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="worker") as executor:
+            futures = [executor.submit(worker_loop) for _ in range(parallel)]
+            try:
+                for fut in futures:
+                    fut.result()
+            finally:
+                # Error o Ctrl+C: los hilos terminan el job en curso y salen
+                stop.set()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        session_cache.close_all()
+
+
+def run_monitor(args):
+    send_email = not getattr(args, "no_email", False)
+    resume = getattr(args, "resume", False)
+    profile_dir = getattr(args, "profile", None)
+    if not profile_dir:
+        return run_daily_monitor(send_email=send_email, resume=resume)
+
+    from monitor import profiling
+    from monitor.profiling import RunProfiler
+
+    profiler = RunProfiler(profile_dir, interval_ms=args.profile_interval)
+    profiler.start()
+    try:
+        return run_daily_monitor(send_email=send_email, resume=resume)
+    finally:
+        profiler.stop()
+        print(profiling.format_summary(profiler.write_reports()))
+        print(f"Perfil guardado en {profile_dir} (stacks.collapsed, profile.speedscope.json, "
+              "cprofile.txt, allocations.txt, summary.json)")
+
+
+def run_query(args):
+    from monitor import query
+
+    config = load_config()
+    if args.query_name == "failed-logons":
+        rows = query.top_failed_logons(config, days=args.days, limit=args.limit)
+    elif args.query_name == "unsigned":
+        rows = query.unsigned_binaries(config, binary_type=args.type)
+    elif args.query_name == "disk-trend":
+        rows = query.disk_trend(config, args.server, days=args.days, device=args.device)
+    else:
+        rows = query.latest_risk(config, limit=args.limit)
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    else:
+        print(query.format_rows(rows))
+
+
+def run_backtest_command(args):
+    from monitor.backtest import format_backtest, load_candidate, run_backtest
+
+    current = load_monitor_config()
+    candidate = load_candidate(current.raw, args.candidate) if args.candidate else None
+    result = run_backtest(current.raw, current, candidate, days=args.days, top=args.top, verify=args.verify)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(format_backtest(result))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Monitor de seguridad de servidores Windows")
+    sub = parser.add_subparsers(dest="command")
+
+    run = sub.add_parser("run", help="Ejecuta el monitoreo diario (por defecto)")
+    run.add_argument("--no-email", action="store_true", help="No enviar el reporte por correo")
+    run.add_argument("--resume", action="store_true",
+                     help="Retomar la ejecución interrumpida sin volver a recolectar los servidores ya terminados")
+    run.add_argument("--profile", metavar="DIR", default=None,
+                     help="Perfilar la ejecución y dejar los resultados en DIR")
+    run.add_argument("--profile-interval", type=float, default=5.0, metavar="MS",
+                     help="Intervalo de muestreo de pilas en ms (por defecto 5)")
+
+    q = sub.add_parser("query", help="Consultas sobre los datos históricos archivados")
+    q.add_argument("--json", action="store_true", help="Salida en JSON")
+    qsub = q.add_subparsers(dest="query_name", required=True)
+
+    q_fail = qsub.add_parser("failed-logons", help="Top servidores por logons fallidos")
+    q_fail.add_argument("--days", type=int, default=7)
+    q_fail.add_argument("--limit", type=int, default=20)
+
+    q_unsigned = qsub.add_parser("unsigned", help="Servidores con binarios sin firma")
+    q_unsigned.add_argument("--type", choices=["Service", "Process"], default=None)
+
+    q_disk = qsub.add_parser("disk-trend", help="Evolución de espacio libre de un servidor")
+    q_disk.add_argument("server")
+    q_disk.add_argument("--days", type=int, default=30)
+    q_disk.add_argument("--device", default=None)
+
+    q_risk = qsub.add_parser("risk", help="Riesgo de la última ejecución por servidor")
+    q_risk.add_argument("--limit", type=int, default=20)
+
+    backtest = sub.add_parser("backtest", help="Reevalúa el historial archivado con umbrales candidatos")
+    backtest.add_argument("--candidate", metavar="JSON", default=None,
+                          help="Configuración candidata (umbrales que se combinan con los actuales, p. ej. Thresholds)")
+    backtest.add_argument("--days", type=int, default=90)
+    backtest.add_argument("--top", type=int, default=10, help="Servidores con más cambios a listar")
+    backtest.add_argument("--verify", type=int, default=0, metavar="N",
+                          help="Recalcular N registros por el camino normal y compararlos")
+    backtest.add_argument("--json", action="store_true", help="Salida en JSON")
+
+    serve = sub.add_parser("serve", help="API HTTP local de consultas")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+
+    exporter = sub.add_parser("exporter", help="Recolección periódica con endpoint Prometheus /metrics")
+    exporter.add_argument("--host", default="0.0.0.0")
+    exporter.add_argument("--port", type=int, default=9108)
+    exporter.add_argument("--interval", type=int, default=3600, help="Segundos entre recolecciones")
+    exporter.add_argument("--email", action="store_true", help="Enviar también el reporte por correo en cada recolección")
+
+    worker = sub.add_parser("worker", help="Toma jobs de recolección de la cola compartida (WorkQueue)")
+    worker.add_argument("--id", default=None, help="Identificador del worker (por defecto host-pid)")
+    worker.add_argument("--parallel", type=int, default=None, metavar="N",
+                        help="Jobs en paralelo (por defecto WorkQueue.WorkerParallelHosts)")
+    worker.add_argument("--once", action="store_true", help="Terminar cuando no queden jobs pendientes")
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    if args.command == "query":
+        run_query(args)
+    elif args.command == "backtest":
+        run_backtest_command(args)
+    elif args.command == "serve":
+        from monitor.api_server import serve_api
 
+        serve_api(load_config(), host=args.host, port=args.port)
+    elif args.command == "exporter":
+        run_exporter(args)
+    elif args.command == "worker":
+        run_worker(args)
+    else:
+        run_monitor(args)
+        print("Monitoreo diario completado.")
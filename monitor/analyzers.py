@@ -1,13 +1,117 @@
 import json
+import re
+
+from monitor.event_schema import extract_fields
+
+# Umbrales por defecto. Config.Thresholds (y ThresholdGroups / Thresholds por
+# servidor) los sobreescriben; ver monitor/config_loader.compile_thresholds.
+DEFAULT_THRESHOLDS = {
+    "CpuCritical": 90,
+    "CpuWarning": 75,
+    "RamFreeGBWarning": 2,
+    "RamFreeGBCritical": 1,
+    "DiskFreeGBWarning": 10,
+    "LogGrowthPercentWarning": 50,
+    "LogGrowthGBWarning": 1,
+    "FailedLogonsWarning": 10,
+    "FailedLogonsCritical": 100,
+    "PendingSecurityCritical": 10,
+    "CriticalEventsWarning": 10,
+    "CriticalEventsCritical": 50,
+    "UnsignedBinariesWarning": 10,
+    "UnsignedBinariesCritical": 50,
+    "CapacityDaysWarning": 14,
+}
+
+
+def threshold_for(thresholds, key):
+    # Los umbrales compilados ya traen todas las claves; los dicts crudos no.
+    # También lo usan forecast.py y backtest.py para leer los mismos umbrales
+    value = (thresholds or {}).get(key)
+    return DEFAULT_THRESHOLDS[key] if value is None else value
+
+
+# Campos del mensaje renderizado de 4624/4625, para eventos sin Properties
+# (snapshots anteriores u otras fuentes). El primer "Account Name" es el del
+# sujeto que solicitó el logon; el de la cuenta que intentó entrar es el último.
+_ACCOUNT_RE = re.compile(r"Account Name:\s*([^\r\n\t]+)")
+_SOURCE_IP_RE = re.compile(r"Source Network Address:\s*([^\r\n\t]+)")
+_LOGON_TYPE_RE = re.compile(r"Logon Type:\s*(\d+)")
+
+# Tope de claves distintas por mapa de conteo (IPs / cuentas) por servidor
+MAX_TRACKED_KEYS = 500
+
+
+def _fields_from_message(msg: str) -> dict:
+    accounts = _ACCOUNT_RE.findall(msg)
+    ip = _SOURCE_IP_RE.search(msg)
+    logon_type = _LOGON_TYPE_RE.search(msg)
+    fields = {}
+    if accounts and accounts[-1].strip() not in ("", "-"):
+        fields["TargetUserName"] = accounts[-1].strip()
+    if ip and ip.group(1).strip() not in ("", "-"):
+        fields["IpAddress"] = ip.group(1).strip()
+    if logon_type:
+        fields["LogonType"] = int(logon_type.group(1))
+    return fields
 
-def summarize_logons(security_events):
-    logons_ok = [e for e in security_events if e.get("Id") == 4624]
-    logons_fail = [e for e in security_events if e.get("Id") == 4625]
+
+def logon_event_fields(event: dict) -> dict:
+    """
+    Campos estructurados de un evento 4624/4625: desde Properties con el
+    esquema precompilado, o desde el Message si el evento no los trae.
+    """
+    if event.get("Properties"):
+        return extract_fields(event)
+    return _fields_from_message(event.get("Message") or "")
+
+
+def _count_key(counts: dict, key) -> None:
+    if key is None:
+        return
+    if key in counts or len(counts) < MAX_TRACKED_KEYS:
+        counts[key] = counts.get(key, 0) + 1
+
+
+def summarize_logons(security_events, max_samples: int = 10):
+    """
+    Cuenta logons correctos (4624) y fallidos (4625) en una sola pasada.
+    Acepta una lista o un iterador (streaming); solo retiene max_samples
+    eventos fallidos como muestra, más los conteos de fallidos por IP de
+    origen, cuenta y tipo de logon (para la correlación entre servidores).
+    """
+    ok_count = 0
+    fail_count = 0
+    fail_samples = []
+    by_source = {}
+    by_account = {}
+    by_type = {}
+    for e in security_events:
+        event_id = e.get("Id")
+        if event_id == 4624:
+            ok_count += 1
+        elif event_id == 4625:
+            fail_count += 1
+            fields = logon_event_fields(e)
+            if len(fail_samples) < max_samples:
+                # La muestra guarda los campos, no el mensaje renderizado
+                sample = {k: e[k] for k in ("TimeCreated", "Id", "ProviderName") if e.get(k) is not None}
+                sample.update(fields)
+                if not fields and e.get("Message"):
+                    sample["Message"] = e["Message"]
+                fail_samples.append(sample)
+            logon_type = fields.get("LogonType")
+            _count_key(by_source, fields.get("IpAddress"))
+            _count_key(by_account, fields.get("TargetUserName"))
+            _count_key(by_type, str(logon_type) if logon_type is not None else None)
 
     return {
-        "logons_ok_count": len(logons_ok),
-        "logons_fail_count": len(logons_fail),
-        "logons_fail_samples": logons_fail[:10],
+        "logons_ok_count": ok_count,
+        "logons_fail_count": fail_count,
+        "logons_fail_samples": fail_samples,
+        "logons_fail_by_source": by_source,
+        "logons_fail_by_account": by_account,
+        "logons_fail_by_type": by_type,
     }
 def normalize_field(value, default):
     if isinstance(value, str):
@@ -34,21 +138,21 @@ def evaluate_resources(resources, thresholds):
     mem_free = mem_info.get("FreeGB", 0)
 
     cpu_status = "ok"
-    if cpu >= thresholds.get("CpuCritical", 90):
+    if cpu >= threshold_for(thresholds, "CpuCritical"):
         cpu_status = "critical"
-    elif cpu >= thresholds.get("CpuWarning", 75):
+    elif cpu >= threshold_for(thresholds, "CpuWarning"):
         cpu_status = "warning"
 
     disk_warnings = []
     for d in disks:
         free = d.get("FreeGB", 0)
-        if free <= thresholds.get("DiskFreeGBWarning", 10):
+        if free <= threshold_for(thresholds, "DiskFreeGBWarning"):
             disk_warnings.append({"DeviceID": d.get("DeviceID"), "FreeGB": free})
 
     mem_status = "ok"
-    if mem_free <= thresholds.get("RamFreeGBCritical", 1):
+    if mem_free <= threshold_for(thresholds, "RamFreeGBCritical"):
         mem_status = "critical"
-    elif mem_free <= thresholds.get("RamFreeGBWarning", 2):
+    elif mem_free <= threshold_for(thresholds, "RamFreeGBWarning"):
         mem_status = "warning"
 
     return {
@@ -114,8 +218,8 @@ def evaluate_log_growth(current_sizes: dict, previous_sizes: dict, thresholds: d
     current_sizes: { path: sizeGB }
     previous_sizes: { path: sizeGB }
     """
-    percent_warn = thresholds.get("LogGrowthPercentWarning", 50)
-    gb_warn = thresholds.get("LogGrowthGBWarning", 1)
+    percent_warn = threshold_for(thresholds, "LogGrowthPercentWarning")
+    gb_warn = threshold_for(thresholds, "LogGrowthGBWarning")
 
     results = []
     status_global = "ok"
@@ -159,15 +263,38 @@ def evaluate_log_growth(current_sizes: dict, previous_sizes: dict, thresholds: d
     }
 
 
-def compute_risk_score(server: dict):
-    """
-    Se inventa un score simple de 0 a 100 y un nivel (OK / WARNING / CRITICAL).
-    Se basa en:
-      - CPU, RAM, discos
-      - Logons fallidos
-      - Actualizaciones pendientes
-      - Eventos críticos
-    """
+# Reglas de riesgo: cada una recibe (server, thresholds) y devuelve
+# (puntos, notas). compute_risk_score suma las reglas en orden; los checks
+# registrados en monitor/registry.py declaran la suya.
+
+# Puntos de cada regla. monitor/backtest.py evalúa las mismas reglas en
+# lote con estos valores, así que un cambio de pesos se hace solo aquí.
+RISK_POINTS = {
+    "cpu_critical": 20,
+    "cpu_warning": 10,
+    "mem_critical": 20,
+    "mem_warning": 10,
+    "disk_low": 15,
+    "logons_critical": 25,
+    "logons_warning": 10,
+    "updates_critical": 20,
+    "updates_pending": 10,
+    "critical_events_critical": 25,
+    "critical_events_warning": 15,
+    "log_growth": 10,
+    "unsigned_critical": 25,
+    "unsigned_warning": 15,
+    "unsigned_any": 10,
+    "logon_campaigns": 20,
+    "service_changes": 15,
+    "capacity_forecast": 10,
+}
+
+# Límites de score de cada nivel
+RISK_LEVEL_CRITICAL = 70
+RISK_LEVEL_WARNING = 40
+
+def risk_resources(server: dict, thresholds: dict):
     score = 0
     notes = []
 
@@ -178,89 +305,196 @@ def compute_risk_score(server: dict):
 
     # CPU
     if cpu_status == "critical":
-        score += 20
+        score += RISK_POINTS["cpu_critical"]
         notes.append("Uso de CPU crítico.")
     elif cpu_status == "warning":
-        score += 10
+        score += RISK_POINTS["cpu_warning"]
         notes.append("Uso de CPU elevado.")
 
     # RAM
     if mem_status == "critical":
-        score += 20
+        score += RISK_POINTS["mem_critical"]
         notes.append("Memoria RAM muy baja.")
     elif mem_status == "warning":
-        score += 10
+        score += RISK_POINTS["mem_warning"]
         notes.append("Memoria RAM baja.")
 
     # Discos
     if disk_warnings:
-        score += 15
+        score += RISK_POINTS["disk_low"]
         notes.append("Discos con poco espacio libre.")
 
-    # Logons fallidos
+    return score, notes
+
+
+def risk_logons(server: dict, thresholds: dict):
     logons = server.get("logons", {})
     fails = logons.get("logons_fail_count", 0)
-    if fails > 100:
-        score += 25
-        notes.append(f"Más de 100 logons fallidos ({fails}).")
-    elif fails > 10:
-        score += 10
-        notes.append(f"Más de 10 logons fallidos ({fails}).")
-
-    # Actualizaciones
+    fail_crit = threshold_for(thresholds, "FailedLogonsCritical")
+    fail_warn = threshold_for(thresholds, "FailedLogonsWarning")
+    if fails > fail_crit:
+        return RISK_POINTS["logons_critical"], [f"Más de {fail_crit} logons fallidos ({fails})."]
+    if fails > fail_warn:
+        return RISK_POINTS["logons_warning"], [f"Más de {fail_warn} logons fallidos ({fails})."]
+    return 0, []
+
+
+def risk_updates(server: dict, thresholds: dict):
     updates = server.get("updates", {})
     pend = updates.get("PendingSecurityCount")
+    pend_crit = threshold_for(thresholds, "PendingSecurityCritical")
     if pend is not None:
-        if pend > 10:
-            score += 20
-            notes.append(f"Más de 10 actualizaciones de seguridad pendientes ({pend}).")
-        elif pend > 0:
-            score += 10
-            notes.append(f"Tiene actualizaciones de seguridad pendientes ({pend}).")
-
-    # Eventos críticos
+        if pend > pend_crit:
+            return RISK_POINTS["updates_critical"], [f"Más de {pend_crit} actualizaciones de seguridad pendientes ({pend})."]
+        if pend > 0:
+            return RISK_POINTS["updates_pending"], [f"Tiene actualizaciones de seguridad pendientes ({pend})."]
+    return 0, []
+
+
+def risk_critical_events(server: dict, thresholds: dict):
     crit_sum = server.get("critical_events_summary", {})
     total_crit = crit_sum.get("total", 0)
-    if total_crit > 50:
-        score += 25
-        notes.append(f"Más de 50 eventos críticos en las últimas 24h ({total_crit}).")
-    elif total_crit > 10:
-        score += 15
-        notes.append(f"Más de 10 eventos críticos en las últimas 24h ({total_crit}).")
-
-    # Crecimiento de logs
+    crit_crit = threshold_for(thresholds, "CriticalEventsCritical")
+    crit_warn = threshold_for(thresholds, "CriticalEventsWarning")
+    if total_crit > crit_crit:
+        return RISK_POINTS["critical_events_critical"], [f"Más de {crit_crit} eventos críticos en las últimas 24h ({total_crit})."]
+    if total_crit > crit_warn:
+        return RISK_POINTS["critical_events_warning"], [f"Más de {crit_warn} eventos críticos en las últimas 24h ({total_crit})."]
+    return 0, []
+
+
+def risk_log_growth(server: dict, thresholds: dict):
     log_growth = server.get("log_growth", {})
     if log_growth.get("global_status") == "warning":
-        score += 10
-        notes.append("Crecimiento inusual en logs o archivos de sistema.")
+        return RISK_POINTS["log_growth"], ["Crecimiento inusual en logs o archivos de sistema."]
+    return 0, []
+
 
-    # Binarios sin firma o con firma inválida
+def risk_unsigned_binaries(server: dict, thresholds: dict):
     unsigned = server.get("unsigned_binaries", [])
-    if unsigned:
-        count = len(unsigned)
-        if count > 50:
-            score += 25
-            notes.append(f"Más de 50 binarios sin firma o con firma inválida ({count}).")
-        elif count > 10:
-            score += 15
-            notes.append(f"Más de 10 binarios sin firma o con firma inválida ({count}).")
-        else:
-            score += 10
-            notes.append(f"Se detectaron binarios sin firma o con firma inválida ({count}).")
-            
+    if not unsigned:
+        return 0, []
+    count = len(unsigned)
+    uns_crit = threshold_for(thresholds, "UnsignedBinariesCritical")
+    uns_warn = threshold_for(thresholds, "UnsignedBinariesWarning")
+    if count > uns_crit:
+        return RISK_POINTS["unsigned_critical"], [f"Más de {uns_crit} binarios sin firma o con firma inválida ({count})."]
+    if count > uns_warn:
+        return RISK_POINTS["unsigned_warning"], [f"Más de {uns_warn} binarios sin firma o con firma inválida ({count})."]
+    return RISK_POINTS["unsigned_any"], [f"Se detectaron binarios sin firma o con firma inválida ({count})."]
+
+
+def risk_logon_campaigns(server: dict, thresholds: dict):
+    """
+    Campañas de logons fallidos detectadas entre servidores (ver
+    monitor/correlation.py); la clave la agrega la etapa de correlación.
+    """
+    campaigns = server.get("logon_campaigns") or []
+    if not campaigns:
+        return 0, []
+    notes = []
+    for c in campaigns:
+        kind = "la IP" if c["kind"] == "source" else "la cuenta"
+        notes.append(
+            f"Parte de una campaña distribuida de logons fallidos desde {kind} {c['key']} "
+            f"({c['servers_count']} servidores, {c['attempts']} intentos)."
+        )
+    return RISK_POINTS["logon_campaigns"], notes
+
+
+def risk_service_changes(server: dict, thresholds: dict):
+    """
+    Servicios nuevos o con otra ruta de binario (inventario completo de
+    servicios, ver monitor/service_inventory.py).
+    """
+    changes = server.get("service_changes") or []
+    added = [c["Name"] for c in changes if c["Change"] == "added"]
+    repathed = [c["Name"] for c in changes if c["Change"] == "changed" and "PathHash" in c["Fields"]]
+    if not added and not repathed:
+        return 0, []
+    notes = []
+    if added:
+        notes.append(f"Servicios nuevos: {', '.join(added[:5])}{'...' if len(added) > 5 else ''}.")
+    if repathed:
+        notes.append(f"Servicios con otra ruta de binario: {', '.join(repathed[:5])}{'...' if len(repathed) > 5 else ''}.")
+    return RISK_POINTS["service_changes"], notes
+
+
+def risk_capacity_forecast(server: dict, thresholds: dict):
+    """
+    Discos o rutas de log que cruzan DiskFreeGBWarning dentro de
+    CapacityDaysWarning días (ver monitor/forecast.py).
+    """
+    flagged = [e for e in server.get("capacity_forecast") or [] if e["Status"] == "warning"]
+    if not flagged:
+        return 0, []
+    notes = []
+    for e in flagged[:3]:
+        what = f"El disco {e['Key']}" if e["Kind"] == "disk" else f"El crecimiento de {e['Key']}"
+        notes.append(
+            f"{what} cruza el umbral de espacio libre en ~{e['DaysUntilThreshold']} días "
+            f"(lleno en ~{e['DaysUntilFull']} días)."
+        )
+    return RISK_POINTS["capacity_forecast"], notes
+
+
+RISK_RULES = [
+    risk_resources,
+    risk_logons,
+    risk_logon_campaigns,
+    risk_updates,
+    risk_critical_events,
+    risk_log_growth,
+    risk_unsigned_binaries,
+    risk_service_changes,
+    risk_capacity_forecast,
+]
+
+# Reglas que salen de etapas de flota (correlación, inventarios, pronóstico)
+# y no se recalculan al reevaluar un servidor archivado: monitor/archive.py
+# guarda sus puntos por ejecución para el backtest de umbrales.
+FIXED_RISK_RULES = [
+    risk_logon_campaigns,
+    risk_service_changes,
+    risk_capacity_forecast,
+]
+
+
+def compute_risk_score(server: dict, thresholds: dict = None, rules=None):
+    """
+    Se inventa un score simple de 0 a 100 y un nivel (OK / WARNING / CRITICAL).
+    Los límites de cada regla salen de thresholds (o DEFAULT_THRESHOLDS).
+    Por defecto se basa en RISK_RULES:
+      - CPU, RAM, discos
+      - Logons fallidos (por servidor y campañas entre servidores)
+      - Actualizaciones pendientes
+      - Eventos críticos
+      - Crecimiento de logs
+      - Binarios sin firma
+      - Servicios nuevos o modificados
+    """
+    score = 0
+    notes = []
+
+    for rule in (RISK_RULES if rules is None else rules):
+        points, rule_notes = rule(server, thresholds)
+        score += points
+        notes.extend(rule_notes)
+
     # Limitar score
     if score > 100:
         score = 100
 
-    if score >= 70:
-        level = "CRITICAL"
-    elif score >= 40:
-        level = "WARNING"
-    else:
-        level = "OK"
-
     return {
         "score": score,
-        "level": level,
+        "level": risk_level(score),
         "notes": notes
     }
+
+
+def risk_level(score: int) -> str:
+    if score >= RISK_LEVEL_CRITICAL:
+        return "CRITICAL"
+    if score >= RISK_LEVEL_WARNING:
+        return "WARNING"
+    return "OK"
@@ -0,0 +1,80 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from monitor import query
+
+# API HTTP local (solo lectura) sobre las consultas de monitor/query.py.
+#
+#   GET /query/failed-logons?days=7&limit=20
+#   GET /query/unsigned?type=Service
+#   GET /query/disk-trend?server=SRV01&days=30&device=C:
+#   GET /query/risk?limit=20
+
+
+def _int_param(params: dict, name: str, default: int) -> int:
+    try:
+        return int(params.get(name, [default])[0])
+    except (TypeError, ValueError):
+        return default
+
+
+def _str_param(params: dict, name: str):
+    values = params.get(name)
+    return values[0] if values else None
+
+
+def make_handler(config: dict):
+    routes = {
+        "/query/failed-logons": lambda p: query.top_failed_logons(
+            config, days=_int_param(p, "days", 7), limit=_int_param(p, "limit", 20)
+        ),
+        "/query/unsigned": lambda p: query.unsigned_binaries(
+            config, binary_type=_str_param(p, "type")
+        ),
+        "/query/disk-trend": lambda p: query.disk_trend(
+            config, _str_param(p, "server"), days=_int_param(p, "days", 30),
+            device=_str_param(p, "device"),
+        ),
+        "/query/risk": lambda p: query.latest_risk(config, limit=_int_param(p, "limit", 20)),
+    }
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            handler = routes.get(url.path)
+            if handler is None:
+                self._send_json(404, {"error": "not found", "routes": sorted(routes)})
+                return
+            params = parse_qs(url.query)
+            if url.path == "/query/disk-trend" and not _str_param(params, "server"):
+                self._send_json(400, {"error": "falta el parámetro 'server'"})
+                return
+            try:
+                self._send_json(200, handler(params))
+            except Exception as ex:
+                self._send_json(500, {"error": str(ex)})
+
+        def _send_json(self, status: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return QueryHandler
+
+
+def serve_api(config: dict, host: str = "127.0.0.1", port: int = 8080):
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    print(f"API de consultas escuchando en http://{host}:{port}/query/...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
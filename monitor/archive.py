@@ -0,0 +1,375 @@
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from monitor.analyzers import FIXED_RISK_RULES
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Archivo histórico de snapshots por servidor.
+#
+# Cada ejecución escribe un segmento "<run_ts>.jsonl.gz" donde cada servidor es
+# un miembro gzip independiente (el archivo completo sigue siendo un gzip válido
+# legible con zcat). Un índice SQLite guarda (servidor, run_ts) -> (segmento,
+# offset, largo), de modo que recuperar un snapshot es un seek + una
+# descompresión, sin leer el resto del segmento.
+#
+# El mismo índice guarda además tablas de hechos escalares por ejecución
+# (métricas, discos, binarios sin firma) que usan las consultas de
+# monitor/query.py sin tener que descomprimir snapshots, y el inventario de
+# hashes de binarios de la flota (monitor/binary_index.py), el de servicios
+# (monitor/service_inventory.py) y las series del pronóstico de capacidad
+# (monitor/forecast.py). server_metrics, disk_metrics y log_metrics alcanzan
+# para reevaluar los umbrales sobre el historial (monitor/backtest.py).
+
+INDEX_FILE = "index.db"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+
+def _get_archive_dir(config: dict) -> str:
+    archive_conf = config.get("Archive", {})
+    path = archive_conf.get("Path", "archive")
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    return path
+
+
+def open_index(config: dict) -> sqlite3.Connection:
+    archive_dir = _get_archive_dir(config)
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(archive_dir, INDEX_FILE))
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            server  TEXT NOT NULL,
+            run_ts  TEXT NOT NULL,
+            segment TEXT NOT NULL,
+            offset  INTEGER NOT NULL,
+            length  INTEGER NOT NULL,
+            PRIMARY KEY (server, run_ts)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_run ON snapshots (run_ts)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS server_metrics (
+            server           TEXT NOT NULL,
+            run_ts           TEXT NOT NULL,
+            risk_score       INTEGER,
+            risk_level       TEXT,
+            cpu_percent      REAL,
+            mem_free_gb      REAL,
+            logons_ok        INTEGER,
+            logons_failed    INTEGER,
+            pending_security INTEGER,
+            critical_events  INTEGER,
+            unsigned_count   INTEGER,
+            PRIMARY KEY (server, run_ts)
+        )
+        """
+    )
+    # Índices creados antes del backtest de umbrales
+    _ensure_columns(conn, "server_metrics", (("collection_status", "TEXT"), ("fixed_points", "INTEGER")))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_server_metrics_run ON server_metrics (run_ts)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS disk_metrics (
+            server  TEXT NOT NULL,
+            run_ts  TEXT NOT NULL,
+            device  TEXT NOT NULL,
+            size_gb REAL,
+            free_gb REAL,
+            PRIMARY KEY (server, device, run_ts)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS log_metrics (
+            server  TEXT NOT NULL,
+            run_ts  TEXT NOT NULL,
+            path    TEXT NOT NULL,
+            prev_gb REAL,
+            curr_gb REAL,
+            PRIMARY KEY (server, path, run_ts)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS unsigned_binaries (
+            server TEXT NOT NULL,
+            run_ts TEXT NOT NULL,
+            type   TEXT,
+            name   TEXT,
+            path   TEXT,
+            status TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unsigned_server_run ON unsigned_binaries (server, run_ts)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS binary_hashes (
+            sha256           TEXT PRIMARY KEY,
+            signature_status TEXT,
+            cert_subject     TEXT,
+            cert_issuer      TEXT,
+            first_seen       TEXT NOT NULL,
+            first_server     TEXT,
+            first_path       TEXT,
+            last_seen        TEXT NOT NULL,
+            servers_count    INTEGER
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS service_inventory (
+            server     TEXT NOT NULL,
+            name       TEXT NOT NULL,
+            status     TEXT,
+            start_mode TEXT,
+            path_hash  TEXT,
+            PRIMARY KEY (server, name)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS service_changes (
+            server TEXT NOT NULL,
+            run_ts TEXT NOT NULL,
+            name   TEXT NOT NULL,
+            change TEXT NOT NULL,
+            fields TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_service_changes_run ON service_changes (run_ts)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS forecast_series (
+            server  TEXT NOT NULL,
+            kind    TEXT NOT NULL,
+            key     TEXT NOT NULL,
+            t0      REAL NOT NULL,
+            last_ts TEXT,
+            points  INTEGER,
+            w       REAL,
+            st      REAL,
+            sy      REAL,
+            stt     REAL,
+            sty     REAL,
+            last_y  REAL,
+            PRIMARY KEY (server, kind, key)
+        )
+        """
+    )
+    return conn
+
+
+def _segment_name(run_ts: str) -> str:
+    return run_ts.replace(":", "").replace("-", "") + SEGMENT_SUFFIX
+
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns) -> None:
+    """Agrega a un índice existente las columnas que no tenga."""
+    existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _extract_facts(s: dict, run_ts: str):
+    """
+    Extrae del dict de un servidor las filas de hechos escalares del índice.
+    """
+    name = s["name"]
+    res_eval = s.get("resources_eval") or {}
+    logons = s.get("logons") or {}
+    updates = s.get("updates") or {}
+    risk = s.get("risk") or {}
+    unsigned = s.get("unsigned_binaries") or []
+
+    metrics = (
+        name,
+        run_ts,
+        risk.get("score"),
+        risk.get("level"),
+        res_eval.get("cpu_value"),
+        res_eval.get("mem_free_gb"),
+        logons.get("logons_ok_count"),
+        logons.get("logons_fail_count"),
+        updates.get("PendingSecurityCount"),
+        (s.get("critical_events_summary") or {}).get("total"),
+        len(unsigned),
+        (s.get("collection") or {}).get("status"),
+        sum(rule(s, None)[0] for rule in FIXED_RISK_RULES),
+    )
+
+    disks = []
+    for d in (s.get("resources") or {}).get("disk") or []:
+        if d.get("DeviceID") is None:
+            continue
+        disks.append((name, run_ts, d.get("DeviceID"), d.get("SizeGB"), d.get("FreeGB")))
+
+    logs = [
+        (name, run_ts, item["Path"], item["PrevGB"], item["CurrGB"])
+        for item in (s.get("log_growth") or {}).get("details") or []
+        if item.get("PrevGB") is not None and item.get("CurrGB") is not None
+    ]
+
+    binaries = [
+        (name, run_ts, b.get("Type"), b.get("Name"), b.get("Path"), b.get("SignatureStatus"))
+        for b in unsigned
+    ]
+    return metrics, disks, logs, binaries
+
+
+def archive_run(config: dict, run_ts: str, servers_data) -> int:
+    """
+    Agrega al archivo los datos recolectados de una ejecución.
+    run_ts: timestamp ISO (UTC) de inicio de la ejecución.
+    Devuelve la cantidad de snapshots escritos.
+    """
+    archive_dir = _get_archive_dir(config)
+    conn = open_index(config)
+    segment = _segment_name(run_ts)
+    rows = []
+    metrics_rows, disk_rows, log_rows, binary_rows = [], [], [], []
+    try:
+        with open(os.path.join(archive_dir, segment), "ab") as f:
+            for s in servers_data:
+                line = json.dumps(s, ensure_ascii=False, default=str) + "\n"
+                member = gzip.compress(line.encode("utf-8"), compresslevel=6)
+                offset = f.tell()
+                f.write(member)
+                rows.append((s["name"], run_ts, segment, offset, len(member)))
+
+                metrics, disks, logs, binaries = _extract_facts(s, run_ts)
+                metrics_rows.append(metrics)
+                disk_rows.extend(disks)
+                log_rows.extend(logs)
+                binary_rows.extend(binaries)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO snapshots (server, run_ts, segment, offset, length) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO server_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                metrics_rows,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO disk_metrics VALUES (?, ?, ?, ?, ?)",
+                disk_rows,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO log_metrics VALUES (?, ?, ?, ?, ?)",
+                log_rows,
+            )
+            conn.executemany(
+                "DELETE FROM unsigned_binaries WHERE server = ? AND run_ts = ?",
+                [(r[0], run_ts) for r in rows],
+            )
+            conn.executemany(
+                "INSERT INTO unsigned_binaries VALUES (?, ?, ?, ?, ?, ?)",
+                binary_rows,
+            )
+    finally:
+        conn.close()
+
+    prune_archive(config)
+    return len(rows)
+
+
+def load_snapshot(config: dict, server: str, run_ts: str = None):
+    """
+    Devuelve el snapshot de un servidor para una ejecución dada
+    (o el más reciente si run_ts es None). None si no existe.
+    """
+    conn = open_index(config)
+    try:
+        if run_ts is None:
+            row = conn.execute(
+                "SELECT segment, offset, length FROM snapshots "
+                "WHERE server = ? ORDER BY run_ts DESC LIMIT 1",
+                (server,),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT segment, offset, length FROM snapshots WHERE server = ? AND run_ts = ?",
+                (server, run_ts),
+            ).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+
+    segment, offset, length = row
+    path = os.path.join(_get_archive_dir(config), segment)
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return json.loads(gzip.decompress(member).decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def list_snapshots(config: dict, server: str):
+    """
+    Lista los run_ts disponibles para un servidor, del más antiguo al más reciente.
+    """
+    conn = open_index(config)
+    try:
+        rows = conn.execute(
+            "SELECT run_ts FROM snapshots WHERE server = ? ORDER BY run_ts",
+            (server,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows]
+
+
+def prune_archive(config: dict, now: datetime = None) -> int:
+    """
+    Elimina del índice y del disco los segmentos más antiguos que
+    Archive.RetentionDays (por defecto 365). Devuelve segmentos borrados.
+    """
+    retention_days = config.get("Archive", {}).get("RetentionDays", 365)
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=retention_days)).isoformat()
+
+    archive_dir = _get_archive_dir(config)
+    conn = open_index(config)
+    try:
+        segments = [
+            r[0] for r in conn.execute(
+                "SELECT DISTINCT segment FROM snapshots WHERE run_ts < ?", (cutoff,)
+            ).fetchall()
+        ]
+        with conn:
+            for table in ("snapshots", "server_metrics", "disk_metrics", "log_metrics",
+                          "unsigned_binaries", "service_changes"):
+                conn.execute(f"DELETE FROM {table} WHERE run_ts < ?", (cutoff,))
+            # Hashes que no se vieron en ningún servidor durante la retención
+            conn.execute("DELETE FROM binary_hashes WHERE last_seen < ?", (cutoff,))
+    finally:
+        conn.close()
+
+    for segment in segments:
+        try:
+            os.remove(os.path.join(archive_dir, segment))
+        except FileNotFoundError:
+            pass
+    return len(segments)
@@ -0,0 +1,338 @@
+import json
+import time
+
+from monitor.analyzers import (
+    RISK_POINTS,
+    compute_risk_score,
+    evaluate_log_growth,
+    evaluate_resources,
+    risk_level,
+    threshold_for,
+)
+from monitor.archive import load_snapshot, open_index
+from monitor.config_loader import ConfigError, MonitorConfig, compile_thresholds, validate_config
+from monitor.query import format_rows, since_clause
+
+# Backtest de umbrales sobre el historial archivado (main.py backtest).
+#
+# Reevalúa cada ejecución archivada de cada servidor con los umbrales de una
+# configuración candidata y compara cuántas alertas (WARNING / CRITICAL) y
+# cambios de nivel habría producido frente a la configuración actual y a lo
+# que efectivamente se reportó.
+#
+# La evaluación es por columnas: las métricas salen de las tablas de hechos
+# del índice (server_metrics, disk_metrics, log_metrics) como listas por
+# servidor, y cada regla se aplica a la columna completa con los umbrales de
+# ese servidor. No se descomprimen snapshots ni se arman dicts por registro.
+# Las reglas replican evaluate_resources, evaluate_log_growth y las reglas
+# de riesgo de monitor/analyzers.py con los mismos RISK_POINTS; las de etapas
+# de flota (campañas, servicios, pronóstico) se toman como puntos fijos
+# guardados por ejecución. Con --verify se recalcula una muestra por el
+# camino normal (snapshot completo + compute_risk_score) para confirmar que
+# ambos caminos coinciden.
+#
+# Las ejecuciones con error u omitidas conservan su nivel archivado. Las
+# archivadas antes de existir log_metrics / fixed_points se reevalúan igual,
+# pero sin puntos por crecimiento de logs ni por reglas de flota.
+
+_COLUMNS = ("run_ts", "status", "score", "level", "cpu", "mem", "fails", "pending", "crit", "unsigned", "fixed")
+
+RULE_NAMES = ("cpu", "mem", "disk", "logons", "updates", "critical_events", "log_growth", "unsigned")
+
+
+def load_history(config: dict, days: int = 90) -> dict:
+    """
+    Columnas por servidor: {servidor: {columna: [valores por run_ts]}},
+    con "min_free" (disco con menos espacio) y "logs" ([(prev, curr), ...]).
+    """
+    since = since_clause(days)
+    history = {}
+    conn = open_index(config)
+    try:
+        for row in conn.execute(
+            """
+            SELECT server, run_ts, collection_status, risk_score, risk_level, cpu_percent, mem_free_gb,
+                   logons_failed, pending_security, critical_events, unsigned_count, fixed_points
+            FROM server_metrics
+            WHERE run_ts >= ?
+            ORDER BY server, run_ts
+            """,
+            (since,),
+        ):
+            cols = history.get(row[0])
+            if cols is None:
+                cols = history[row[0]] = {c: [] for c in _COLUMNS}
+            for c, value in zip(_COLUMNS, row[1:]):
+                cols[c].append(value)
+
+        min_free = {
+            (server, run_ts): free
+            for server, run_ts, free in conn.execute(
+                "SELECT server, run_ts, MIN(free_gb) FROM disk_metrics "
+                "WHERE run_ts >= ? AND free_gb IS NOT NULL GROUP BY server, run_ts",
+                (since,),
+            )
+        }
+        logs = {}
+        for server, run_ts, prev, curr in conn.execute(
+            "SELECT server, run_ts, prev_gb, curr_gb FROM log_metrics WHERE run_ts >= ?", (since,)
+        ):
+            logs.setdefault((server, run_ts), []).append((prev, curr))
+    finally:
+        conn.close()
+
+    for server, cols in history.items():
+        cols["min_free"] = [min_free.get((server, ts)) for ts in cols["run_ts"]]
+        cols["logs"] = [logs.get((server, ts), ()) for ts in cols["run_ts"]]
+    return history
+
+
+def _log_growth_warning(pairs, gb_warn, pct_warn) -> bool:
+    for prev, curr in pairs:
+        diff = curr - prev
+        if diff > gb_warn or (prev > 0 and diff / prev * 100 > pct_warn):
+            return True
+    return False
+
+
+def replay_server(cols: dict, thresholds: dict) -> dict:
+    """
+    Reevalúa todas las ejecuciones de un servidor con sus umbrales.
+    Devuelve {"score": [...], "level": [...], "fired": {regla: ejecuciones}}.
+    """
+    p = RISK_POINTS
+    cpu_crit, cpu_warn = threshold_for(thresholds, "CpuCritical"), threshold_for(thresholds, "CpuWarning")
+    mem_crit, mem_warn = threshold_for(thresholds, "RamFreeGBCritical"), threshold_for(thresholds, "RamFreeGBWarning")
+    disk_warn = threshold_for(thresholds, "DiskFreeGBWarning")
+    fail_crit, fail_warn = threshold_for(thresholds, "FailedLogonsCritical"), threshold_for(thresholds, "FailedLogonsWarning")
+    pend_crit = threshold_for(thresholds, "PendingSecurityCritical")
+    crit_crit, crit_warn = threshold_for(thresholds, "CriticalEventsCritical"), threshold_for(thresholds, "CriticalEventsWarning")
+    uns_crit, uns_warn = threshold_for(thresholds, "UnsignedBinariesCritical"), threshold_for(thresholds, "UnsignedBinariesWarning")
+    gb_warn, pct_warn = threshold_for(thresholds, "LogGrowthGBWarning"), threshold_for(thresholds, "LogGrowthPercentWarning")
+
+    # Sin dato se evalúa como evaluate_resources (valor 0)
+    cpu = [v or 0 for v in cols["cpu"]]
+    mem = [v or 0 for v in cols["mem"]]
+
+    points = {
+        "cpu": [p["cpu_critical"] if v >= cpu_crit else p["cpu_warning"] if v >= cpu_warn else 0 for v in cpu],
+        "mem": [p["mem_critical"] if v <= mem_crit else p["mem_warning"] if v <= mem_warn else 0 for v in mem],
+        "disk": [p["disk_low"] if v is not None and v <= disk_warn else 0 for v in cols["min_free"]],
+        "logons": [
+            p["logons_critical"] if v > fail_crit else p["logons_warning"] if v > fail_warn else 0
+            for v in (f or 0 for f in cols["fails"])
+        ],
+        "updates": [
+            0 if v is None else p["updates_critical"] if v > pend_crit else p["updates_pending"] if v > 0 else 0
+            for v in cols["pending"]
+        ],
+        "critical_events": [
+            p["critical_events_critical"] if v > crit_crit else p["critical_events_warning"] if v > crit_warn else 0
+            for v in (c or 0 for c in cols["crit"])
+        ],
+        "log_growth": [
+            p["log_growth"] if _log_growth_warning(pairs, gb_warn, pct_warn) else 0 for pairs in cols["logs"]
+        ],
+        "unsigned": [
+            0 if not v else p["unsigned_critical"] if v > uns_crit else p["unsigned_warning"] if v > uns_warn
+            else p["unsigned_any"]
+            for v in cols["unsigned"]
+        ],
+    }
+
+    # Filas anteriores a collection_status: las de error no tienen CPU
+    replayed = [
+        status == "ok" or (status is None and v is not None) for status, v in zip(cols["status"], cols["cpu"])
+    ]
+    totals = [min(sum(rule_points), 100) for rule_points in zip(*points.values(), (f or 0 for f in cols["fixed"]))]
+    return {
+        "score": [t if ok else s for t, ok, s in zip(totals, replayed, cols["score"])],
+        "level": [risk_level(t) if ok else lv for t, ok, lv in zip(totals, replayed, cols["level"])],
+        "fired": {
+            name: sum(1 for v, ok in zip(values, replayed) if v and ok) for name, values in points.items()
+        },
+    }
+
+
+def _transitions(levels) -> int:
+    return sum(1 for a, b in zip(levels, levels[1:]) if a != b)
+
+
+def _alerts(levels) -> int:
+    return sum(1 for lv in levels if lv in ("WARNING", "CRITICAL"))
+
+
+def replay_fleet(history: dict, thresholds_for) -> dict:
+    """Reevaluación de todos los servidores: {servidor: resultado de replay_server}."""
+    return {server: replay_server(cols, thresholds_for(server)) for server, cols in history.items()}
+
+
+def summarize(name: str, levels_by_server: dict, elapsed: float = None) -> dict:
+    levels = [lv for lvs in levels_by_server.values() for lv in lvs]
+    row = {
+        "scenario": name,
+        "records": len(levels),
+        "warning": sum(1 for lv in levels if lv == "WARNING"),
+        "critical": sum(1 for lv in levels if lv == "CRITICAL"),
+        "alerts": _alerts(levels),
+        "level_changes": sum(_transitions(lvs) for lvs in levels_by_server.values()),
+    }
+    if elapsed is not None:
+        row["elapsed_ms"] = round(elapsed * 1000, 1)
+    return row
+
+
+def merge_candidate(base_raw: dict, overrides: dict) -> dict:
+    """
+    Aplica la candidata sobre la configuración actual. Los umbrales se
+    combinan clave a clave: "Thresholds", cada grupo de "ThresholdGroups" y
+    las entradas de "Servers" (por Name; su "Thresholds" también clave a
+    clave). Una candidata que solo cambia CPU conserva los umbrales de disco
+    actuales. El resto de las secciones se reemplaza entero.
+    """
+    raw = {**base_raw, **overrides}
+    if isinstance(overrides.get("Thresholds"), dict):
+        raw["Thresholds"] = {**base_raw.get("Thresholds", {}), **overrides["Thresholds"]}
+
+    if isinstance(overrides.get("ThresholdGroups"), dict):
+        groups = dict(base_raw.get("ThresholdGroups", {}))
+        for name, values in overrides["ThresholdGroups"].items():
+            groups[name] = {**groups.get(name, {}), **values} if isinstance(values, dict) else values
+        raw["ThresholdGroups"] = groups
+
+    if isinstance(overrides.get("Servers"), list):
+        by_name = {s.get("Name"): s for s in overrides["Servers"] if isinstance(s, dict)}
+        unknown = sorted(set(by_name) - {s["Name"] for s in base_raw["Servers"]}, key=str)
+        if unknown:
+            raise ConfigError(f"Servidores de la candidata que no están en la configuración: {', '.join(map(str, unknown))}")
+        servers = []
+        for s in base_raw["Servers"]:
+            override = by_name.get(s["Name"])
+            if override is not None:
+                merged = {**s, **override}
+                if isinstance(override.get("Thresholds"), dict):
+                    merged["Thresholds"] = {**s.get("Thresholds", {}), **override["Thresholds"]}
+                s = merged
+            servers.append(s)
+        raw["Servers"] = servers
+    return raw
+
+
+def load_candidate(base_raw: dict, path: str) -> MonitorConfig:
+    """
+    Configuración candidata a partir de un archivo JSON con las secciones a
+    cambiar (ver merge_candidate). Lanza ConfigError si el resultado es inválido.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        overrides = json.load(f)
+    if not isinstance(overrides, dict):
+        raise ConfigError("La configuración candidata debe ser un objeto JSON")
+    raw = merge_candidate(base_raw, overrides)
+    validate_config(raw)
+    return MonitorConfig(raw=raw, thresholds=compile_thresholds(raw))
+
+
+def verify_sample(config: dict, history: dict, replay: dict, thresholds_for, sample: int) -> dict:
+    """
+    Recalcula `sample` registros repartidos en el historial por el camino
+    normal (snapshot archivado + evaluate_resources / evaluate_log_growth +
+    compute_risk_score) y cuenta los que no coinciden con el columnar.
+    """
+    records = [
+        (server, i) for server, cols in history.items()
+        for i, status in enumerate(cols["status"]) if status == "ok"
+    ]
+    if not records or sample <= 0:
+        return {"checked": 0, "mismatches": []}
+    step = max(1, len(records) // sample)
+    checked = 0
+    mismatches = []
+    for server, i in records[::step][:sample]:
+        run_ts = history[server]["run_ts"][i]
+        snap = load_snapshot(config, server, run_ts)
+        if snap is None:
+            continue
+        thresholds = thresholds_for(server)
+        details = (snap.get("log_growth") or {}).get("details") or []
+        snap["resources_eval"] = evaluate_resources(snap.get("resources") or {}, thresholds)
+        snap["log_growth"] = evaluate_log_growth(
+            {d["Path"]: d["CurrGB"] for d in details},
+            {d["Path"]: d["PrevGB"] for d in details},
+            thresholds,
+        )
+        expected = compute_risk_score(snap, thresholds)["score"]
+        checked += 1
+        if expected != replay[server]["score"][i]:
+            mismatches.append({
+                "server": server, "run_ts": run_ts,
+                "expected": expected, "columnar": replay[server]["score"][i],
+            })
+    return {"checked": checked, "mismatches": mismatches}
+
+
+def run_backtest(config: dict, current: MonitorConfig, candidate: MonitorConfig = None,
+                 days: int = 90, top: int = 10, verify: int = 0) -> dict:
+    """
+    Compara lo reportado, la configuración actual y la candidata sobre los
+    últimos `days` días del archivo.
+    """
+    history = load_history(config, days)
+
+    scenarios = [summarize("histórico", {s: cols["level"] for s, cols in history.items()})]
+    replays = {}
+    for name, cfg in (("actual", current), ("candidata", candidate)):
+        if cfg is None:
+            continue
+        started = time.perf_counter()
+        replays[name] = replay_fleet(history, cfg.thresholds_for)
+        scenarios.append(summarize(
+            name, {s: r["level"] for s, r in replays[name].items()}, time.perf_counter() - started
+        ))
+
+    result = {"days": days, "servers": len(history), "scenarios": scenarios}
+    result["rules"] = [
+        {"rule": rule, **{name: sum(r["fired"][rule] for r in rep.values()) for name, rep in replays.items()}}
+        for rule in RULE_NAMES
+    ]
+
+    if "candidata" in replays:
+        base, cand = replays["actual"], replays["candidata"]
+        diffs = []
+        for server in history:
+            a, b = base[server]["level"], cand[server]["level"]
+            changed = sum(1 for x, y in zip(a, b) if x != y)
+            if changed:
+                diffs.append({
+                    "server": server,
+                    "alerts_actual": _alerts(a),
+                    "alerts_candidata": _alerts(b),
+                    "delta": _alerts(b) - _alerts(a),
+                    "records_changed": changed,
+                })
+        result["records_changed"] = sum(d["records_changed"] for d in diffs)
+        diffs.sort(key=lambda d: (-abs(d["delta"]), -d["records_changed"], d["server"]))
+        result["top_servers"] = diffs[:top]
+
+    if verify:
+        name = "candidata" if "candidata" in replays else "actual"
+        cfg = candidate if name == "candidata" else current
+        result["verify"] = {"scenario": name, **verify_sample(config, history, replays[name], cfg.thresholds_for, verify)}
+    return result
+
+
+def format_backtest(result: dict) -> str:
+    lines = [f"Backtest de umbrales: {result['servers']} servidores, últimos {result['days']} días", ""]
+    lines.append(format_rows(result["scenarios"]))
+    lines += ["", "Ejecuciones en que dispara cada regla:", format_rows(result["rules"])]
+    if "top_servers" in result:
+        lines += [
+            "",
+            f"Registros con otro nivel en la candidata: {result['records_changed']}",
+            format_rows(result["top_servers"]),
+        ]
+    if "verify" in result:
+        v = result["verify"]
+        lines += ["", f"Verificación ({v['scenario']}): {v['checked']} registros, {len(v['mismatches'])} diferencias"]
+        if v["mismatches"]:
+            lines.append(format_rows(v["mismatches"]))
+    return "\n".join(lines)
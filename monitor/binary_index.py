@@ -0,0 +1,238 @@
+import threading
+
+from monitor.archive import open_index
+from monitor.collectors import get_binary_inventory, get_file_signatures
+
+# Inventario de binarios de la flota con deduplicación por hash.
+#
+# Cada servidor envía ruta + SHA256 de los ejecutables de servicios y
+# procesos. La firma Authenticode se verifica una sola vez por hash: el
+# veredicto queda en la tabla binary_hashes del índice del archivo y se
+# reutiliza en todos los servidores y en las ejecuciones siguientes. Solo se
+# pide a un servidor la firma de los hashes que nadie verificó todavía.
+#
+# Los hashes que no estaban en el índice al inicio de la ejecución son el
+# diff de la flota contra la ejecución anterior ("binarios nuevos"). Un hash
+# cuya firma no se pudo verificar se guarda igual, sin veredicto: deja de
+# ser nuevo y se vuelve a verificar en la próxima ejecución que lo vea.
+#
+# Config (sección "BinaryInventory"):
+#   Enabled:     usar el inventario en lugar del check por servidor (false)
+#   WaitSeconds: espera máxima por un hash que está verificando otro servidor (300)
+
+DEFAULT_WAIT_SECONDS = 300
+
+
+class BinaryIndex:
+    def __init__(self, config: dict, run_ts: str, wait_seconds: float = DEFAULT_WAIT_SECONDS):
+        self.config = config
+        self.run_ts = run_ts
+        self.wait_seconds = wait_seconds
+        self._cond = threading.Condition()
+        self._verdicts = {}    # sha256 -> {"SignatureStatus", "CertSubject", "CertIssuer"}
+        self._claimed = set()  # hashes que está verificando algún servidor
+        self._seen = {}        # sha256 -> {"servers": set, "path": str}
+        self._first = {}       # sha256 -> (servidor, ruta) de los hashes nuevos
+
+        self._known_at_start = set()
+        conn = open_index(config)
+        try:
+            for sha, status, subject, issuer in conn.execute(
+                "SELECT sha256, signature_status, cert_subject, cert_issuer FROM binary_hashes"
+            ):
+                self._known_at_start.add(sha)
+                if status is not None:
+                    self._verdicts[sha] = {"SignatureStatus": status, "CertSubject": subject, "CertIssuer": issuer}
+        finally:
+            conn.close()
+        # Hashes conocidos pero sin veredicto (la verificación falló)
+        self._unverified_at_start = self._known_at_start - set(self._verdicts)
+
+    def claim(self, hashes):
+        """
+        Clasifica los hashes de un servidor en (veredictos conocidos,
+        hashes que debe verificar este servidor, hashes que verifica otro).
+        """
+        known, to_verify, pending = {}, [], []
+        with self._cond:
+            for sha in hashes:
+                if sha in self._verdicts:
+                    known[sha] = self._verdicts[sha]
+                elif sha in self._claimed:
+                    pending.append(sha)
+                else:
+                    self._claimed.add(sha)
+                    to_verify.append(sha)
+        return known, to_verify, pending
+
+    def record(self, verdicts: dict, claimed) -> None:
+        """Publica los veredictos y libera los hashes reclamados (aun sin veredicto)."""
+        with self._cond:
+            self._verdicts.update(verdicts)
+            self._claimed.difference_update(claimed)
+            self._cond.notify_all()
+
+    def wait_for(self, hashes) -> dict:
+        """
+        Espera los veredictos que está calculando otro servidor. Los que no
+        llegan (el otro servidor falló o venció la espera) no se devuelven.
+        """
+        hashes = set(hashes)
+        with self._cond:
+            self._cond.wait_for(
+                lambda: all(sha in self._verdicts or sha not in self._claimed for sha in hashes),
+                timeout=self.wait_seconds,
+            )
+            return {sha: self._verdicts[sha] for sha in hashes if sha in self._verdicts}
+
+    def note_sightings(self, server: str, items) -> None:
+        with self._cond:
+            for item in items:
+                sha = item.get("Sha256")
+                if not sha:
+                    continue
+                seen = self._seen.setdefault(sha, {"servers": set(), "path": item.get("Path")})
+                seen["servers"].add(server)
+                if sha not in self._known_at_start and sha not in self._first:
+                    self._first[sha] = (server, item.get("Path"))
+
+    def checkpoint_data(self, server: str):
+        """Hashes vistos en el servidor y veredictos nuevos de esta ejecución (para el checkpoint)."""
+        with self._cond:
+            sightings = [
+                {"Sha256": sha, "Path": seen["path"]}
+                for sha, seen in self._seen.items() if server in seen["servers"]
+            ]
+            if not sightings:
+                return None
+            verdicts = {
+                item["Sha256"]: self._verdicts[item["Sha256"]] for item in sightings
+                if item["Sha256"] in self._verdicts
+                and (item["Sha256"] not in self._known_at_start or item["Sha256"] in self._unverified_at_start)
+            }
+        return {"sightings": sightings, "verdicts": verdicts}
+
+    def replay(self, server: str, data: dict) -> None:
+        """Vuelve a aplicar lo guardado por checkpoint_data (ejecución retomada)."""
+        self.record(data.get("verdicts") or {}, ())
+        self.note_sightings(server, data.get("sightings") or [])
+
+    def new_binaries(self) -> list:
+        """
+        Hashes vistos por primera vez en esta ejecución, con su veredicto y
+        los servidores donde aparecen. Vacío en la primera ejecución (sin
+        línea base no hay diff).
+        """
+        if not self._known_at_start:
+            return []
+        out = []
+        for sha, (server, path) in self._first.items():
+            verdict = self._verdicts.get(sha) or {}
+            out.append({
+                "Sha256": sha,
+                "Path": path,
+                "FirstServer": server,
+                "Servers": sorted(self._seen[sha]["servers"]),
+                "SignatureStatus": verdict.get("SignatureStatus"),
+            })
+        out.sort(key=lambda b: (-len(b["Servers"]), b["Path"] or ""))
+        return out
+
+    def save(self) -> None:
+        """
+        Guarda los hashes nuevos (con veredicto o sin él), los veredictos
+        obtenidos para hashes que no lo tenían y actualiza last_seen.
+        """
+        new_rows = []
+        for sha, (server, path) in self._first.items():
+            verdict = self._verdicts.get(sha) or {}
+            new_rows.append((
+                sha, verdict.get("SignatureStatus"), verdict.get("CertSubject"), verdict.get("CertIssuer"),
+                self.run_ts, server, path, self.run_ts, len(self._seen[sha]["servers"]),
+            ))
+        verified_rows = [
+            (v.get("SignatureStatus"), v.get("CertSubject"), v.get("CertIssuer"), sha)
+            for sha, v in self._verdicts.items() if sha in self._unverified_at_start
+        ]
+        seen_rows = [
+            (self.run_ts, len(seen["servers"]), sha)
+            for sha, seen in self._seen.items() if sha in self._known_at_start
+        ]
+        conn = open_index(self.config)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO binary_hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    new_rows,
+                )
+                conn.executemany(
+                    "UPDATE binary_hashes SET signature_status = ?, cert_subject = ?, cert_issuer = ? "
+                    "WHERE sha256 = ?",
+                    verified_rows,
+                )
+                conn.executemany(
+                    "UPDATE binary_hashes SET last_seen = ?, servers_count = ? WHERE sha256 = ?",
+                    seen_rows,
+                )
+        finally:
+            conn.close()
+
+
+def _signatures_by_hash(session, hashes, path_by_hash) -> dict:
+    paths = {path_by_hash[sha]: sha for sha in hashes}
+    signatures = get_file_signatures(session, list(paths))
+    return {sha: signatures[path] for path, sha in paths.items() if path in signatures}
+
+
+def inventory_unsigned_binaries(session, index: BinaryIndex, server: str, max_items: int = 200):
+    """
+    Devuelve los binarios del servidor sin firma o con firma inválida
+    (misma forma que get_unsigned_or_invalid_binaries, más Sha256),
+    verificando solo los hashes que la flota no conoce todavía.
+    """
+    items = get_binary_inventory(session, check_processes=True, max_items=max_items)
+    path_by_hash = {}
+    for item in items:
+        if item.get("Sha256"):
+            path_by_hash.setdefault(item["Sha256"], item["Path"])
+
+    verdicts, to_verify, pending = index.claim(path_by_hash)
+    verified = {}
+    try:
+        if to_verify:
+            verified = _signatures_by_hash(session, to_verify, path_by_hash)
+            verdicts.update(verified)
+    finally:
+        index.record(verified, to_verify)
+
+    if pending:
+        verdicts.update(index.wait_for(pending))
+        missing = [sha for sha in pending if sha not in verdicts]
+        if missing:
+            verdicts.update(_signatures_by_hash(session, missing, path_by_hash))
+
+    # Sin hash (p.ej. acceso denegado): se verifica por ruta en este servidor
+    no_hash = sorted({item["Path"] for item in items if not item.get("Sha256") and item.get("Path")})
+    by_path = get_file_signatures(session, no_hash) if no_hash else {}
+
+    index.note_sightings(server, items)
+
+    unsigned = []
+    for item in items:
+        verdict = verdicts.get(item.get("Sha256")) or by_path.get(item.get("Path"))
+        if not verdict or verdict.get("SignatureStatus") == "Valid":
+            continue
+        entry = {k: v for k, v in item.items() if v is not None or k == "DisplayName"}
+        entry.update(verdict)
+        unsigned.append(entry)
+    return unsigned
+
+
+def apply_new_binaries(servers_data, new_binaries) -> None:
+    """Agrega a cada servidor la lista "new_binaries" de hashes nuevos en los que aparece."""
+    per_server = {}
+    for b in new_binaries:
+        for name in b["Servers"]:
+            per_server.setdefault(name, []).append(b)
+    for s in servers_data:
+        s["new_binaries"] = per_server.get(s["name"], [])
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Checkpoint de la ejecución en curso.
+#
+# Cada servidor recolectado con éxito se agrega al archivo de checkpoint
+# (una línea JSON, con fsync) apenas termina. Si el proceso muere a mitad de
+# la flota, "main.py run --resume" retoma la misma ejecución (mismo run_ts)
+# y solo recolecta los servidores que faltan; el reporte, el estado y el
+# archivo se generan una sola vez al final, como en una ejecución normal.
+# Al terminar la ejecución el checkpoint se borra.
+#
+# Junto con cada servidor se guarda lo que su recolección aportó a los
+# inventarios de la ejecución (binarios, servicios); al retomar se vuelve a
+# cargar en esos objetos para que sus líneas base avancen igual que en una
+# ejecución sin cortes.
+#
+# Config (sección "Checkpoint"):
+#   Path:              archivo de checkpoint ("checkpoint.jsonl")
+#   ResumeWindowHours: antigüedad máxima de una ejecución para retomarla (24)
+
+DEFAULT_RESUME_WINDOW_HOURS = 24
+
+
+def _get_checkpoint_path(config: dict) -> str:
+    path = config.get("Checkpoint", {}).get("Path", "checkpoint.jsonl")
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    return path
+
+
+def _truncate_partial_line(path: str) -> None:
+    """
+    Recorta una última línea a medio escribir (proceso cortado durante un
+    record) para que el próximo record no quede pegado a ella.
+    """
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_checkpoint(path: str):
+    """
+    Devuelve (run_ts, {servidor: (server_data, new_state)}, {servidor: inventarios})
+    o (None, {}, {}).
+    """
+    run_ts = None
+    completed = {}
+    inventory = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Última línea a medio escribir cuando se cortó el proceso
+                    continue
+                if "run_ts" in record:
+                    run_ts = record["run_ts"]
+                elif run_ts is not None and "name" in record:
+                    completed[record["name"]] = (record["server_data"], record["new_state"])
+                    if record.get("inventory"):
+                        inventory[record["name"]] = record["inventory"]
+    except FileNotFoundError:
+        pass
+    return run_ts, completed, inventory
+
+
+class RunCheckpoint:
+    def __init__(self, path: str, run_ts: str, completed: dict = None, inventory: dict = None):
+        self.path = path
+        self.run_ts = run_ts
+        self.completed = completed or {}
+        self.inventory = inventory or {}   # servidor -> {objeto compartido: datos a reaplicar}
+        self._lock = threading.Lock()
+        self._finished = False
+
+    @classmethod
+    def start(cls, config: dict, run_ts: str, resume: bool = False) -> "RunCheckpoint":
+        """
+        Con resume=True retoma la ejecución del checkpoint si está dentro de
+        ResumeWindowHours; si no, o sin resume, empieza uno nuevo con run_ts.
+        """
+        path = _get_checkpoint_path(config)
+        window = config.get("Checkpoint", {}).get("ResumeWindowHours", DEFAULT_RESUME_WINDOW_HOURS)
+
+        if resume:
+            prev_ts, completed, inventory = _read_checkpoint(path)
+            if prev_ts is not None:
+                age = datetime.fromisoformat(run_ts) - datetime.fromisoformat(prev_ts)
+                if age <= timedelta(hours=window):
+                    _truncate_partial_line(path)
+                    print(f"Retomando la ejecución {prev_ts}: {len(completed)} servidores ya recolectados.")
+                    return cls(path, prev_ts, completed, inventory)
+                print(f"El checkpoint de {prev_ts} es más antiguo que {window} h; se inicia una ejecución nueva.")
+            else:
+                print("No hay checkpoint para retomar; se inicia una ejecución nueva.")
+        elif os.path.exists(path):
+            print("Se descarta el checkpoint de una ejecución anterior incompleta (usar --resume para retomarla).")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"run_ts": run_ts}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(path, run_ts)
+
+    def record(self, name: str, server_data: dict, new_state: dict, inventory: dict = None) -> None:
+        entry = {"name": name, "server_data": server_data, "new_state": new_state}
+        if inventory:
+            entry["inventory"] = inventory
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._finished:
+                # Un servidor que terminó después del cierre de la ejecución
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finished = True
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,30 +1,128 @@
-import winrm
+from __future__ import annotations
+
+from base64 import b64decode
+import binascii
+import gzip
+import threading
+from typing import TYPE_CHECKING
 from monitor.analyzers import normalize_field
 from datetime import datetime, timedelta
 import json
 
-import warnings
-warnings.filterwarnings("ignore", category=UserWarning, module="winrm")
+if TYPE_CHECKING:
+    # Solo para las anotaciones: pywinrm se importa al abrir una sesión real
+    import winrm
+
+# Transferencia comprimida (Collectors.CompressOutput).
+#
+# WinRM envía el stdout en base64 dentro de sobres SOAP, así que un JSON
+# grande (eventos, conexiones, inventarios de binarios) crece bastante en
+# tránsito. Con la compresión activa, _run_ps_json envuelve el script para
+# que el servidor comprima su salida con gzip y la devuelva en base64 con el
+# prefijo "GZ:"; aquí se descomprime antes de parsear. Si el servidor no
+# puede comprimir (p.ej. ConstrainedLanguage) devuelve la salida normal, y si
+# la respuesta comprimida no se puede leer se repite el script sin comprimir
+# y la sesión queda en modo normal. Los scripts NDJSON (streaming) no se
+# comprimen: comprimir obligaría a esperar la salida completa.
+
+_GZIP_PREFIX = "GZ:"
+
+_GZIP_WRAPPER = r"""
+$__out = (& {{
+{script}
+}}) -join "`n"
+try {{
+    $__bytes = [Text.Encoding]::UTF8.GetBytes($__out)
+    $__ms = New-Object IO.MemoryStream
+    $__gz = New-Object IO.Compression.GZipStream($__ms, [IO.Compression.CompressionMode]::Compress)
+    $__gz.Write($__bytes, 0, $__bytes.Length)
+    $__gz.Close()
+    '{prefix}' + [Convert]::ToBase64String($__ms.ToArray())
+}} catch {{
+    $__out
+}}
+"""
+
+_compress_output = False
+
+
+class TransferStats:
+    """Bytes de salida de _run_ps_json en la ejecución: sin comprimir vs. recibidos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.compressed_calls = 0
+            self.fallbacks = 0
+            self.raw_bytes = 0
+            self.wire_bytes = 0
+
+    def add(self, raw_bytes: int, wire_bytes: int, compressed: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.compressed_calls += int(compressed)
+            self.raw_bytes += raw_bytes
+            self.wire_bytes += wire_bytes
+
+    def add_fallback(self) -> None:
+        with self._lock:
+            self.fallbacks += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "compressed_calls": self.compressed_calls,
+                "fallbacks": self.fallbacks,
+                "raw_bytes": self.raw_bytes,
+                "wire_bytes": self.wire_bytes,
+                "ratio": round(self.raw_bytes / self.wire_bytes, 2) if self.wire_bytes else None,
+            }
 
-def create_session(host: str, username: str, password: str) -> winrm.Session:
-    # Para dev en Windows y prod en Linux, WinRM funciona igual si tienes conectividad y credenciales
-    print (f"Creating WinRM session to {host} with user {username}")
-    return winrm.Session(
-        target=host,
-        auth=(username, password),
-        transport='ntlm'  # puedes cambiar a 'kerberos' si configuras SPN, etc.
-    )
 
-def _run_ps_json(session: winrm.Session, script: str):
-    # print (f"Running PowerShell script:\n{script}")
-    result = session.run_ps(script)
-    # print (f"PowerShell script executed with status code {result.status_code}")
-    # print (f"StdOut: {result.std_out.decode('utf-8', errors='ignore')}")
+transfer_stats = TransferStats()
+
+
+def configure_transfer(compress: bool) -> None:
+    """Activa o desactiva la salida comprimida para toda la ejecución."""
+    global _compress_output
+    _compress_output = bool(compress)
 
+
+def _decode_gzip_output(out: str) -> str:
+    return gzip.decompress(b64decode(out[len(_GZIP_PREFIX):])).decode("utf-8", errors="ignore")
+
+
+def _run_ps_output(session: winrm.Session, script: str):
+    """stdout del script como texto, o None si el script falló."""
+    compress = _compress_output and getattr(session, "compress_output", True)
+    result = session.run_ps(_GZIP_WRAPPER.format(script=script, prefix=_GZIP_PREFIX) if compress else script)
     if result.status_code != 0:
-        # print(f"PowerShell script failed with status {result.status_code}: {result.std_err.decode('utf-8', errors='ignore')}")
         return None
     out = result.std_out.decode('utf-8', errors='ignore').strip()
+
+    if not out.startswith(_GZIP_PREFIX):
+        transfer_stats.add(len(result.std_out), len(result.std_out))
+        return out
+    try:
+        text = _decode_gzip_output(out)
+    except (binascii.Error, OSError, EOFError):
+        # Respuesta comprimida ilegible: se repite sin comprimir y la
+        # sesión sigue en modo normal
+        session.compress_output = False
+        transfer_stats.add_fallback()
+        return _run_ps_output(session, script)
+    transfer_stats.add(len(text.encode("utf-8")), len(result.std_out), compressed=True)
+    return text
+
+
+def _run_ps_json(session: winrm.Session, script: str):
+    # print (f"Running PowerShell script:\n{script}")
+    out = _run_ps_output(session, script)
     if not out:
         return None
     try:
@@ -32,6 +130,30 @@ def _run_ps_json(session: winrm.Session, script: str):
     except json.JSONDecodeError:
         return None
 
+def _iter_ps_ndjson(session: winrm.Session, script: str):
+    """
+    Itera los objetos de un script que emite un JSON compacto por línea
+    (ConvertTo-Json -Compress dentro de ForEach-Object). Con sesiones que
+    soportan streaming (iter_ps_lines) la memoria queda acotada a un bloque
+    de salida; con las demás se lee el stdout completo.
+    """
+    if hasattr(session, "iter_ps_lines"):
+        lines = session.iter_ps_lines(script)
+    else:
+        result = session.run_ps(script)
+        if result.status_code != 0:
+            return
+        lines = result.std_out.decode('utf-8', errors='ignore').splitlines()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
 def get_system_resources(session: winrm.Session):
     disk_script = r"""
     $ErrorActionPreference="SilentlyContinue"
@@ -90,14 +212,117 @@ def get_system_resources(session: winrm.Session):
         "cpu": cpu,
     }
 
+# Contadores de rendimiento muestreados con Get-Counter: clave -> ruta.
+# Las instancias (*) se suman por muestra (p.ej. todas las interfaces de red).
+PERF_COUNTERS = {
+    "cpu_percent": r"\Processor(_Total)\% Processor Time",
+    "processor_queue": r"\System\Processor Queue Length",
+    "available_mb": r"\Memory\Available MBytes",
+    "disk_queue": r"\PhysicalDisk(_Total)\Avg. Disk Queue Length",
+    "disk_sec_per_transfer": r"\PhysicalDisk(_Total)\Avg. Disk sec/Transfer",
+    "net_bytes_per_sec": r"\Network Interface(*)\Bytes Total/sec",
+}
+
+
+def get_performance_counters(session: winrm.Session, sample_seconds: int = 5):
+    """
+    Recursos del sistema en una sola llamada: muestrea PERF_COUNTERS con
+    Get-Counter (una muestra por segundo durante sample_seconds) y agrega
+    discos y memoria total por CIM. Devuelve la misma estructura que
+    get_system_resources (CPU y memoria libre como promedio de la ventana)
+    más "counters": {clave: {"Min", "Avg", "Max"}}.
+
+    Get-Counter usa nombres de contadores localizados: en un Windows en otro
+    idioma falla y el script toma la CPU de Win32_Processor (sin "counters").
+    Si la llamada completa falla, se usa get_system_resources.
+    """
+    counters = "\n".join(f"        '{key}' = '{path}'" for key, path in PERF_COUNTERS.items())
+    script = rf"""
+    $ErrorActionPreference="SilentlyContinue"
+    $WarningPreference="SilentlyContinue"
+
+    $counters = [ordered]@{{
+{counters}
+    }}
+    $stats = $null
+    $cpuPercent = $null
+    try {{
+        $sets = Get-Counter -Counter @($counters.Values) -SampleInterval 1 -MaxSamples {max(1, int(sample_seconds))} -ErrorAction Stop
+        $stats = [ordered]@{{}}
+        foreach ($key in $counters.Keys) {{
+            $values = foreach ($set in $sets) {{
+                [double](($set.CounterSamples | Where-Object {{ $_.Path -like "*$($counters[$key])" }} |
+                          Measure-Object -Property CookedValue -Sum).Sum)
+            }}
+            $m = $values | Measure-Object -Minimum -Maximum -Average
+            $stats[$key] = [PSCustomObject]@{{
+                Min = [math]::Round($m.Minimum, 4)
+                Avg = [math]::Round($m.Average, 4)
+                Max = [math]::Round($m.Maximum, 4)
+            }}
+        }}
+    }}
+    catch {{
+        $cpuPercent = [math]::Round((Get-CimInstance Win32_Processor | Measure-Object -Property LoadPercentage -Average).Average, 2)
+    }}
+
+    $os = Get-CimInstance Win32_OperatingSystem
+    $disk = @(Get-CimInstance Win32_LogicalDisk -Filter "DriveType=3" |
+        Select-Object DeviceID,
+            @{{Name="SizeGB";Expression={{[math]::Round($_.Size/1GB,2)}}}},
+            @{{Name="FreeGB";Expression={{[math]::Round($_.FreeSpace/1GB,2)}}}})
+
+    [PSCustomObject]@{{
+        Counters = $stats
+        CPUPercent = $cpuPercent
+        TotalMemoryGB = [math]::Round($os.TotalVisibleMemorySize/1MB,2)
+        FreeMemoryGB = [math]::Round($os.FreePhysicalMemory/1MB,2)
+        Disk = $disk
+    }} | ConvertTo-Json -Depth 4
+    """
+
+    print(f"    - Muestreando contadores de rendimiento ({sample_seconds} s)...")
+    data = _run_ps_json(session, script)
+    if not isinstance(data, dict):
+        return get_system_resources(session)
+
+    stats = data.get("Counters") or {}
+    counters = {key: stats[key] for key in PERF_COUNTERS if isinstance(stats.get(key), dict)}
+    if "disk_sec_per_transfer" in counters:
+        # Latencia en ms, más legible que segundos por transferencia
+        counters["disk_latency_ms"] = {
+            k: round(v * 1000, 2) for k, v in counters.pop("disk_sec_per_transfer").items() if v is not None
+        }
+
+    cpu = data.get("CPUPercent")
+    if "cpu_percent" in counters:
+        cpu = round(counters["cpu_percent"]["Avg"], 2)
+    free_gb = data.get("FreeMemoryGB")
+    if "available_mb" in counters:
+        free_gb = round(counters["available_mb"]["Avg"] / 1024, 2)
+
+    disk = data.get("Disk") or []
+    if isinstance(disk, dict):
+        disk = [disk]
+
+    resources = {
+        "disk": disk,
+        "memory": {"TotalGB": data.get("TotalMemoryGB"), "FreeGB": free_gb},
+        "cpu": {"CPUPercent": cpu} if cpu is not None else {},
+    }
+    if counters:
+        resources["counters"] = counters
+    return resources
+
+
 def get_critical_services_status(session: winrm.Session, service_names):
     if not service_names:
         return []
 
     services_str = ",".join([f"'{s}'" for s in service_names])
+    # Get-Service -Name consulta solo esos servicios (sin listar todos)
     script = rf"""
-        Get-Service |
-        Where-Object {{ $_.Name -in @({services_str}) }} |
+        Get-Service -Name @({services_str}) -ErrorAction SilentlyContinue |
         Select-Object Name, DisplayName,
             @{{
                 Name = 'Status'
@@ -121,6 +346,65 @@ def get_critical_services_status(session: winrm.Session, service_names):
     
     return services
 
+def get_service_inventory(session: winrm.Session):
+    """
+    Inventario completo de servicios en forma compacta: una fila
+    [Name, DisplayName, State, StartMode, PathName] por servicio.
+    """
+    script = r"""
+    $serviceRows = @(Get-CimInstance Win32_Service | ForEach-Object {
+        ,@($_.Name, $_.DisplayName, [string]$_.State, [string]$_.StartMode, [string]$_.PathName)
+    })
+    ConvertTo-Json -InputObject $serviceRows -Depth 3 -Compress
+    """
+    rows = _run_ps_json(session, script)
+    if not rows:
+        return []
+    # Un solo servicio llega como fila suelta
+    if rows and not isinstance(rows[0], list):
+        rows = [rows]
+    return [
+        {"Name": r[0], "DisplayName": r[1], "Status": r[2], "StartMode": r[3], "PathName": r[4]}
+        for r in rows if isinstance(r, list) and len(r) >= 5
+    ]
+
+def _events_ndjson_script(log_name: str, since: str, max_events: int, extra_filter: str = "") -> str:
+    return rf"""
+    Get-WinEvent -LogName '{log_name}' -MaxEvents {max_events} |
+    Where-Object {{ $_.TimeCreated -gt [datetime]'{since}'{extra_filter} }} |
+    ForEach-Object {{
+        $_ | Select-Object TimeCreated, Id, LevelDisplayName, ProviderName, Message |
+        ConvertTo-Json -Depth 3 -Compress
+    }}
+    """
+
+def iter_recent_events(session: winrm.Session, log_name: str, hours: int = 24, max_events: int = 300):
+    """
+    Igual que get_recent_events pero entrega los eventos de a uno (streaming).
+    """
+    since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S')
+    return _iter_ps_ndjson(session, _events_ndjson_script(log_name, since, max_events))
+
+def iter_logon_events(session: winrm.Session, hours: int = 24, max_events: int = 300):
+    """
+    Logons correctos y fallidos (4624/4625) del log Security, en streaming.
+    En lugar del Message renderizado se envía Properties (valores de
+    EventData como texto); los campos se extraen con monitor/event_schema.py.
+    """
+    since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S')
+    script = rf"""
+    Get-WinEvent -FilterHashtable @{{ LogName = 'Security'; Id = 4624, 4625; StartTime = [datetime]'{since}' }} -MaxEvents {max_events} -ErrorAction SilentlyContinue |
+    ForEach-Object {{
+        [pscustomobject]@{{
+            TimeCreated  = $_.TimeCreated.ToString('o')
+            Id           = $_.Id
+            ProviderName = $_.ProviderName
+            Properties   = @($_.Properties | ForEach-Object {{ "$($_.Value)" }})
+        }} | ConvertTo-Json -Depth 3 -Compress
+    }}
+    """
+    return _iter_ps_ndjson(session, script)
+
 def get_recent_events(session: winrm.Session, log_name: str, hours: int = 24, max_events: int = 300):
     since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S')
     script = rf"""
@@ -143,19 +427,7 @@ def get_recent_events(session: winrm.Session, log_name: str, hours: int = 24, ma
 # events_app      = get_recent_events(session, "Application", 24, 200)
 
 
-def get_security_updates_status(session: winrm.Session):
-    """
-    Obtiene estado de actualizaciones de seguridad.
-    Intenta usar PSWindowsUpdate; si no, hace un fallback a Get-HotFix.
-    Siempre devuelve la misma estructura:
-      {
-        "PendingCount": int | 0,
-        "PendingSecurityCount": int | 0,
-        "PendingTitles": [str],
-        "RecentInstalled": [ { "Date": ..., "Title": ..., "Result": ... } ]
-      }
-    """
-    script = r"""
+SECURITY_UPDATES_SCRIPT = r"""
     $result = [PSCustomObject]@{
         PendingCount = 0
         PendingSecurityCount = 0
@@ -204,7 +476,23 @@ def get_security_updates_status(session: winrm.Session):
     $result | ConvertTo-Json -Depth 4
     """
 
-    data = _run_ps_json(session, script)
+
+def get_security_updates_status(session: winrm.Session):
+    """
+    Obtiene estado de actualizaciones de seguridad.
+    Intenta usar PSWindowsUpdate; si no, hace un fallback a Get-HotFix.
+    Siempre devuelve la misma estructura:
+      {
+        "PendingCount": int | 0,
+        "PendingSecurityCount": int | 0,
+        "PendingTitles": [str],
+        "RecentInstalled": [ { "Date": ..., "Title": ..., "Result": ... } ]
+      }
+    """
+    return normalize_security_updates(_run_ps_json(session, SECURITY_UPDATES_SCRIPT))
+
+
+def normalize_security_updates(data):
     if data is None:
         data = {
             "PendingCount": 0,
@@ -269,36 +557,30 @@ def get_critical_events_summary(session: winrm.Session, hours: int = 24, max_eve
     since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S')
 
     for log in logs:
-        script = rf"""
-        Get-WinEvent -LogName '{log}' -MaxEvents {max_events_per_log} |
-        Where-Object {{ $_.TimeCreated -gt [datetime]'{since}' -and ($_.LevelDisplayName -eq 'Error' -or $_.LevelDisplayName -eq 'Critical') }} |
-        Select-Object TimeCreated, Id, LevelDisplayName, ProviderName, Message |
-        ConvertTo-Json -Depth 3
-        """
-        events = _run_ps_json(session, script)
-        if events is None:
-            events = []
-        if isinstance(events, dict):
-            events = [events]
+        # Streaming: solo se retienen el conteo y las primeras 10 muestras
+        script = _events_ndjson_script(
+            log, since, max_events_per_log,
+            extra_filter=" -and ($_.LevelDisplayName -eq 'Error' -or $_.LevelDisplayName -eq 'Critical')",
+        )
+        count = 0
+        samples = []
+        for event in _iter_ps_ndjson(session, script):
+            count += 1
+            if len(samples) < 10:
+                samples.append(event)
 
         summary[log] = {
-            "count": len(events),
-            "samples": events[:10]  # primeros 10 para reporte
+            "count": count,
+            "samples": samples  # primeros 10 para reporte
         }
 
     return summary
 
-def get_paths_size(session: winrm.Session, paths):
-    """
-    Devuelve tamaño total (GB) por ruta de log.
-    """
-    if not paths:
-        return {}
-
+def paths_size_script(paths) -> str:
     # Sanitizar rutas en PowerShell
     ps_paths = ",".join([f"'{p}'" for p in paths])
 
-    script = rf"""
+    return rf"""
     $result = @()
 
     foreach ($path in @({ps_paths})) {{
@@ -319,7 +601,17 @@ def get_paths_size(session: winrm.Session, paths):
     $result | ConvertTo-Json -Depth 3
     """
 
-    sizes = _run_ps_json(session, script)
+
+def get_paths_size(session: winrm.Session, paths):
+    """
+    Devuelve tamaño total (GB) por ruta de log.
+    """
+    if not paths:
+        return {}
+    return parse_paths_size(_run_ps_json(session, paths_size_script(paths)))
+
+
+def parse_paths_size(sizes) -> dict:
     if sizes is None:
         return {}
     if isinstance(sizes, dict):
@@ -418,4 +710,114 @@ def get_unsigned_or_invalid_binaries(session: winrm.Session, check_processes: bo
     if isinstance(data, dict):
         data = [data]
 
-    return data
\ No newline at end of file
+    return data
+
+def get_binary_inventory(session: winrm.Session, check_processes: bool = True, max_items: int = 200):
+    """
+    Inventario de ejecutables de servicios y procesos con su SHA256, sin
+    verificar firmas (eso se hace una sola vez por hash en toda la flota,
+    ver monitor/binary_index.py). El hash se calcula una vez por ruta.
+    """
+    script = rf"""
+    $result = @()
+    $hashes = @{{}}
+
+    function Get-PathHash($path) {{
+        if (-not $hashes.ContainsKey($path)) {{
+            $hashes[$path] = (Get-FileHash -Algorithm SHA256 -Path $path -ErrorAction SilentlyContinue).Hash
+        }}
+        return $hashes[$path]
+    }}
+
+    # 1) Servicios
+    try {{
+        $services = Get-CimInstance Win32_Service | Select-Object Name, DisplayName, PathName | Select-Object -First {max_items}
+        foreach ($svc in $services) {{
+            $path = $svc.PathName
+            if (-not [string]::IsNullOrWhiteSpace($path)) {{
+                $clean = $path.Split('"') | Where-Object {{ $_ -like '*.exe' -or $_ -like '*.dll' -or $_ -like '*.sys' }} | Select-Object -First 1
+                if (-not $clean) {{
+                    $clean = $path.Split(' ')[0]
+                }}
+                $clean = $clean.Trim()
+
+                if (Test-Path $clean) {{
+                    $result += [PSCustomObject]@{{
+                        Type = 'Service'
+                        Name = $svc.Name
+                        DisplayName = $svc.DisplayName
+                        Path = $clean
+                        Sha256 = Get-PathHash $clean
+                    }}
+                }}
+            }}
+        }}
+    }} catch {{ }}
+
+    # 2) Procesos
+    if ({'$true' if check_processes else '$false'}) {{
+        try {{
+            $procs = Get-Process | Select-Object Name, Id, Path | Where-Object {{ $_.Path }} | Select-Object -First {max_items}
+            foreach ($p in $procs) {{
+                if (Test-Path $p.Path) {{
+                    $result += [PSCustomObject]@{{
+                        Type = 'Process'
+                        Name = $p.Name
+                        DisplayName = $null
+                        Path = $p.Path
+                        Pid = $p.Id
+                        Sha256 = Get-PathHash $p.Path
+                    }}
+                }}
+            }}
+        }} catch {{ }}
+    }}
+
+    $result | ConvertTo-Json -Depth 3 -Compress
+    """
+
+    data = _run_ps_json(session, script)
+    if data is None:
+        return []
+    if isinstance(data, dict):
+        data = [data]
+    return data
+
+
+def get_file_signatures(session: winrm.Session, paths):
+    """
+    Estado de firma Authenticode de una lista de rutas.
+    Devuelve { ruta: {"SignatureStatus", "CertSubject", "CertIssuer"} }.
+    """
+    if not paths:
+        return {}
+
+    ps_paths = ",".join("'" + p.replace("'", "''") + "'" for p in paths)
+    script = rf"""
+    $result = @()
+    $signaturePaths = @({ps_paths})
+    foreach ($path in $signaturePaths) {{
+        $sig = Get-AuthenticodeSignature -FilePath $path -ErrorAction SilentlyContinue
+        $result += [PSCustomObject]@{{
+            Path = $path
+            SignatureStatus = if ($sig) {{ $sig.Status.ToString() }} else {{ 'UnknownError' }}
+            CertSubject = $sig.SignerCertificate.Subject
+            CertIssuer = $sig.SignerCertificate.Issuer
+        }}
+    }}
+    $result | ConvertTo-Json -Depth 3 -Compress
+    """
+
+    data = _run_ps_json(session, script)
+    if data is None:
+        return {}
+    if isinstance(data, dict):
+        data = [data]
+    return {
+        d["Path"]: {
+            "SignatureStatus": d.get("SignatureStatus"),
+            "CertSubject": d.get("CertSubject"),
+            "CertIssuer": d.get("CertIssuer"),
+        }
+        for d in data if d.get("Path")
+    }
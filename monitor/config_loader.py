@@ -1,9 +1,239 @@
 import json
 import os
+import threading
+from dataclasses import dataclass, field
+
+from monitor.analyzers import DEFAULT_THRESHOLDS
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(BASE_DIR, "config", "config.json")
+
+TRANSPORTS = ("ntlm", "kerberos", "basic", "ssl", "credssp", "simulated")
+
+
+class ConfigError(ValueError):
+    """Configuración inválida; el mensaje lista todos los problemas encontrados."""
+
 
 def load_config():
-    config_path = os.path.join(BASE_DIR, "config", "config.json")
+    config_path = CONFIG_PATH
     with open(config_path, "r", encoding="utf-8") as f:
         return json.load(f)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_thresholds(where: str, thresholds, errors: list) -> None:
+    if not isinstance(thresholds, dict):
+        errors.append(f"{where}: debe ser un objeto")
+        return
+    for key, value in thresholds.items():
+        if key not in DEFAULT_THRESHOLDS:
+            errors.append(f"{where}.{key}: umbral desconocido")
+        elif not _is_number(value):
+            errors.append(f"{where}.{key}: debe ser numérico")
+
+
+def _check_str_list(where: str, value, errors: list) -> None:
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        errors.append(f"{where}: debe ser una lista de textos")
+
+
+def validate_config(config: dict) -> None:
+    """
+    Valida la estructura de la configuración. Lanza ConfigError con todos
+    los problemas encontrados (no solo el primero).
+    """
+    errors = []
+
+    smtp = config.get("Smtp")
+    if not isinstance(smtp, dict):
+        errors.append("Smtp: sección requerida")
+    else:
+        for key in ("Host", "Username", "Password", "From", "To"):
+            if key not in smtp:
+                errors.append(f"Smtp.{key}: requerido")
+        if "To" in smtp:
+            _check_str_list("Smtp.To", smtp["To"], errors)
+
+    _check_thresholds("Thresholds", config.get("Thresholds", {}), errors)
+
+    groups = config.get("ThresholdGroups", {})
+    if not isinstance(groups, dict):
+        errors.append("ThresholdGroups: debe ser un objeto")
+        groups = {}
+    for group_name, group_thresholds in groups.items():
+        _check_thresholds(f"ThresholdGroups.{group_name}", group_thresholds, errors)
+
+    servers = config.get("Servers")
+    if not isinstance(servers, list) or not servers:
+        errors.append("Servers: debe ser una lista no vacía")
+        servers = []
+
+    auth = config.get("Auth", {})
+    auth_transport = auth.get("Transport", "ntlm") if isinstance(auth, dict) else "ntlm"
+    if auth_transport not in TRANSPORTS:
+        errors.append(f"Auth.Transport: debe ser uno de {', '.join(TRANSPORTS)}")
+
+    seen = set()
+    for i, s in enumerate(servers):
+        where = f"Servers[{i}]"
+        if not isinstance(s, dict):
+            errors.append(f"{where}: debe ser un objeto")
+            continue
+        name = s.get("Name")
+        if name:
+            where = f"Servers[{name}]"
+            if name in seen:
+                errors.append(f"{where}: nombre duplicado")
+            seen.add(name)
+        transport = s.get("Transport") or auth_transport
+        required = ("Name", "Host", "Username", "Password")
+        if transport in ("kerberos", "simulated"):
+            # Kerberos usa el TGT del ccache; el host simulado no autentica
+            required = ("Name", "Host")
+        for key in required:
+            if not isinstance(s.get(key), str) or not s.get(key):
+                errors.append(f"{where}.{key}: requerido")
+        if transport not in TRANSPORTS:
+            errors.append(f"{where}.Transport: debe ser uno de {', '.join(TRANSPORTS)}")
+        if "CriticalServices" in s:
+            _check_str_list(f"{where}.CriticalServices", s["CriticalServices"], errors)
+        if "LogPaths" in s:
+            _check_str_list(f"{where}.LogPaths", s["LogPaths"], errors)
+        if "Priority" in s and not _is_number(s["Priority"]):
+            errors.append(f"{where}.Priority: debe ser numérico")
+        if "Group" in s and s["Group"] not in groups:
+            errors.append(f"{where}.Group: grupo de umbrales '{s['Group']}' no definido")
+        if "Thresholds" in s:
+            _check_thresholds(f"{where}.Thresholds", s["Thresholds"], errors)
+
+    # Los inventarios son objetos de la ejecución local: los workers de la
+    # cola no los comparten con el coordinador
+    if config.get("WorkQueue", {}).get("Enabled"):
+        for section in ("BinaryInventory", "ServiceInventory"):
+            if config.get(section, {}).get("Enabled"):
+                errors.append(f"{section}.Enabled: no se puede usar junto con WorkQueue.Enabled")
+
+    profiles = config.get("ReportProfiles", [])
+    if not isinstance(profiles, list):
+        errors.append("ReportProfiles: debe ser una lista")
+        profiles = []
+    if profiles:
+        from monitor.report_html import REPORT_SECTIONS
+    profile_names = set()
+    for i, p in enumerate(profiles):
+        where = f"ReportProfiles[{i}]"
+        if not isinstance(p, dict):
+            errors.append(f"{where}: debe ser un objeto")
+            continue
+        if not isinstance(p.get("Name"), str) or not p.get("Name"):
+            errors.append(f"{where}.Name: requerido")
+        else:
+            where = f"ReportProfiles[{p['Name']}]"
+            if p["Name"] in profile_names:
+                errors.append(f"{where}: nombre duplicado")
+            profile_names.add(p["Name"])
+        for key in ("To", "Servers", "Groups", "Sections"):
+            if key in p:
+                _check_str_list(f"{where}.{key}", p[key], errors)
+        for section in p.get("Sections") or []:
+            if section not in REPORT_SECTIONS:
+                errors.append(f"{where}.Sections: sección desconocida '{section}'")
+        for group in p.get("Groups") or []:
+            if group not in groups:
+                errors.append(f"{where}.Groups: grupo de umbrales '{group}' no definido")
+        if p.get("MinLevel") not in (None, "WARNING", "CRITICAL"):
+            errors.append(f"{where}.MinLevel: debe ser WARNING o CRITICAL")
+
+    if errors:
+        raise ConfigError("Configuración inválida:\n  - " + "\n  - ".join(errors))
+
+
+def compile_thresholds(config: dict) -> dict:
+    """
+    Resuelve los umbrales efectivos de cada servidor:
+    DEFAULT_THRESHOLDS < Thresholds < ThresholdGroups[Group] < Thresholds del servidor.
+    Los servidores sin overrides comparten el mismo dict.
+    """
+    base = {**DEFAULT_THRESHOLDS, **config.get("Thresholds", {})}
+    groups = {
+        name: {**base, **overrides}
+        for name, overrides in config.get("ThresholdGroups", {}).items()
+    }
+
+    compiled = {}
+    for s in config["Servers"]:
+        effective = groups.get(s.get("Group"), base)
+        if s.get("Thresholds"):
+            effective = {**effective, **s["Thresholds"]}
+        compiled[s["Name"]] = effective
+    return compiled
+
+
+@dataclass(frozen=True)
+class MonitorConfig:
+    """Configuración validada y con umbrales precompilados por servidor."""
+    raw: dict
+    thresholds: dict = field(repr=False)
+    mtime: float = 0.0
+
+    @property
+    def servers(self) -> list:
+        return self.raw["Servers"]
+
+    def section(self, name: str) -> dict:
+        return self.raw.get(name, {})
+
+    def thresholds_for(self, server_name: str) -> dict:
+        return self.thresholds.get(server_name) or {**DEFAULT_THRESHOLDS, **self.raw.get("Thresholds", {})}
+
+
+def load_monitor_config(path: str = None) -> MonitorConfig:
+    """
+    Carga, valida y compila la configuración. Lanza ConfigError si es inválida.
+    """
+    path = path or CONFIG_PATH
+    mtime = os.stat(path).st_mtime
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    validate_config(raw)
+    return MonitorConfig(raw=raw, thresholds=compile_thresholds(raw), mtime=mtime)
+
+
+class ConfigWatcher:
+    """
+    Mantiene la última configuración válida y la recarga cuando cambia el
+    archivo. Si la nueva versión es inválida se conserva la anterior.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or CONFIG_PATH
+        self._lock = threading.Lock()
+        self._current = load_monitor_config(self.path)
+        self._rejected_mtime = None
+
+    @property
+    def current(self) -> MonitorConfig:
+        return self._current
+
+    def reload_if_changed(self) -> bool:
+        """Devuelve True si se cargó una versión nueva."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as ex:
+                print(f"No se pudo leer la configuración ({ex}); se mantiene la anterior.")
+                return False
+            if mtime in (self._current.mtime, self._rejected_mtime):
+                return False
+            try:
+                self._current = load_monitor_config(self.path)
+            except (ConfigError, ValueError, OSError) as ex:
+                self._rejected_mtime = mtime
+                print(f"Configuración nueva descartada: {ex}")
+                return False
+            print("Configuración recargada.")
+            return True
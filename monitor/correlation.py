@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+# Correlación de logons fallidos entre servidores.
+#
+# summarize_logons deja en cada servidor los conteos de 4625 por IP de origen
+# y por cuenta. Acá se indexan en mapas clave -> {servidor: intentos} para
+# toda la flota y se combinan con las últimas ejecuciones (ventana móvil
+# guardada en el estado). Una IP o cuenta que falla en muchos servidores,
+# aunque sean pocos intentos en cada uno, se reporta como campaña.
+#
+# Todo es lineal en la cantidad de pares (clave, servidor).
+#
+# Config (sección "Correlation"):
+#   MinServers:  servidores distintos para considerar campaña (5)
+#   MinAttempts: intentos totales mínimos (20)
+#   WindowHours: ventana de ejecuciones previas a combinar (72)
+
+DEFAULT_MIN_SERVERS = 5
+DEFAULT_MIN_ATTEMPTS = 20
+DEFAULT_WINDOW_HOURS = 72
+
+# Orígenes que no identifican a un atacante remoto
+IGNORED_SOURCES = {"127.0.0.1", "::1", "localhost"}
+
+_KINDS = (
+    ("source", "logons_fail_by_source"),
+    ("account", "logons_fail_by_account"),
+)
+
+
+def index_failed_logons(servers_data) -> dict:
+    """
+    { "source": {ip: {servidor: intentos}}, "account": {cuenta: {servidor: intentos}} }
+
+    Los servidores con recolección liviana traen los logons de un snapshot
+    anterior, que ya se indexó con su propio run_ts: no se vuelven a contar.
+    """
+    index = {kind: {} for kind, _ in _KINDS}
+    for s in servers_data:
+        if (s.get("collection") or {}).get("depth") == "light":
+            continue
+        logons = s.get("logons") or {}
+        for kind, field in _KINDS:
+            by_kind = index[kind]
+            for key, count in (logons.get(field) or {}).items():
+                if kind == "source" and key in IGNORED_SOURCES:
+                    continue
+                by_kind.setdefault(key, {})[s["name"]] = count
+    return index
+
+
+def _merge_window(history, index: dict, run_ts: str, window_hours: float):
+    """
+    Combina el índice actual con las ejecuciones de la ventana. Como cada
+    ejecución cuenta las últimas 24 h, para no contar dos veces los mismos
+    eventos se toma el máximo por (clave, servidor) y no la suma.
+    Devuelve (índice combinado, historial recortado incluyendo esta ejecución).
+    """
+    cutoff = (datetime.fromisoformat(run_ts) - timedelta(hours=window_hours)).isoformat()
+    kept = [h for h in history or [] if h.get("run_ts", "") >= cutoff and h.get("run_ts") != run_ts]
+
+    merged = {kind: {k: dict(v) for k, v in index[kind].items()} for kind, _ in _KINDS}
+    for h in kept:
+        for kind, _ in _KINDS:
+            target = merged[kind]
+            for key, per_server in (h.get(kind) or {}).items():
+                entry = target.setdefault(key, {})
+                for server, count in per_server.items():
+                    if count > entry.get(server, 0):
+                        entry[server] = count
+
+    kept.append({"run_ts": run_ts, **index})
+    return merged, kept
+
+
+def find_campaigns(index: dict, min_servers: int = DEFAULT_MIN_SERVERS,
+                   min_attempts: int = DEFAULT_MIN_ATTEMPTS) -> list:
+    """
+    Claves (IP o cuenta) con fallos en al menos min_servers servidores y
+    min_attempts intentos en total, de mayor a menor alcance.
+    """
+    campaigns = []
+    for kind, _ in _KINDS:
+        for key, per_server in index[kind].items():
+            if len(per_server) < min_servers:
+                continue
+            attempts = sum(per_server.values())
+            if attempts < min_attempts:
+                continue
+            campaigns.append({
+                "kind": kind,
+                "key": key,
+                "servers": sorted(per_server),
+                "servers_count": len(per_server),
+                "attempts": attempts,
+                "max_per_server": max(per_server.values()),
+            })
+    campaigns.sort(key=lambda c: (-c["servers_count"], -c["attempts"], c["kind"], c["key"]))
+    return campaigns
+
+
+def correlate_failed_logons(servers_data, history, correlation_conf: dict, run_ts: str):
+    """
+    Detecta campañas en la ejecución actual más la ventana previa.
+    Devuelve (campañas, historial nuevo para guardar en el estado).
+    """
+    correlation_conf = correlation_conf or {}
+    index = index_failed_logons(servers_data)
+    merged, new_history = _merge_window(
+        history, index, run_ts, correlation_conf.get("WindowHours", DEFAULT_WINDOW_HOURS)
+    )
+    campaigns = find_campaigns(
+        merged,
+        min_servers=correlation_conf.get("MinServers", DEFAULT_MIN_SERVERS),
+        min_attempts=correlation_conf.get("MinAttempts", DEFAULT_MIN_ATTEMPTS),
+    )
+    return campaigns, new_history
+
+
+def apply_campaigns(servers_data, campaigns) -> set:
+    """
+    Agrega a cada servidor la lista "logon_campaigns" en las que aparece
+    (vacía si ninguna). Devuelve los nombres de los servidores afectados.
+    """
+    per_server = {}
+    for c in campaigns:
+        for name in c["servers"]:
+            per_server.setdefault(name, []).append(c)
+    for s in servers_data:
+        s["logon_campaigns"] = per_server.get(s["name"], [])
+    return set(per_server)
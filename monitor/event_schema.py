@@ -0,0 +1,124 @@
+from operator import itemgetter
+
+# Extracción de campos de eventos a partir de EventData.
+#
+# Los recolectores envían de cada evento el arreglo Properties (los valores de
+# EventData en orden, como texto) en lugar del Message renderizado. La
+# posición de cada campo depende del Id del evento; el esquema de cada Id se
+# compila una sola vez en un itemgetter, de modo que extraer los campos de un
+# evento es una sola llamada sin recorrer texto.
+
+# Id -> {campo: posición en Properties}
+EVENT_SCHEMAS = {
+    4624: {
+        "TargetUserName": 5,
+        "TargetDomainName": 6,
+        "LogonType": 8,
+        "WorkstationName": 11,
+        "IpAddress": 18,
+        "IpPort": 19,
+    },
+    4625: {
+        "TargetUserName": 5,
+        "TargetDomainName": 6,
+        "Status": 7,
+        "FailureReason": 8,
+        "SubStatus": 9,
+        "LogonType": 10,
+        "WorkstationName": 13,
+        "IpAddress": 19,
+        "IpPort": 20,
+    },
+}
+
+# Códigos de SubStatus/Status de 4625
+FAILURE_STATUS_DESC = {
+    "0xC0000064": "Usuario inexistente",
+    "0xC000006A": "Contraseña incorrecta",
+    "0xC000006D": "Usuario o contraseña incorrectos",
+    "0xC000006F": "Fuera del horario permitido",
+    "0xC0000070": "Estación de trabajo no permitida",
+    "0xC0000071": "Contraseña vencida",
+    "0xC0000072": "Cuenta deshabilitada",
+    "0xC0000193": "Cuenta vencida",
+    "0xC0000224": "Debe cambiar la contraseña",
+    "0xC0000234": "Cuenta bloqueada",
+    "0xC000015B": "Tipo de logon no concedido",
+}
+
+# Insertion strings de FailureReason (%%2313, ...)
+FAILURE_REASON_DESC = {
+    "%%2304": "Error durante el logon",
+    "%%2305": "La cuenta no puede usarse en este momento",
+    "%%2307": "Cuenta bloqueada",
+    "%%2308": "Tipo de logon no concedido",
+    "%%2309": "Contraseña vencida",
+    "%%2310": "Cuenta deshabilitada",
+    "%%2311": "Fuera del horario permitido",
+    "%%2312": "Estación de trabajo no permitida",
+    "%%2313": "Usuario desconocido o contraseña incorrecta",
+}
+
+_EMPTY_VALUES = ("", "-", "NULL SID")
+
+
+def _compile(schema: dict):
+    names = tuple(schema)
+    positions = tuple(schema.values())
+    getter = itemgetter(*positions) if len(positions) > 1 else (lambda p, i=positions[0]: (p[i],))
+    return names, getter, max(positions)
+
+
+_COMPILED = {event_id: _compile(schema) for event_id, schema in EVENT_SCHEMAS.items()}
+
+
+def _status_hex(value: str):
+    # Properties llega como texto; los NTSTATUS vienen en decimal
+    try:
+        return f"0x{int(value, 0) & 0xFFFFFFFF:08X}"
+    except (TypeError, ValueError):
+        return value
+
+
+def extract_fields(event: dict) -> dict:
+    """
+    Devuelve los campos del esquema del Id del evento a partir de
+    event["Properties"]. {} si el Id no tiene esquema o no hay Properties.
+    """
+    props = event.get("Properties")
+    compiled = _COMPILED.get(event.get("Id"))
+    if not props or compiled is None:
+        return {}
+
+    names, getter, last = compiled
+    if len(props) > last:
+        values = getter(props)
+    else:
+        # Versión de Windows con menos campos: los que faltan quedan en None
+        positions = EVENT_SCHEMAS[event["Id"]].values()
+        values = [props[i] if i < len(props) else None for i in positions]
+
+    fields = {}
+    for name, value in zip(names, values):
+        if value is None or value in _EMPTY_VALUES:
+            continue
+        fields[name] = value
+
+    if "LogonType" in fields:
+        try:
+            fields["LogonType"] = int(fields["LogonType"])
+        except ValueError:
+            pass
+    for key in ("Status", "SubStatus"):
+        if key in fields:
+            fields[key] = _status_hex(fields[key])
+    if "FailureReason" in fields:
+        reason = fields["FailureReason"].strip()
+        sub_status = fields.get("SubStatus")
+        # El SubStatus es más específico que el texto genérico del motivo
+        fields["FailureReason"] = (
+            FAILURE_STATUS_DESC.get(sub_status)
+            or FAILURE_REASON_DESC.get(reason)
+            or reason
+        )
+    return fields
@@ -0,0 +1,173 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from monitor.models import as_server_result
+
+# Exportador Prometheus de las métricas recolectadas.
+#
+# El texto de /metrics se renderiza una sola vez después de cada recolección
+# y se publica reemplazando la referencia del snapshot (asignación atómica),
+# de modo que un scrape solo copia bytes ya armados: nunca llama a WinRM ni
+# recorre los datos de los servidores.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RISK_LEVELS = ("OK", "WARNING", "CRITICAL")
+
+# (nombre, tipo, ayuda)
+METRIC_DEFS = [
+    ("secmon_cpu_percent", "gauge", "Uso de CPU en porcentaje."),
+    ("secmon_memory_free_gb", "gauge", "Memoria RAM libre en GB."),
+    ("secmon_memory_total_gb", "gauge", "Memoria RAM total en GB."),
+    ("secmon_disk_free_gb", "gauge", "Espacio libre por disco en GB."),
+    ("secmon_disk_size_gb", "gauge", "Tamaño por disco en GB."),
+    ("secmon_perf_counter", "gauge", "Contadores de rendimiento muestreados (mín/prom/máx de la ventana)."),
+    ("secmon_logons_ok", "gauge", "Logons correctos en la ventana de recolección."),
+    ("secmon_logons_failed", "gauge", "Logons fallidos en la ventana de recolección."),
+    ("secmon_connections", "gauge", "Conexiones TCP por estado."),
+    ("secmon_connections_total", "gauge", "Conexiones TCP totales."),
+    ("secmon_critical_events", "gauge", "Eventos Error/Critical por log en la ventana de recolección."),
+    ("secmon_pending_security_updates", "gauge", "Actualizaciones de seguridad pendientes."),
+    ("secmon_unsigned_binaries", "gauge", "Binarios sin firma o con firma inválida."),
+    ("secmon_capacity_days_until_full", "gauge", "Días estimados hasta llenar el disco (pronóstico de capacidad)."),
+    ("secmon_risk_score", "gauge", "Score de riesgo (0-100)."),
+    ("secmon_risk_level", "gauge", "Nivel de riesgo actual (1 para el nivel vigente)."),
+    ("secmon_transfer_bytes", "gauge", "Bytes de salida de scripts en la última recolección (raw: sin comprimir, wire: recibidos)."),
+    ("secmon_transfer_compression_ratio", "gauge", "Relación bytes sin comprimir / recibidos en la última recolección."),
+    ("secmon_last_collection_timestamp_seconds", "gauge", "Momento del último snapshot publicado."),
+    ("secmon_collection_runs_total", "counter", "Recolecciones publicadas desde el inicio del exportador."),
+]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _num(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def render_metrics(servers_data, runs_total: int = 0, timestamp: float = None, transfer: dict = None) -> bytes:
+    """
+    Renderiza las métricas de todos los servidores en formato de texto Prometheus.
+    transfer: collectors.transfer_stats.snapshot() de la recolección, si se tiene.
+    """
+    samples = {name: [] for name, _, _ in METRIC_DEFS}
+
+    def add(metric, value, **labels):
+        value = _num(value)
+        if value is not None:
+            samples[metric].append(f"{metric}{_labels(**labels)} {value}")
+
+    for s in map(as_server_result, servers_data):
+        name = s.name
+        res = s.resources
+        cpu = res.get("cpu") if isinstance(res.get("cpu"), dict) else {}
+        mem = res.get("memory") if isinstance(res.get("memory"), dict) else {}
+        add("secmon_cpu_percent", cpu.get("CPUPercent"), server=name)
+        add("secmon_memory_free_gb", mem.get("FreeGB"), server=name)
+        add("secmon_memory_total_gb", mem.get("TotalGB"), server=name)
+        for counter, st in (res.get("counters") or {}).items():
+            for stat in ("Min", "Avg", "Max"):
+                add("secmon_perf_counter", st.get(stat), server=name, counter=counter, stat=stat.lower())
+        for d in res.get("disk") or []:
+            add("secmon_disk_free_gb", d.get("FreeGB"), server=name, device=d.get("DeviceID"))
+            add("secmon_disk_size_gb", d.get("SizeGB"), server=name, device=d.get("DeviceID"))
+
+        add("secmon_logons_ok", s.logons.ok_count, server=name)
+        add("secmon_logons_failed", s.logons.fail_count, server=name)
+
+        add("secmon_connections_total", s.connections_summary.total, server=name)
+        for state, count in s.connections_summary.by_state.items():
+            add("secmon_connections", count, server=name, state=state)
+
+        for log, count in (s.critical_events_summary.get("per_log") or {}).items():
+            add("secmon_critical_events", count, server=name, log=log)
+
+        add("secmon_pending_security_updates", s.updates.get("PendingSecurityCount"), server=name)
+        add("secmon_unsigned_binaries", len(s.unsigned_binaries), server=name)
+
+        for e in s.capacity_forecast:
+            add("secmon_capacity_days_until_full", e.get("DaysUntilFull"), server=name, kind=e["Kind"], key=e["Key"])
+
+        add("secmon_risk_score", s.risk.score, server=name)
+        for level in RISK_LEVELS:
+            add("secmon_risk_level", 1 if s.risk.level == level else 0, server=name, level=level)
+
+    if transfer:
+        add("secmon_transfer_bytes", transfer.get("raw_bytes"), kind="raw")
+        add("secmon_transfer_bytes", transfer.get("wire_bytes"), kind="wire")
+        add("secmon_transfer_compression_ratio", transfer.get("ratio"))
+
+    samples["secmon_last_collection_timestamp_seconds"].append(
+        f"secmon_last_collection_timestamp_seconds {timestamp if timestamp is not None else time.time():.0f}"
+    )
+    samples["secmon_collection_runs_total"].append(f"secmon_collection_runs_total {runs_total}")
+
+    lines = []
+    for metric, mtype, help_text in METRIC_DEFS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {mtype}")
+        lines.extend(samples[metric])
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class MetricsSnapshot:
+    """
+    Último snapshot de métricas ya renderizado. update() arma el cuerpo
+    completo fuera del camino del scrape y lo publica de una sola vez.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs_total = 0
+        self._body = render_metrics([], runs_total=0, timestamp=0)
+
+    def update(self, servers_data, transfer: dict = None) -> None:
+        with self._lock:
+            self._runs_total += 1
+            body = render_metrics(servers_data, runs_total=self._runs_total, transfer=transfer)
+            self._body = body
+
+    def body(self) -> bytes:
+        return self._body
+
+
+def make_handler(snapshot: MetricsSnapshot):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = snapshot.body()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def start_exporter(snapshot: MetricsSnapshot, host: str = "0.0.0.0", port: int = 9108) -> ThreadingHTTPServer:
+    """
+    Levanta el endpoint /metrics en un hilo de fondo y devuelve el servidor.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(snapshot))
+    thread = threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True)
+    thread.start()
+    print(f"Exportador Prometheus escuchando en http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,184 @@
+import threading
+from datetime import datetime
+
+from monitor.analyzers import threshold_for
+from monitor.archive import open_index
+
+# Pronóstico de capacidad de discos y LogPaths.
+#
+# Cada serie (espacio libre de un disco, tamaño de una ruta de log) guarda en
+# el índice del archivo las sumas de una regresión lineal ponderada
+# (w, Σt, Σy, Σt², Σty), con t en días. Agregar un punto es O(1): se
+# multiplican las sumas por el factor de olvido según los días transcurridos
+# (HalfLifeDays, para seguir la tendencia reciente) y se suma el punto. No se
+# relee el historial en cada ejecución; la primera vez las series de discos
+# se inicializan desde la tabla disk_metrics del archivo.
+#
+# Con la pendiente se estiman los días hasta llenar el disco y hasta cruzar
+# DiskFreeGBWarning; una ruta de log se proyecta contra el espacio libre de
+# su unidad. Se marcan las series que cruzan el umbral dentro de
+# CapacityDaysWarning días (umbral por servidor).
+#
+# Config (sección "Forecast"):
+#   Enabled:      activar el pronóstico (false)
+#   HalfLifeDays: vida media del peso de los puntos viejos (30)
+#   MinPoints:    puntos mínimos de una serie para pronosticar (3)
+
+DEFAULT_HALF_LIFE_DAYS = 30
+DEFAULT_MIN_POINTS = 3
+
+# (server, kind, key) -> [t0, last_ts, points, w, st, sy, stt, sty, last_y]
+_T0, _LAST_TS, _POINTS, _W, _ST, _SY, _STT, _STY, _LAST_Y = range(9)
+
+
+def _days(run_ts: str) -> float:
+    return datetime.fromisoformat(run_ts).timestamp() / 86400.0
+
+
+class ForecastStore:
+    def __init__(self, config: dict, half_life_days: float = DEFAULT_HALF_LIFE_DAYS):
+        self.config = config
+        self.half_life = half_life_days
+        self._lock = threading.Lock()
+        self._series = {}
+        self._updated = set()
+
+        conn = open_index(config)
+        try:
+            for row in conn.execute(
+                "SELECT server, kind, key, t0, last_ts, points, w, st, sy, stt, sty, last_y FROM forecast_series"
+            ):
+                self._series[row[:3]] = list(row[3:])
+            if not self._series:
+                # Primera vez: el historial de discos ya archivado arma la línea base
+                for server, device, run_ts, free_gb in conn.execute(
+                    "SELECT server, device, run_ts, free_gb FROM disk_metrics "
+                    "WHERE free_gb IS NOT NULL ORDER BY run_ts"
+                ):
+                    self.observe(server, "disk", device.upper(), run_ts, free_gb)
+        finally:
+            conn.close()
+
+    def observe(self, server: str, kind: str, key: str, run_ts: str, value: float) -> None:
+        """Agrega un punto a la serie en O(1). Un run_ts ya visto se ignora."""
+        if value is None:
+            return
+        t_days = _days(run_ts)
+        with self._lock:
+            s = self._series.get((server, kind, key))
+            if s is None:
+                s = [t_days, None, 0, 0.0, 0.0, 0.0, 0.0, 0.0, None]
+                self._series[(server, kind, key)] = s
+            elif s[_LAST_TS] is not None and run_ts <= s[_LAST_TS]:
+                return
+            t = t_days - s[_T0]
+            if s[_LAST_TS] is not None and self.half_life:
+                decay = 0.5 ** ((t_days - _days(s[_LAST_TS])) / self.half_life)
+                for i in (_W, _ST, _SY, _STT, _STY):
+                    s[i] *= decay
+            s[_W] += 1.0
+            s[_ST] += t
+            s[_SY] += value
+            s[_STT] += t * t
+            s[_STY] += t * value
+            s[_POINTS] += 1
+            s[_LAST_TS] = run_ts
+            s[_LAST_Y] = value
+            self._updated.add((server, kind, key))
+
+    def trend(self, server: str, kind: str, key: str):
+        """(pendiente por día, último valor, puntos) o None si la serie no existe."""
+        s = self._series.get((server, kind, key))
+        if s is None:
+            return None
+        denom = s[_W] * s[_STT] - s[_ST] ** 2
+        slope = (s[_W] * s[_STY] - s[_ST] * s[_SY]) / denom if denom > 1e-12 else 0.0
+        return slope, s[_LAST_Y], s[_POINTS]
+
+    def save(self) -> None:
+        rows = [(*key, *self._series[key]) for key in self._updated]
+        conn = open_index(self.config)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO forecast_series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+        finally:
+            conn.close()
+        self._updated.clear()
+
+
+def _days_until(available_gb: float, consumption_per_day: float):
+    """Días hasta consumir available_gb al ritmo dado; None si no se consume."""
+    if consumption_per_day is None or consumption_per_day <= 1e-6:
+        return None
+    return round(max(available_gb, 0.0) / consumption_per_day, 1)
+
+
+def _entry(kind, key, current, slope, points, free_gb, consumption, free_warn, horizon):
+    until_full = _days_until(free_gb, consumption)
+    until_threshold = _days_until(free_gb - free_warn, consumption)
+    warning = until_threshold is not None and until_threshold <= horizon
+    return {
+        "Kind": kind,
+        "Key": key,
+        "CurrentGB": current,
+        "SlopeGBPerDay": round(slope, 3),
+        "Points": points,
+        "DaysUntilFull": until_full,
+        "DaysUntilThreshold": until_threshold,
+        "Status": "warning" if warning else "ok",
+    }
+
+
+def forecast_fleet(servers_data, store: ForecastStore, run_ts: str, thresholds_for,
+                   min_points: int = DEFAULT_MIN_POINTS) -> set:
+    """
+    Agrega los puntos de la ejecución a las series y deja en cada servidor
+    la lista "capacity_forecast". Devuelve los servidores con alguna serie
+    que cruza el umbral dentro del horizonte.
+    """
+    flagged = set()
+    for s in servers_data:
+        s["capacity_forecast"] = []
+        collection = s.get("collection") or {}
+        if collection.get("status") != "ok":
+            continue
+        name = s["name"]
+
+        disks = {}
+        for d in (s.get("resources") or {}).get("disk") or []:
+            if d.get("DeviceID") and d.get("FreeGB") is not None:
+                disks[d["DeviceID"].upper()] = d["FreeGB"]
+                store.observe(name, "disk", d["DeviceID"].upper(), run_ts, d["FreeGB"])
+
+        # En recolección liviana log_growth es el de la última profunda
+        logs = {}
+        if collection.get("depth") == "deep":
+            for item in (s.get("log_growth") or {}).get("details") or []:
+                if item.get("CurrGB") is not None:
+                    logs[item["Path"]] = item["CurrGB"]
+                    store.observe(name, "log", item["Path"], run_ts, item["CurrGB"])
+
+        thresholds = thresholds_for(name)
+        free_warn = threshold_for(thresholds, "DiskFreeGBWarning")
+        horizon = threshold_for(thresholds, "CapacityDaysWarning")
+
+        out = []
+        for device, free_gb in disks.items():
+            slope, current, points = store.trend(name, "disk", device)
+            if points < min_points:
+                continue
+            out.append(_entry("disk", device, current, slope, points, free_gb, -slope, free_warn, horizon))
+        for path in logs:
+            slope, current, points = store.trend(name, "log", path)
+            drive = path[:2].upper()
+            if points < min_points or drive not in disks:
+                continue
+            out.append(_entry("log", path, current, slope, points, disks[drive], slope, free_warn, horizon))
+
+        out.sort(key=lambda e: (e["DaysUntilThreshold"] is None, e["DaysUntilThreshold"] or 0))
+        s["capacity_forecast"] = out
+        if any(e["Status"] == "warning" for e in out):
+            flagged.add(name)
+    return flagged
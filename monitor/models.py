@@ -0,0 +1,284 @@
+from dataclasses import dataclass, field
+
+# Registros tipados para los resultados por servidor.
+#
+# La recolección (registry.execute_checks) sigue produciendo el dict de
+# server_data, que es además la forma en que se guarda el JSON (estado,
+# archivo). Al terminar cada servidor, main.py lo convierte a ServerResult:
+# clases con __slots__ (sin __dict__ por instancia) y acceso por atributo,
+# que es lo que usan el reporte y el exportador. to_dict() devuelve la forma
+# JSON original, así que archivo y snapshots no cambian.
+#
+# Las claves que no tienen campo propio (checks de plugins, datos crudos)
+# viajan en ServerResult.extra.
+
+
+_EVENT_KEYS = ("TimeCreated", "Id", "LevelDisplayName", "ProviderName", "Message")
+
+
+@dataclass(slots=True)
+class Event:
+    time_created: str = None
+    event_id: int = None
+    level: str = None
+    provider: str = None
+    message: str = None
+    fields: dict = field(default_factory=dict)   # EventData (ver monitor/event_schema.py)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Event":
+        return cls(
+            time_created=d.get("TimeCreated"),
+            event_id=d.get("Id"),
+            level=d.get("LevelDisplayName"),
+            provider=d.get("ProviderName"),
+            message=d.get("Message"),
+            fields={k: v for k, v in d.items() if k not in _EVENT_KEYS},
+        )
+
+    def to_dict(self) -> dict:
+        # Solo las claves que traía el evento: las muestras de logons solo
+        # guardan algunas y el archivo no debe cambiar de forma
+        values = (self.time_created, self.event_id, self.level, self.provider, self.message)
+        d = {k: v for k, v in zip(_EVENT_KEYS, values) if v is not None}
+        d.update(self.fields)
+        return d
+
+
+@dataclass(slots=True)
+class LogonSummary:
+    ok_count: int = 0
+    fail_count: int = 0
+    fail_samples: list = field(default_factory=list)   # [Event]
+    fail_by_source: dict = field(default_factory=dict)
+    fail_by_account: dict = field(default_factory=dict)
+    fail_by_type: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LogonSummary":
+        return cls(
+            ok_count=d.get("logons_ok_count") or 0,
+            fail_count=d.get("logons_fail_count") or 0,
+            fail_samples=[Event.from_dict(e) for e in d.get("logons_fail_samples") or []],
+            fail_by_source=d.get("logons_fail_by_source") or {},
+            fail_by_account=d.get("logons_fail_by_account") or {},
+            fail_by_type=d.get("logons_fail_by_type") or {},
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "logons_ok_count": self.ok_count,
+            "logons_fail_count": self.fail_count,
+            "logons_fail_samples": [e.to_dict() for e in self.fail_samples],
+            "logons_fail_by_source": self.fail_by_source,
+            "logons_fail_by_account": self.fail_by_account,
+            "logons_fail_by_type": self.fail_by_type,
+        }
+
+
+@dataclass(slots=True)
+class ResourcesEval:
+    cpu_status: str = "critical"
+    cpu_value: float = None
+    mem_status: str = "critical"
+    mem_free_gb: float = None
+    disk_warnings: list = field(default_factory=list)   # [{"DeviceID", "FreeGB"}]
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ResourcesEval":
+        return cls(
+            cpu_status=d.get("cpu_status", "critical"),
+            cpu_value=d.get("cpu_value"),
+            mem_status=d.get("mem_status", "critical"),
+            mem_free_gb=d.get("mem_free_gb"),
+            disk_warnings=d.get("disk_warnings") or [],
+        )
+
+    def to_dict(self) -> dict:
+        d = {"cpu_status": self.cpu_status, "mem_status": self.mem_status, "disk_warnings": self.disk_warnings}
+        # El registro de error no trae valores medidos
+        if self.cpu_value is not None:
+            d["cpu_value"] = self.cpu_value
+        if self.mem_free_gb is not None:
+            d["mem_free_gb"] = self.mem_free_gb
+        return d
+
+
+@dataclass(slots=True)
+class ConnectionsSummary:
+    total: int = 0
+    by_state: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ConnectionsSummary":
+        return cls(total=d.get("total") or 0, by_state=d.get("by_state") or {})
+
+    def to_dict(self) -> dict:
+        return {"total": self.total, "by_state": self.by_state}
+
+
+@dataclass(slots=True)
+class UnsignedBinary:
+    type: str = None
+    name: str = None
+    display_name: str = None
+    path: str = None
+    pid: int = None
+    signature_status: str = None
+    cert_subject: str = None
+    cert_issuer: str = None
+    sha256: str = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "UnsignedBinary":
+        return cls(
+            type=d.get("Type"),
+            name=d.get("Name"),
+            display_name=d.get("DisplayName"),
+            path=d.get("Path"),
+            pid=d.get("Pid"),
+            signature_status=d.get("SignatureStatus"),
+            cert_subject=d.get("CertSubject"),
+            cert_issuer=d.get("CertIssuer"),
+            sha256=d.get("Sha256"),
+        )
+
+    def to_dict(self) -> dict:
+        d = {
+            "Type": self.type,
+            "Name": self.name,
+            "DisplayName": self.display_name,
+            "Path": self.path,
+            "SignatureStatus": self.signature_status,
+            "CertSubject": self.cert_subject,
+            "CertIssuer": self.cert_issuer,
+        }
+        # Solo los procesos traen PID; el hash solo el inventario de flota
+        if self.pid is not None:
+            d["Pid"] = self.pid
+        if self.sha256 is not None:
+            d["Sha256"] = self.sha256
+        return d
+
+
+@dataclass(slots=True)
+class Risk:
+    score: int = 0
+    level: str = "OK"
+    notes: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Risk":
+        return cls(score=d.get("score", 0), level=d.get("level", "OK"), notes=d.get("notes") or [])
+
+    def to_dict(self) -> dict:
+        return {"score": self.score, "level": self.level, "notes": self.notes}
+
+
+@dataclass(slots=True)
+class Collection:
+    status: str = "ok"
+    depth: str = None
+    reused_from: str = None
+    error: str = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Collection":
+        return cls(
+            status=d.get("status", "ok"),
+            depth=d.get("depth"),
+            reused_from=d.get("reused_from"),
+            error=d.get("error"),
+        )
+
+    def to_dict(self) -> dict:
+        d = {"status": self.status}
+        if self.depth is not None:
+            d["depth"] = self.depth
+            d["reused_from"] = self.reused_from
+        if self.error is not None:
+            d["error"] = self.error
+        return d
+
+
+# Claves de server_data con campo propio en ServerResult
+_TYPED_KEYS = (
+    "name", "collected_at", "resources", "resources_eval", "updates", "logons",
+    "services", "service_changes", "connections_summary", "critical_events_summary", "log_growth",
+    "unsigned_binaries", "new_binaries", "logon_campaigns", "capacity_forecast", "risk", "collection",
+)
+
+
+@dataclass(slots=True)
+class ServerResult:
+    name: str
+    collected_at: str = None
+    resources: dict = field(default_factory=dict)
+    resources_eval: ResourcesEval = field(default_factory=ResourcesEval)
+    updates: dict = field(default_factory=dict)
+    logons: LogonSummary = field(default_factory=LogonSummary)
+    services: list = field(default_factory=list)
+    service_changes: list = field(default_factory=list)     # ver monitor/service_inventory.py
+    connections_summary: ConnectionsSummary = field(default_factory=ConnectionsSummary)
+    critical_events_summary: dict = field(default_factory=dict)
+    log_growth: dict = field(default_factory=dict)
+    unsigned_binaries: list = field(default_factory=list)   # [UnsignedBinary]
+    new_binaries: list = field(default_factory=list)        # ver monitor/binary_index.py
+    logon_campaigns: list = field(default_factory=list)     # ver monitor/correlation.py
+    capacity_forecast: list = field(default_factory=list)   # ver monitor/forecast.py
+    risk: Risk = field(default_factory=Risk)
+    collection: Collection = None
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ServerResult":
+        return cls(
+            name=d["name"],
+            collected_at=d.get("collected_at"),
+            resources=d.get("resources") or {},
+            resources_eval=ResourcesEval.from_dict(d.get("resources_eval") or {}),
+            updates=d.get("updates") or {},
+            logons=LogonSummary.from_dict(d.get("logons") or {}),
+            services=d.get("services") or [],
+            service_changes=d.get("service_changes") or [],
+            connections_summary=ConnectionsSummary.from_dict(d.get("connections_summary") or {}),
+            critical_events_summary=d.get("critical_events_summary") or {},
+            log_growth=d.get("log_growth") or {},
+            unsigned_binaries=[UnsignedBinary.from_dict(b) for b in d.get("unsigned_binaries") or []],
+            new_binaries=d.get("new_binaries") or [],
+            logon_campaigns=d.get("logon_campaigns") or [],
+            capacity_forecast=d.get("capacity_forecast") or [],
+            risk=Risk.from_dict(d.get("risk") or {}),
+            collection=Collection.from_dict(d["collection"]) if d.get("collection") else None,
+            extra={k: v for k, v in d.items() if k not in _TYPED_KEYS},
+        )
+
+    def to_dict(self) -> dict:
+        d = {
+            "name": self.name,
+            "resources": self.resources,
+            "resources_eval": self.resources_eval.to_dict(),
+            "updates": self.updates,
+            "logons": self.logons.to_dict(),
+            "services": self.services,
+            "service_changes": self.service_changes,
+            "connections_summary": self.connections_summary.to_dict(),
+            "critical_events_summary": self.critical_events_summary,
+            "log_growth": self.log_growth,
+            "unsigned_binaries": [b.to_dict() for b in self.unsigned_binaries],
+            "new_binaries": self.new_binaries,
+            "logon_campaigns": self.logon_campaigns,
+            "capacity_forecast": self.capacity_forecast,
+            **self.extra,
+            "risk": self.risk.to_dict(),
+        }
+        if self.collection is not None:
+            d["collection"] = self.collection.to_dict()
+        if self.collected_at is not None:
+            d["collected_at"] = self.collected_at
+        return d
+
+
+def as_server_result(s) -> ServerResult:
+    """Acepta un ServerResult o el dict de server_data (p.ej. un snapshot archivado)."""
+    return s if isinstance(s, ServerResult) else ServerResult.from_dict(s)
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+from monitor.registry import check_cost, get_checks
+
+# Planificador adaptativo de profundidad de recolección.
+#
+# Cada servidor recibe una recolección "light" (solo los checks de clase
+# light: recursos + servicios) o "deep" (todos los checks) según su riesgo
+# previo y su historial de cambios guardado en el estado. El costo de cada
+# check se declara en el registro en llamadas WinRM según el modo activo del
+# recolector (PerfCounters, BinaryInventory, RemoteJobs, LogPaths del
+# servidor), y Planner.MaxWinRMCalls limita el total por ejecución.
+#
+# No hay presupuesto de segundos de CPU remota: desde este lado no se puede
+# medir el CPU que consume cada script en el servidor.
+
+
+def depth_cost(depth: str, server_conf: dict = None, shared: dict = None) -> int:
+    return sum(check_cost(c, server_conf or {}, shared) for c in get_checks(depth))
+
+
+def _hours_since(iso_ts, now: datetime):
+    if not iso_ts:
+        return None
+    try:
+        return (now - datetime.fromisoformat(iso_ts)).total_seconds() / 3600
+    except ValueError:
+        return None
+
+
+def _deep_reason(server_state: dict, planner_conf: dict, now: datetime):
+    """
+    Devuelve el motivo por el que un servidor requiere recolección profunda,
+    o None si puede recolectarse en modo liviano.
+    """
+    if not server_state.get("last_deep"):
+        return "sin recolección profunda previa"
+
+    level = (server_state.get("risk") or {}).get("level")
+    if level in ("WARNING", "CRITICAL"):
+        return f"riesgo previo {level}"
+
+    since_change = _hours_since(server_state.get("last_change"), now)
+    if since_change is not None and since_change < planner_conf.get("ChangedWithinHours", 72):
+        return "cambios recientes"
+
+    since_deep = _hours_since(server_state.get("last_deep"), now)
+    if since_deep is None or since_deep >= planner_conf.get("DeepEveryHours", 168):
+        return "recolección profunda vencida"
+
+    return None
+
+
+def plan_collection(servers_conf, state: dict, planner_conf: dict, now: datetime = None,
+                    shared: dict = None) -> dict:
+    """
+    Devuelve { nombre_servidor: {"depth": "light"|"deep", "reason": str} }.
+
+    Sin Planner.Enabled todos los servidores van en modo profundo. Con
+    presupuesto (MaxWinRMCalls), todos reciben primero el modo liviano y los
+    candidatos a modo profundo se promueven mientras alcance el presupuesto:
+    primero los que nunca tuvieron recolección profunda (necesitan una línea
+    base), luego por score de riesgo previo (mayor primero) y por antigüedad
+    de la última recolección profunda. shared: objetos compartidos de la
+    ejecución, que definen el costo de cada check.
+    """
+    now = now or datetime.utcnow()
+    prev_servers = state.get("servers", {})
+
+    if not planner_conf.get("Enabled", False):
+        return {s["Name"]: {"depth": "deep", "reason": "planificador deshabilitado"} for s in servers_conf}
+
+    plan = {}
+    candidates = []
+    costs = {}
+    for s in servers_conf:
+        name = s["Name"]
+        costs[name] = (depth_cost("light", s, shared), depth_cost("deep", s, shared))
+        server_state = prev_servers.get(name, {})
+        reason = _deep_reason(server_state, planner_conf, now)
+        plan[name] = {"depth": "light", "reason": "servidor estable"}
+        if reason:
+            score = (server_state.get("risk") or {}).get("score") or 0
+            never_deep = 0 if not server_state.get("last_deep") else 1
+            candidates.append((never_deep, -score, server_state.get("last_deep") or "", name, reason))
+
+    budget = planner_conf.get("MaxWinRMCalls")
+    remaining = None
+    if budget is not None:
+        remaining = budget - sum(light for light, _ in costs.values())
+
+    for *_, name, reason in sorted(candidates):
+        light, deep = costs[name]
+        upgrade = deep - light
+        if remaining is not None:
+            if remaining < upgrade:
+                plan[name]["reason"] = f"{reason} (sin presupuesto para modo profundo)"
+                continue
+            remaining -= upgrade
+        plan[name] = {"depth": "deep", "reason": reason}
+
+    return plan
+
+
+def update_change_history(prev_state: dict, new_state: dict, server_data: dict, now_ts: str) -> None:
+    """
+    Completa en new_state el riesgo, el estado de servicios y la marca de
+    último cambio, comparando contra el estado anterior del servidor.
+    """
+    risk = server_data.get("risk") or {}
+    new_state["risk"] = {"score": risk.get("score"), "level": risk.get("level")}
+    new_state["services_status"] = {
+        str(svc.get("Name")): str(svc.get("Status")) for svc in server_data.get("services") or []
+    }
+
+    prev_risk = prev_state.get("risk") or {}
+    changed = (
+        prev_risk.get("level") != new_state["risk"]["level"]
+        or abs((prev_risk.get("score") or 0) - (new_state["risk"]["score"] or 0)) >= 10
+        or prev_state.get("services_status", {}) != new_state["services_status"]
+    )
+    if changed:
+        new_state["last_change"] = now_ts
+    elif prev_state.get("last_change"):
+        new_state["last_change"] = prev_state["last_change"]
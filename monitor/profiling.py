@@ -0,0 +1,316 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from monitor.collectors import transfer_stats
+
+# Perfilado de una ejecución (main.py run --profile DIR).
+#
+# - Etapas: tiempo de pared y de CPU del proceso por etapa (recolección,
+#   correlación, estado, archivo, reporte) y tiempo bloqueado en llamadas
+#   remotas (sumado entre hilos), medido envolviendo las sesiones WinRM.
+# - Muestreo: un hilo toma la pila de todos los hilos cada pocos ms y arma
+#   stacks.collapsed (formato de flamegraph.pl) y profile.speedscope.json.
+# - cProfile de todos los hilos: el principal (correlación, archivo,
+#   reporte) y los que arrancan durante la ejecución (scheduler, check-*,
+#   donde corren el parseo JSON/NDJSON y los analizadores), cada uno con su
+#   Profile y combinados en cprofile.txt y cprofile.pstats. Desde Python
+#   3.12 un solo Profile ya cubre todos los hilos.
+# - tracemalloc: top de asignaciones por línea y pico de memoria en
+#   allocations.txt.
+# - Transferencia: bytes de salida de los scripts y ratio de compresión
+#   (Collectors.CompressOutput) en summary.json.
+#
+# Con el transporte "simulated" (y Auth.SimulatedLatencySec) se puede
+# perfilar sin servidores reales.
+#
+# Fuera del modo perfil, stage() y wrap_session() no hacen nada.
+
+_active = None
+
+# Métodos de sesión que implican esperar al servidor remoto
+_REMOTE_METHODS = ("run_ps", "run_cmd")
+
+
+def stage(name: str):
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def active() -> bool:
+    return _active is not None
+
+
+def wrap_session(session):
+    return TimedSession(session, _active) if _active is not None else session
+
+
+class TimedSession:
+    """Proxy de sesión que acumula el tiempo de espera remoto en el perfilador."""
+
+    def __init__(self, session, profiler):
+        self._session = session
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        attr = getattr(self._session, name)
+        if name in _REMOTE_METHODS:
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    self._profiler.add_remote(time.perf_counter() - started)
+            return timed
+        if name == "iter_ps_lines":
+            def timed_iter(*args, **kwargs):
+                # Cuenta el tiempo dentro del generador remoto, no el del consumidor
+                it = attr(*args, **kwargs)
+                calls = 1
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        line = next(it)
+                    except StopIteration:
+                        self._profiler.add_remote(time.perf_counter() - started, calls)
+                        return
+                    self._profiler.add_remote(time.perf_counter() - started, calls)
+                    calls = 0
+                    yield line
+            return timed_iter
+        return attr
+
+
+class _StackSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.samples = Counter()   # (hilo, pila raíz->hoja) -> muestras
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[(names.get(ident, str(ident)), tuple(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RunProfiler:
+    def __init__(self, out_dir: str, interval_ms: float = 5.0, top_n: int = 25):
+        self.out_dir = out_dir
+        self.interval = interval_ms / 1000.0
+        self.top_n = top_n
+        self.stages = {}   # nombre -> {"wall", "cpu", "remote", "remote_calls"}
+        self._order = []
+        self._current = "setup"
+        self._lock = threading.Lock()
+        self._cprofile = cProfile.Profile()
+        self._thread_profiles = []
+        self._sampler = _StackSampler(self.interval)
+
+    # ---- medición ----
+
+    def _stage_entry(self, name: str) -> dict:
+        if name not in self.stages:
+            self.stages[name] = {"wall": 0.0, "cpu": 0.0, "remote": 0.0, "remote_calls": 0}
+            self._order.append(name)
+        return self.stages[name]
+
+    def add_remote(self, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            entry = self._stage_entry(self._current)
+            entry["remote"] += seconds
+            entry["remote_calls"] += calls
+
+    @contextmanager
+    def stage(self, name: str):
+        previous = self._current
+        with self._lock:
+            self._current = name
+            self._stage_entry(name)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry = self.stages[name]
+                entry["wall"] += time.perf_counter() - wall0
+                entry["cpu"] += time.process_time() - cpu0
+                self._current = previous
+
+    def _profile_thread(self, frame, event, arg):
+        # Primer evento de un hilo nuevo: se reemplaza por un Profile propio del hilo
+        prof = cProfile.Profile()
+        prof.enable()
+        with self._lock:
+            self._thread_profiles.append(prof)
+
+    def start(self) -> None:
+        global _active
+        os.makedirs(self.out_dir, exist_ok=True)
+        tracemalloc.start(25)
+        self._wall0, self._cpu0 = time.perf_counter(), time.process_time()
+        self._sampler.start()
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+        self._cprofile.enable()
+        _active = self
+
+    def stop(self) -> None:
+        global _active
+        self._cprofile.disable()
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        self._sampler.stop()
+        self.total_wall = time.perf_counter() - self._wall0
+        self.total_cpu = time.process_time() - self._cpu0
+        self._alloc_snapshot = tracemalloc.take_snapshot()
+        self._alloc_current, self._alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.transfer = transfer_stats.snapshot()
+        _active = None
+
+    # ---- salidas ----
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.out_dir, name)
+
+    def _write_collapsed(self) -> None:
+        with open(self._path("stacks.collapsed"), "w", encoding="utf-8") as f:
+            for (thread, stack), count in self._sampler.samples.most_common():
+                frames = [thread] + [f"{fn} ({os.path.basename(file)}:{line})" for fn, file, line in stack]
+                f.write(";".join(frames) + f" {count}\n")
+
+    def _write_speedscope(self) -> None:
+        frames, frame_index = [], {}
+        by_thread = {}
+        for (thread, stack), count in self._sampler.samples.items():
+            ids = []
+            for fn, file, line in stack:
+                key = (fn, file, line)
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    frames.append({"name": fn, "file": file, "line": line})
+                ids.append(frame_index[key])
+            samples, weights = by_thread.setdefault(thread, ([], []))
+            samples.append(ids)
+            weights.append(count * self.interval)
+
+        profiles = [
+            {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+            for thread, (samples, weights) in sorted(by_thread.items())
+        ]
+        doc = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "secmonitor run",
+            "exporter": "secmonitor",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+        with open(self._path("profile.speedscope.json"), "w", encoding="utf-8") as f:
+            json.dump(doc, f)
+
+    def _write_cprofile(self) -> None:
+        buf = io.StringIO()
+        stats = pstats.Stats(self._cprofile, stream=buf)
+        with self._lock:
+            thread_profiles = list(self._thread_profiles)
+        for prof in thread_profiles:
+            stats.add(prof)
+        stats.dump_stats(self._path("cprofile.pstats"))
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+        with open(self._path("cprofile.txt"), "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+
+    def _write_allocations(self) -> None:
+        stats = self._alloc_snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),   # las pilas muestreadas
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )).statistics("lineno")
+        with open(self._path("allocations.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Memoria trazada al final: {self._alloc_current / 1024:.1f} KiB\n")
+            f.write(f"Pico de memoria trazada: {self._alloc_peak / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top_n} asignaciones vivas por línea:\n")
+            for stat in stats[:self.top_n]:
+                frame = stat.traceback[0]
+                f.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} bloques  {frame.filename}:{frame.lineno}\n")
+
+    def summary(self) -> dict:
+        return {
+            "total_wall_sec": round(self.total_wall, 3),
+            "total_cpu_sec": round(self.total_cpu, 3),
+            "alloc_peak_kib": round(self._alloc_peak / 1024, 1),
+            "samples": sum(self._sampler.samples.values()),
+            "transfer": self.transfer,
+            "stages": [
+                {
+                    "stage": name,
+                    "wall_sec": round(self.stages[name]["wall"], 3),
+                    "cpu_sec": round(self.stages[name]["cpu"], 3),
+                    "remote_wait_sec": round(self.stages[name]["remote"], 3),
+                    "remote_calls": self.stages[name]["remote_calls"],
+                }
+                for name in self._order
+            ],
+        }
+
+    def write_reports(self) -> dict:
+        self._write_collapsed()
+        self._write_speedscope()
+        self._write_cprofile()
+        self._write_allocations()
+        summary = self.summary()
+        with open(self._path("summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def format_summary(summary: dict) -> str:
+    lines = [
+        f"Tiempo total: {summary['total_wall_sec']} s de pared, {summary['total_cpu_sec']} s de CPU; "
+        f"pico de memoria trazada {summary['alloc_peak_kib']} KiB",
+        f"{'Etapa':<14}{'Pared (s)':>11}{'CPU (s)':>10}{'Espera remota (s)':>19}{'Llamadas':>10}",
+    ]
+    for st in summary["stages"]:
+        lines.append(
+            f"{st['stage']:<14}{st['wall_sec']:>11}{st['cpu_sec']:>10}"
+            f"{st['remote_wait_sec']:>19}{st['remote_calls']:>10}"
+        )
+    lines.append("(la espera remota se suma entre hilos: puede superar el tiempo de pared)")
+    transfer = summary.get("transfer") or {}
+    if transfer.get("calls"):
+        lines.append(
+            f"Salida de scripts: {transfer['raw_bytes'] / 1024:.0f} KiB, recibidos {transfer['wire_bytes'] / 1024:.0f} KiB "
+            f"(ratio {transfer['ratio']}, {transfer['compressed_calls']}/{transfer['calls']} llamadas comprimidas)"
+        )
+    return "\n".join(lines)
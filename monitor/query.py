@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+from monitor.archive import open_index
+
+# Consultas sobre los datos históricos indexados por monitor/archive.py.
+# Todas trabajan sobre las tablas de hechos del índice SQLite; nunca
+# reconectan por WinRM ni cargan snapshots completos en memoria.
+
+
+def since_clause(days: int) -> str:
+    # Límite inferior de run_ts para "últimos N días" (también lo usa backtest.py)
+    return (datetime.utcnow() - timedelta(days=days)).replace(microsecond=0).isoformat()
+
+
+def top_failed_logons(config: dict, days: int = 7, limit: int = 20):
+    """
+    Servidores con más logons fallidos en los últimos `days` días.
+    """
+    conn = open_index(config)
+    try:
+        rows = conn.execute(
+            """
+            SELECT server, SUM(logons_failed) AS total, COUNT(*) AS runs
+            FROM server_metrics
+            WHERE run_ts >= ?
+            GROUP BY server
+            ORDER BY total DESC
+            LIMIT ?
+            """,
+            (since_clause(days), limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{"server": r[0], "logons_failed": r[1] or 0, "runs": r[2]} for r in rows]
+
+
+def unsigned_binaries(config: dict, binary_type: str = None):
+    """
+    Binarios sin firma / firma inválida de la última ejecución de cada servidor.
+    binary_type: 'Service' o 'Process' para filtrar; None para ambos.
+    """
+    sql = """
+        SELECT u.server, u.run_ts, u.type, u.name, u.path, u.status
+        FROM unsigned_binaries u
+        JOIN (
+            SELECT server, MAX(run_ts) AS run_ts FROM server_metrics GROUP BY server
+        ) last ON last.server = u.server AND last.run_ts = u.run_ts
+    """
+    params = []
+    if binary_type:
+        sql += " WHERE u.type = ?"
+        params.append(binary_type)
+    sql += " ORDER BY u.server, u.path"
+
+    conn = open_index(config)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [
+        {"server": r[0], "run_ts": r[1], "type": r[2], "name": r[3], "path": r[4], "status": r[5]}
+        for r in rows
+    ]
+
+
+def disk_trend(config: dict, server: str, days: int = 30, device: str = None):
+    """
+    Evolución del espacio libre por disco de un servidor.
+    """
+    sql = """
+        SELECT run_ts, device, size_gb, free_gb
+        FROM disk_metrics
+        WHERE server = ? AND run_ts >= ?
+    """
+    params = [server, since_clause(days)]
+    if device:
+        sql += " AND device = ?"
+        params.append(device)
+    sql += " ORDER BY device, run_ts"
+
+    conn = open_index(config)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [{"run_ts": r[0], "device": r[1], "size_gb": r[2], "free_gb": r[3]} for r in rows]
+
+
+def latest_risk(config: dict, limit: int = 20):
+    """
+    Nivel y score de riesgo de la última ejecución de cada servidor.
+    """
+    conn = open_index(config)
+    try:
+        rows = conn.execute(
+            """
+            SELECT m.server, m.run_ts, m.risk_score, m.risk_level
+            FROM server_metrics m
+            JOIN (
+                SELECT server, MAX(run_ts) AS run_ts FROM server_metrics GROUP BY server
+            ) last ON last.server = m.server AND last.run_ts = m.run_ts
+            ORDER BY m.risk_score DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{"server": r[0], "run_ts": r[1], "score": r[2], "level": r[3]} for r in rows]
+
+
+def format_rows(rows) -> str:
+    """
+    Formatea una lista de dicts como tabla de texto para la CLI.
+    """
+    if not rows:
+        return "(sin resultados)"
+    cols = list(rows[0].keys())
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in cols}
+    lines = ["  ".join(c.ljust(widths[c]) for c in cols)]
+    lines.append("  ".join("-" * widths[c] for c in cols))
+    for r in rows:
+        lines.append("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in cols))
+    return "\n".join(lines)
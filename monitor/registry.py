@@ -0,0 +1,374 @@
+import copy
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from monitor.collectors import (
+    _run_ps_json,
+    get_system_resources,
+    get_performance_counters,
+    get_critical_services_status,
+    iter_logon_events,
+    get_security_updates_status,
+    normalize_security_updates,
+    SECURITY_UPDATES_SCRIPT,
+    get_active_connections,
+    get_critical_events_summary,
+    get_paths_size,
+    paths_size_script,
+    parse_paths_size,
+    get_unsigned_or_invalid_binaries,
+)
+from monitor.binary_index import inventory_unsigned_binaries
+from monitor.service_inventory import collect_service_inventory
+from monitor.analyzers import (
+    summarize_logons,
+    evaluate_resources,
+    summarize_connections,
+    summarize_critical_events,
+    evaluate_log_growth,
+    risk_resources,
+    risk_logons,
+    risk_logon_campaigns,
+    risk_capacity_forecast,
+    risk_updates,
+    risk_critical_events,
+    risk_log_growth,
+    risk_unsigned_binaries,
+    risk_service_changes,
+)
+
+# Registro de checks (recolector + analizador + regla de riesgo).
+#
+# Agregar un check nuevo es declarar un Check y llamar a register_check():
+# el motor arma el plan por servidor, el registro de error y el score de
+# riesgo a partir del registro, sin tocar main.py.
+
+
+@dataclass
+class CheckContext:
+    """Datos del servidor disponibles para recolectores y analizadores."""
+    server_conf: dict
+    thresholds: dict
+    prev_state: dict
+    new_state: dict
+    results: dict = field(default_factory=dict)   # check -> salida cruda
+    shared: dict = field(default_factory=dict)    # objetos de la ejecución compartidos entre servidores
+
+
+@dataclass(frozen=True)
+class Check:
+    """
+    name:       identificador del check
+    outputs:    claves de server_data que produce, con su valor por defecto
+                (el valor por defecto es el que se usa en el registro de error)
+    collect:    collect(session, ctx) -> datos crudos; o bien
+    script:     script PowerShell (str o función(server_conf) -> str) cuya salida
+                JSON se pasa por parse()
+    analyze:    analyze(raw, ctx) -> dict con las claves de outputs
+    risk:       regla de riesgo (server_data, thresholds) -> (puntos, notas)
+    cost:       llamadas WinRM que hace el recolector: un entero, o una función
+                (server_conf, shared) -> int si depende del modo activo
+                (PerfCounters, BinaryInventory, RemoteJobs...)
+    cost_class: "light" (siempre) o "deep" (solo en recolección profunda)
+    depends_on: checks que deben terminar antes (su salida está en ctx.results)
+    """
+    name: str
+    outputs: dict
+    collect: Optional[Callable] = None
+    script: object = None
+    parse: Optional[Callable] = None
+    analyze: Optional[Callable] = None
+    risk: Optional[Callable] = None
+    cost: object = 1
+    cost_class: str = "deep"
+    depends_on: tuple = ()
+    label: str = ""
+
+
+_CHECKS = {}
+
+
+def register_check(check: Check) -> Check:
+    if check.collect is None and check.script is None:
+        raise ValueError(f"El check '{check.name}' necesita collect o script")
+    for dep in check.depends_on:
+        if dep not in _CHECKS:
+            raise ValueError(f"El check '{check.name}' depende de '{dep}', que no está registrado")
+    _CHECKS[check.name] = check
+    return check
+
+
+def get_checks(depth: str = "deep"):
+    """Checks a ejecutar para una profundidad, en orden de registro."""
+    return [c for c in _CHECKS.values() if depth == "deep" or c.cost_class == "light"]
+
+
+def check_cost(check: Check, server_conf: dict, shared: dict = None) -> int:
+    """Llamadas WinRM del check para un servidor con los objetos compartidos de la ejecución."""
+    if callable(check.cost):
+        return check.cost(server_conf, shared or {})
+    return check.cost
+
+
+# Reglas que no dependen de un check sino de etapas de flota posteriores
+# a la recolección (p.ej. la correlación de logons entre servidores)
+_FLEET_RISK_RULES = [risk_logon_campaigns, risk_capacity_forecast]
+
+# Claves de server_data que arman esas etapas de flota en cada ejecución;
+# no se reutilizan de un snapshot anterior
+FLEET_OUTPUTS = ("logon_campaigns", "capacity_forecast", "new_binaries")
+
+
+def risk_rules():
+    return [c.risk for c in _CHECKS.values() if c.risk is not None] + _FLEET_RISK_RULES
+
+
+def default_outputs() -> dict:
+    out = {}
+    for c in _CHECKS.values():
+        # Copia para no compartir listas/dicts entre servidores
+        out.update(copy.deepcopy(c.outputs))
+    return out
+
+
+def load_plugins(module_names) -> None:
+    """Importa módulos externos que registran sus propios checks."""
+    for module_name in module_names or []:
+        importlib.import_module(module_name)
+
+
+def _run_check(check: Check, session, ctx: CheckContext) -> dict:
+    if check.label:
+        print(f"  - {check.label}...")
+    if check.collect is not None:
+        raw = check.collect(session, ctx)
+    else:
+        script = check.script(ctx.server_conf) if callable(check.script) else check.script
+        raw = _run_ps_json(session, script)
+        if check.parse is not None:
+            raw = check.parse(raw)
+    ctx.results[check.name] = raw
+    if check.analyze is None:
+        return {next(iter(check.outputs)): raw}
+    return check.analyze(raw, ctx)
+
+
+def execute_checks(checks, session_factory, ctx: CheckContext, max_shells: int = 1,
+                   release_session=None) -> dict:
+    """
+    Ejecuta los checks de un servidor respetando dependencias. Los checks
+    independientes corren en paralelo con hasta max_shells sesiones WinRM
+    (una por hilo, creadas con session_factory()). Al terminar, cada sesión
+    se entrega a release_session(session, ok) si se indicó.
+    Devuelve las claves de server_data producidas. Si un check falla, la
+    excepción se propaga (el servidor completo queda en error).
+    """
+    pending = {c.name: c for c in checks}
+    updates = {}
+    sessions = []
+    sessions_lock = threading.Lock()
+    local = threading.local()
+
+    def get_session():
+        if not hasattr(local, "session"):
+            local.session = session_factory()
+            with sessions_lock:
+                sessions.append(local.session)
+        return local.session
+
+    ok = False
+    planned = set(pending)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_shells), thread_name_prefix="check") as executor:
+            done = set()
+            while pending:
+                # Ola de checks cuyas dependencias ya terminaron (o no están en el plan)
+                ready = [
+                    c for c in pending.values()
+                    if all(d in done or d not in planned for d in c.depends_on)
+                ]
+                if not ready:
+                    raise RuntimeError(f"Dependencias circulares entre checks: {sorted(pending)}")
+                futures = [(c, executor.submit(lambda c=c: _run_check(c, get_session(), ctx))) for c in ready]
+                for c, fut in futures:
+                    updates.update(fut.result())
+                    done.add(c.name)
+                    del pending[c.name]
+        ok = True
+    finally:
+        if release_session is not None:
+            for session in sessions:
+                release_session(session, ok)
+
+    return updates
+
+
+# ==========================
+# Checks incorporados
+# ==========================
+
+def _collect_resources(session, ctx: CheckContext):
+    perf_conf = ctx.shared.get("perf_counters")
+    if perf_conf is None:
+        return get_system_resources(session)
+    # Una sola llamada con Get-Counter en lugar de tres consultas CIM/WMI
+    return get_performance_counters(session, sample_seconds=perf_conf.get("SampleSeconds", 5))
+
+
+def _collect_services(session, ctx: CheckContext):
+    store = ctx.shared.get("service_inventory")
+    if store is None:
+        services = get_critical_services_status(session, ctx.server_conf.get("CriticalServices", []))
+        return {"services": services, "service_changes": []}
+    # Inventario completo: los críticos salen de la misma consulta
+    return collect_service_inventory(session, store, ctx.server_conf)
+
+
+def _collect_unsigned_binaries(session, ctx: CheckContext):
+    index = ctx.shared.get("binary_index")
+    if index is None:
+        return get_unsigned_or_invalid_binaries(session, check_processes=True, max_items=200)
+    # Inventario de flota: las firmas se verifican una vez por hash
+    return inventory_unsigned_binaries(session, index, ctx.server_conf["Name"], max_items=200)
+
+
+def _collect_updates(session, ctx: CheckContext):
+    jobs = ctx.shared.get("remote_jobs")
+    if jobs is None or not jobs.handles("updates"):
+        return get_security_updates_status(session)
+    data, finished_at = jobs.run(session, "updates", SECURITY_UPDATES_SCRIPT)
+    if data is None:
+        # El job sigue corriendo: sin datos todavía (no es "0 pendientes")
+        return {"PendingCount": None, "PendingSecurityCount": None, "PendingTitles": [],
+                "RecentInstalled": [], "JobPending": True}
+    updates = normalize_security_updates(data)
+    updates["CollectedAt"] = finished_at
+    return updates
+
+
+def _collect_log_sizes(session, ctx: CheckContext):
+    paths = ctx.server_conf.get("LogPaths", [])
+    jobs = ctx.shared.get("remote_jobs")
+    if jobs is None or not jobs.handles("log_sizes") or not paths:
+        return get_paths_size(session, paths)
+    data, _finished_at = jobs.run(session, "log_sizes", paths_size_script(paths))
+    return parse_paths_size(data) if data is not None else None
+
+
+def _remote_job_cost(check_name: str, default: int = 1):
+    def cost(server_conf, shared):
+        jobs = shared.get("remote_jobs")
+        if jobs is None or not jobs.handles(check_name):
+            return default
+        return jobs.max_calls()
+    return cost
+
+
+def _log_sizes_cost(server_conf, shared):
+    # Sin LogPaths el recolector no llama al servidor
+    if not server_conf.get("LogPaths"):
+        return 0
+    return _remote_job_cost("log_sizes")(server_conf, shared)
+
+
+def _analyze_log_sizes(raw, ctx: CheckContext):
+    prev_log_sizes = ctx.prev_state.get("log_sizes", {})
+    if raw is None:
+        # Job remoto sin resultado todavía: se conserva la referencia anterior
+        ctx.new_state["log_sizes"] = prev_log_sizes
+        return {"log_growth": {"global_status": "unknown", "details": []}}
+    ctx.new_state["log_sizes"] = raw
+    return {"log_growth": evaluate_log_growth(raw, prev_log_sizes, ctx.thresholds)}
+
+
+register_check(Check(
+    name="resources",
+    label="Obteniendo recursos del sistema",
+    outputs={
+        "resources": {},
+        "resources_eval": {"cpu_status": "critical", "mem_status": "critical", "disk_warnings": []},
+    },
+    collect=_collect_resources,
+    analyze=lambda raw, ctx: {"resources": raw, "resources_eval": evaluate_resources(raw, ctx.thresholds)},
+    risk=risk_resources,
+    # Get-Counter es una sola llamada; las consultas CIM/WMI son tres
+    cost=lambda server_conf, shared: 1 if shared.get("perf_counters") is not None else 3,
+    cost_class="light",
+))
+
+register_check(Check(
+    name="security_events",
+    label="Obteniendo eventos de seguridad",
+    outputs={"logons": {
+        "logons_ok_count": 0,
+        "logons_fail_count": 0,
+        "logons_fail_samples": [],
+        "logons_fail_by_source": {},
+        "logons_fail_by_account": {},
+        "logons_fail_by_type": {},
+    }},
+    # Los eventos se resumen a medida que llegan; nunca se arma la lista completa
+    collect=lambda session, ctx: summarize_logons(iter_logon_events(session, 24, 300)),
+    analyze=lambda raw, ctx: {"logons": raw},
+    risk=risk_logons,
+))
+
+register_check(Check(
+    name="services",
+    label="Verificando servicios críticos",
+    outputs={"services": [], "service_changes": []},
+    collect=_collect_services,
+    analyze=lambda raw, ctx: raw,
+    risk=risk_service_changes,
+    cost_class="light",
+))
+
+register_check(Check(
+    name="updates",
+    label="Verificando actualizaciones de seguridad",
+    outputs={"updates": {"PendingCount": None, "PendingSecurityCount": None, "PendingTitles": [], "RecentInstalled": []}},
+    collect=_collect_updates,
+    risk=risk_updates,
+    cost=_remote_job_cost("updates"),
+))
+
+register_check(Check(
+    name="connections",
+    label="Obteniendo conexiones activas",
+    outputs={"connections_summary": {"total": 0, "by_state": {}}},
+    collect=lambda session, ctx: get_active_connections(session, max_results=200),
+    analyze=lambda raw, ctx: {"connections_summary": summarize_connections(raw)},
+))
+
+register_check(Check(
+    name="critical_events",
+    label="Obteniendo resumen de eventos críticos",
+    outputs={"critical_events_raw": {}, "critical_events_summary": {"total": 0, "per_log": {}}},
+    collect=lambda session, ctx: get_critical_events_summary(session, hours=24, max_events_per_log=200),
+    analyze=lambda raw, ctx: {"critical_events_raw": raw, "critical_events_summary": summarize_critical_events(raw)},
+    risk=risk_critical_events,
+    cost=3,
+))
+
+register_check(Check(
+    name="log_sizes",
+    label="Evaluando crecimiento de logs",
+    outputs={"log_growth": {"global_status": "unknown", "details": []}},
+    collect=_collect_log_sizes,
+    analyze=_analyze_log_sizes,
+    risk=risk_log_growth,
+    cost=_log_sizes_cost,
+))
+
+register_check(Check(
+    name="unsigned_binaries",
+    label="Buscando binarios sin firma o con firma inválida",
+    outputs={"unsigned_binaries": []},
+    collect=_collect_unsigned_binaries,
+    risk=risk_unsigned_binaries,
+    # Con el inventario de flota: inventario + firmas de los hashes desconocidos
+    cost=lambda server_conf, shared: 2 if shared.get("binary_index") is not None else 1,
+))
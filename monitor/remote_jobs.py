@@ -0,0 +1,148 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from monitor.collectors import _run_ps_json
+
+# Checks largos como jobs remotos ("fire and harvest").
+#
+# El escaneo de PSWindowsUpdate y el tamaño recursivo de LogPaths pueden
+# tardar minutos, y mientras tanto la llamada WinRM y el hilo del recolector
+# quedan bloqueados. En este modo el script del check se deja en el servidor
+# como tarea programada (SYSTEM) que escribe su JSON en un archivo. Cada
+# pasada hace una sola llamada corta que:
+#   - lee el último resultado terminado (si hay y no es demasiado viejo),
+#   - vuelve a lanzar la tarea si no está corriendo,
+# y devuelve enseguida. El resultado se cosecha en la pasada siguiente o,
+# si se configuró PollSeconds y no había resultado, tras un sondeo corto.
+#
+# Config (sección "RemoteJobs"):
+#   Enabled:             activar el modo (false)
+#   Checks:              checks que corren como job (["updates", "log_sizes"])
+#   Directory:           carpeta remota de scripts y resultados
+#   MaxAgeHours:         antigüedad máxima de un resultado para usarlo (48)
+#   PollSeconds:         espera máxima por el primer resultado (0 = próxima pasada)
+#   PollIntervalSeconds: intervalo entre consultas durante el sondeo (5)
+
+DEFAULT_DIRECTORY = r"C:\ProgramData\SecMonitor\jobs"
+DEFAULT_MAX_AGE_HOURS = 48
+TASK_PREFIX = "SecMonitor-"
+
+
+def _job_script(name: str, body: str, directory: str) -> str:
+    """Script que corre la tarea: ejecuta el check y publica el JSON de forma atómica."""
+    return rf"""
+$resultPath = '{directory}\{name}.json'
+$tmpPath = "$resultPath.tmp"
+& {{
+{body}
+}} | Out-File -FilePath $tmpPath -Encoding utf8
+Move-Item -Path $tmpPath -Destination $resultPath -Force
+"""
+
+
+def harvest_script(name: str, body: str, directory: str = DEFAULT_DIRECTORY, start: bool = True) -> str:
+    """
+    Lee el resultado del job y, con start, lo relanza si la tarea no está
+    corriendo. Devuelve {Result, FinishedAt, Running, Started}.
+    """
+    job = _job_script(name, body, directory)
+    return rf"""
+$jobName = '{name}'
+$startJob = ${'true' if start else 'false'}
+$dir = '{directory}'
+$taskName = '{TASK_PREFIX}{name}'
+$resultPath = Join-Path $dir "$jobName.json"
+$scriptPath = Join-Path $dir "$jobName.ps1"
+$jobScript = @'
+{job}
+'@
+
+$out = [PSCustomObject]@{{
+    Result = $null
+    FinishedAt = $null
+    Running = $false
+    Started = $false
+}}
+
+if (Test-Path $resultPath) {{
+    $out.Result = Get-Content -Raw -Path $resultPath
+    $out.FinishedAt = (Get-Item $resultPath).LastWriteTimeUtc.ToString('o')
+}}
+
+$task = Get-ScheduledTask -TaskName $taskName -ErrorAction SilentlyContinue
+if ($task -and $task.State -eq 'Running') {{
+    $out.Running = $true
+}}
+elseif ($startJob) {{
+    New-Item -ItemType Directory -Force -Path $dir | Out-Null
+    Set-Content -Path $scriptPath -Value $jobScript -Encoding UTF8
+    $action = New-ScheduledTaskAction -Execute 'powershell.exe' `
+        -Argument "-NoProfile -NonInteractive -ExecutionPolicy Bypass -File `"$scriptPath`""
+    Register-ScheduledTask -TaskName $taskName -Action $action -User 'SYSTEM' -RunLevel Highest -Force | Out-Null
+    Start-ScheduledTask -TaskName $taskName
+    $out.Started = $true
+}}
+
+$out | ConvertTo-Json -Depth 2 -Compress
+"""
+
+
+def _parse_time(value):
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+class RemoteJobRunner:
+    def __init__(self, conf: dict):
+        self.checks = set(conf.get("Checks", ["updates", "log_sizes"]))
+        self.directory = conf.get("Directory", DEFAULT_DIRECTORY)
+        self.max_age = timedelta(hours=conf.get("MaxAgeHours", DEFAULT_MAX_AGE_HOURS))
+        self.poll_seconds = conf.get("PollSeconds", 0)
+        self.poll_interval = conf.get("PollIntervalSeconds", 5)
+
+    def handles(self, check_name: str) -> bool:
+        return check_name in self.checks
+
+    def max_calls(self) -> int:
+        """Llamadas WinRM de run() en el peor caso (cosecha + sondeos del primer resultado)."""
+        if not self.poll_seconds:
+            return 1
+        return 1 + int(self.poll_seconds // max(self.poll_interval, 1))
+
+    def _result(self, status):
+        """(datos, FinishedAt) del resultado si es usable; (None, None) si no."""
+        if not status or not status.get("Result"):
+            return None, None
+        finished = _parse_time(status.get("FinishedAt"))
+        if finished is None or datetime.now(timezone.utc) - finished > self.max_age:
+            return None, None
+        try:
+            # Out-File de PowerShell 5 escribe BOM
+            return json.loads(status["Result"].lstrip("\ufeff")), status["FinishedAt"]
+        except json.JSONDecodeError:
+            return None, None
+
+    def run(self, session, name: str, body: str):
+        """
+        Cosecha el último resultado del job y lo relanza para la próxima
+        pasada. Devuelve (datos, FinishedAt) o (None, None) si todavía no
+        hay un resultado terminado.
+        """
+        started = time.monotonic()
+        status = _run_ps_json(session, harvest_script(name, body, self.directory, start=True))
+        data, finished = self._result(status)
+        if data is not None or not self.poll_seconds:
+            return data, finished
+
+        # Primer resultado del servidor: sondeo corto sin relanzar la tarea
+        while time.monotonic() - started < self.poll_seconds:
+            time.sleep(self.poll_interval)
+            status = _run_ps_json(session, harvest_script(name, body, self.directory, start=False))
+            data, finished = self._result(status)
+            if data is not None:
+                return data, finished
+        return None, None
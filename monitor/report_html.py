@@ -1,5 +1,14 @@
+import threading
 from datetime import datetime
 
+from monitor.models import as_server_result
+
+# El reporte se arma con secciones: las de flota reciben la lista de
+# servidores del reporte y las de servidor uno solo. Cada sección es un
+# fragmento HTML independiente; con un ReportFragments compartido, los
+# perfiles de reporte (monitor/report_profiles.py) reutilizan los fragmentos
+# ya armados por otro perfil en lugar de volver a generarlos.
+
 # Descripción en español de los estados de servicios Windows
 SERVICE_STATUS_DESC = {
     "Running": "En ejecución",
@@ -37,280 +46,553 @@ TCP_STATE_DESC = {
 }
 
 
-def build_html_report(servers_data):
-    date_str = datetime.now().strftime("%Y-%m-%d %H:%M")
-    html = f"""
-    <html>
-    <head>
-      <meta charset="utf-8"/>
-      <style>
-        body {{ font-family: Arial, sans-serif; font-size: 12px; }}
-        h1 {{ background-color: #003366; color: white; padding: 10px; }}
-        h2 {{ color: #003366; border-bottom: 1px solid #ccc; margin-top: 30px; }}
-        h3 {{ color: #003366; }}
-        h4 {{ color: #003366; }}
-        table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
-        th, td {{ border: 1px solid #ddd; padding: 6px; text-align: left; vertical-align: top; }}
-        th {{ background-color: #f2f2f2; }}
-        .ok {{ color: green; font-weight: bold; }}
-        .warning {{ color: #e69138; font-weight: bold; }}
-        .critical {{ color: red; font-weight: bold; }}
-        .small {{ font-size: 10px; color: #666; }}
-      </style>
-    </head>
-    <body>
-      <h1>Reporte Diario de Seguridad y Recursos - {date_str}</h1>
-      <p class="small">Generado automáticamente por el monitor de servidores Windows.</p>
-    """
+# Descripción de los cambios del inventario de servicios
+SERVICE_CHANGE_DESC = {
+    "added": "Nuevo",
+    "removed": "Eliminado",
+    "changed": "Modificado",
+}
+
 
-    # ==========================
-    # Resumen ejecutivo global
-    # ==========================
+# Contadores de rendimiento (Collectors.PerfCounters)
+COUNTER_LABELS = {
+    "cpu_percent": "CPU (%)",
+    "processor_queue": "Cola del procesador",
+    "available_mb": "Memoria disponible (MB)",
+    "disk_queue": "Cola de disco",
+    "disk_latency_ms": "Latencia de disco (ms)",
+    "net_bytes_per_sec": "Red (bytes/s)",
+}
+
+
+def _fleet_summary(servers_data) -> str:
+    html = ""
     html += "<h2>Resumen Ejecutivo Global</h2>"
     html += "<table><tr><th>Servidor</th><th>Nivel</th><th>Score</th><th>Comentarios</th></tr>"
     for s in servers_data:
-        risk = s.get("risk", {})
-        level = risk.get("level", "OK")
-        score = risk.get("score", 0)
-        notes = risk.get("notes", [])
+        level = s.risk.level
+        score = s.risk.score
+        notes = s.risk.notes
         cls = "ok"
         if level == "WARNING":
             cls = "warning"
         elif level == "CRITICAL":
             cls = "critical"
+        elif level == "SKIPPED":
+            cls = "skipped"
         html += (
-            f"<tr><td>{s['name']}</td>"
+            f"<tr><td>{s.name}</td>"
             f"<td class='{cls}'>{level}</td>"
             f"<td>{score}</td>"
             f"<td>{'; '.join(notes)}</td></tr>"
         )
     html += "</table>"
+    return html
 
-    # ==========================
-    # Detalle por servidor
-    # ==========================
-    for s in servers_data:
-        name = s["name"]
-        html += f"<h2>Servidor: {name}</h2>"
-
-        # ---- Resumen de recursos ----
-        eval_res = s.get("resources_eval", {})
-        cpu_class = eval_res.get("cpu_status", "ok")
-        mem_class = eval_res.get("mem_status", "ok")
 
-        html += "<h3>Resumen de Salud</h3>"
-        html += "<table>"
-        html += "<tr><th>Métrica</th><th>Valor</th><th>Estado</th></tr>"
+def _fleet_campaigns(servers_data) -> str:
+    html = ""
+    campaigns = {}
+    for s in servers_data:
+        for c in s.logon_campaigns:
+            campaigns.setdefault((c["kind"], c["key"]), c)
+    if campaigns:
+        html += "<h2>Campañas Distribuidas de Logons Fallidos</h2>"
         html += (
-            f"<tr><td>CPU Uso (%)</td>"
-            f"<td>{eval_res.get('cpu_value', 'N/A')}</td>"
-            f"<td class='{cpu_class}'>{cpu_class.upper()}</td></tr>"
+            "<p class='small'>Orígenes o cuentas con logons fallidos en varios servidores "
+            "(incluye las ejecuciones recientes), aunque no superen el umbral de cada servidor.</p>"
         )
         html += (
-            f"<tr><td>RAM Libre (GB)</td>"
-            f"<td>{eval_res.get('mem_free_gb', 'N/A')}</td>"
-            f"<td class='{mem_class}'>{mem_class.upper()}</td></tr>"
+            "<table><tr><th>Tipo</th><th>IP / Cuenta</th><th>Servidores</th>"
+            "<th>Intentos</th><th>Máx. por servidor</th><th>Servidores afectados</th></tr>"
         )
+        for c in campaigns.values():
+            kind = "IP de origen" if c["kind"] == "source" else "Cuenta"
+            html += (
+                f"<tr><td>{kind}</td><td class='critical'>{c['key']}</td>"
+                f"<td>{c['servers_count']}</td><td>{c['attempts']}</td>"
+                f"<td>{c['max_per_server']}</td><td>{', '.join(c['servers'])}</td></tr>"
+            )
         html += "</table>"
+    return html
 
-        # ---- Discos ----
-        res = s.get("resources", {})
-        disk = res.get("disk", [])
-        html += "<h3>Discos</h3>"
-        html += "<table><tr><th>Disco</th><th>Tamaño (GB)</th><th>Libre (GB)</th><th>Alerta</th></tr>"
-        warning_disks = {d["DeviceID"]: d["FreeGB"] for d in eval_res.get("disk_warnings", [])}
-        for d in disk:
-            dev = d.get("DeviceID")
-            size = d.get("SizeGB")
-            free = d.get("FreeGB")
-            if dev in warning_disks:
-                cls = "warning"
-                alert = "Espacio bajo"
-            else:
-                cls = "ok"
-                alert = ""
-            html += f"<tr><td>{dev}</td><td>{size}</td><td>{free}</td><td class='{cls}'>{alert}</td></tr>"
+
+def _fleet_service_changes(servers_data) -> str:
+    html = ""
+    changed_servers = [s for s in servers_data if s.service_changes]
+    if changed_servers:
+        html += "<h2>Cambios de Servicios en la Flota</h2>"
+        html += "<table><tr><th>Servidor</th><th>Nuevos</th><th>Eliminados</th><th>Modificados</th></tr>"
+        for s in changed_servers:
+            counts = {"added": 0, "removed": 0, "changed": 0}
+            for c in s.service_changes:
+                counts[c["Change"]] = counts.get(c["Change"], 0) + 1
+            html += (
+                f"<tr><td>{s.name}</td><td class='{'critical' if counts['added'] else 'ok'}'>{counts['added']}</td>"
+                f"<td>{counts['removed']}</td><td>{counts['changed']}</td></tr>"
+            )
         html += "</table>"
+    return html
 
-        # ---- Actualizaciones de seguridad ----
-        upd = s.get("updates", {})
-        html += "<h3>Actualizaciones de Seguridad</h3>"
 
-        pending = upd.get("PendingCount", 0)
-        pending_sec = upd.get("PendingSecurityCount", 0)
+def _fleet_forecast(servers_data) -> str:
+    html = ""
+    forecasts = [(s.name, e) for s in servers_data for e in s.capacity_forecast if e["Status"] == "warning"]
+    if forecasts:
+        html += "<h2>Pronóstico de Capacidad</h2>"
+        html += (
+            "<p class='small'>Discos y rutas de log que, con la tendencia de las últimas ejecuciones, "
+            "cruzan el umbral de espacio libre dentro del horizonte configurado.</p>"
+        )
+        html += (
+            "<table><tr><th>Servidor</th><th>Disco / Ruta</th><th>Actual (GB)</th><th>GB por día</th>"
+            "<th>Días hasta el umbral</th><th>Días hasta llenarse</th></tr>"
+        )
+        forecasts.sort(key=lambda f: f[1]["DaysUntilThreshold"])
+        for name, e in forecasts:
+            html += (
+                f"<tr><td>{name}</td><td>{e['Key']}</td><td>{e['CurrentGB']}</td>"
+                f"<td>{e['SlopeGBPerDay']}</td><td class='warning'>{e['DaysUntilThreshold']}</td>"
+                f"<td>{e['DaysUntilFull']}</td></tr>"
+            )
+        html += "</table>"
+    return html
 
-        cls = "ok" if pending == 0 and pending_sec == 0 else "warning"
 
-        html += "<table>"
-        html += f"<tr><th>Actualizaciones pendientes (totales)</th><td class='{cls}'>{pending}</td></tr>"
-        html += f"<tr><th>Actualizaciones de seguridad pendientes</th><td class='{cls}'>{pending_sec}</td></tr>"
+def _fleet_new_binaries(servers_data) -> str:
+    html = ""
+    new_binaries = {}
+    for s in servers_data:
+        for b in s.new_binaries:
+            new_binaries.setdefault(b["Sha256"], b)
+    if new_binaries:
+        html += "<h2>Binarios Nuevos en la Flota</h2>"
+        html += (
+            "<p class='small'>Ejecutables de servicios/procesos cuyo hash no se había visto "
+            "en ningún servidor en ejecuciones anteriores.</p>"
+        )
+        html += "<table><tr><th>Ruta</th><th>SHA256</th><th>Estado firma</th><th>Servidores</th></tr>"
+        for b in new_binaries.values():
+            status = b.get("SignatureStatus") or "Unknown"
+            cls = "ok" if status == "Valid" else "critical"
+            html += (
+                f"<tr><td>{b.get('Path')}</td><td class='small'>{b['Sha256']}</td>"
+                f"<td class='{cls}'>{status}</td><td>{', '.join(b['Servers'])}</td></tr>"
+            )
         html += "</table>"
+    return html
 
-        ptitles = upd.get("PendingTitles") or []
-
-        # 👇 NORMALIZAMOS AQUÍ
-        if isinstance(ptitles, str):
-            # Un solo título en string → lo convertimos a lista con un solo elemento
-            ptitles = [ptitles]
-        elif isinstance(ptitles, dict):
-            # Si por alguna razón vino como objeto, lo convertimos a string
-            ptitles = [str(ptitles)]
-
-        if ptitles:
-            html += "<h4>Listado de actualizaciones pendientes</h4>"
-            html += "<ul>"
-            for t in ptitles:
-                html += f"<li>{t}</li>"
-            html += "</ul>"
-        else:
-            html += "<p class='small'>No se encontraron títulos de actualizaciones pendientes (0 o no disponible).</p>"
 
-        # ---- Autenticaciones ----
-        login_summary = s.get("logons", {})
-        html += "<h3>Autenticaciones (últimas 24 horas)</h3>"
-        html += "<table>"
-        html += f"<tr><th>Logons correctos</th><td>{login_summary.get('logons_ok_count', 0)}</td></tr>"
+def _server_header(s) -> str:
+    html = f"<h2>Servidor: {s.name}</h2>"
+
+    collection = s.collection
+    if collection is not None and collection.depth == "light":
+        reused = collection.reused_from
         html += (
-            "<tr><th>Logons fallidos</th>"
-            f"<td><span class='warning'>{login_summary.get('logons_fail_count', 0)}</span></td></tr>"
+            "<p class='small'>Recolección liviana (recursos y servicios). "
+            + (f"Las demás secciones corresponden a la recolección del {reused}." if reused
+               else "Las demás secciones no tienen datos previos.")
+            + "</p>"
         )
+    return html
+
+
+def _server_resources(s) -> str:
+    html = ""
+    eval_res = s.resources_eval
+    cpu_class = eval_res.cpu_status
+    mem_class = eval_res.mem_status
+    cpu_value = eval_res.cpu_value if eval_res.cpu_value is not None else "N/A"
+    mem_free = eval_res.mem_free_gb if eval_res.mem_free_gb is not None else "N/A"
+
+    html += "<h3>Resumen de Salud</h3>"
+    html += "<table>"
+    html += "<tr><th>Métrica</th><th>Valor</th><th>Estado</th></tr>"
+    html += (
+        f"<tr><td>CPU Uso (%)</td>"
+        f"<td>{cpu_value}</td>"
+        f"<td class='{cpu_class}'>{cpu_class.upper()}</td></tr>"
+    )
+    html += (
+        f"<tr><td>RAM Libre (GB)</td>"
+        f"<td>{mem_free}</td>"
+        f"<td class='{mem_class}'>{mem_class.upper()}</td></tr>"
+    )
+    html += "</table>"
+
+    counters = s.resources.get("counters") or {}
+    if counters:
+        html += "<h3>Contadores de Rendimiento</h3>"
+        html += "<table><tr><th>Contador</th><th>Mín</th><th>Prom</th><th>Máx</th></tr>"
+        for key, st in counters.items():
+            html += (
+                f"<tr><td>{COUNTER_LABELS.get(key, key)}</td><td>{st.get('Min')}</td>"
+                f"<td>{st.get('Avg')}</td><td>{st.get('Max')}</td></tr>"
+            )
         html += "</table>"
+    return html
+
 
-        fail_samples = login_summary.get("logons_fail_samples", [])
-        if fail_samples:
-            html += "<h4>Ejemplos de logons fallidos</h4>"
-            html += "<table><tr><th>Fecha/Hora</th><th>Proveedor</th><th>Mensaje</th></tr>"
-            for e in fail_samples:
-                time_created = e.get("TimeCreated")
-                provider = e.get("ProviderName")
-                msg = (e.get("Message") or "").replace("\r\n", " ")
-                if len(msg) > 200:
-                    msg = msg[:200] + "..."
-                html += f"<tr><td>{time_created}</td><td>{provider}</td><td>{msg}</td></tr>"
-            html += "</table>"
-
-        # ---- Servicios críticos ----
-        services = s.get("services", [])
-        html += "<h3>Servicios Críticos</h3>"
-        if services:
-            html += "<table><tr><th>Nombre</th><th>DisplayName</th><th>Estado</th></tr>"
-            for svc in services:
-                raw_status = svc.get("Status")
-                raw_str = str(raw_status) if raw_status is not None else "Unknown"
-
-                # Buscamos descripción amigable: primero por la cadena tal cual,
-                # y si no, por la versión string del número
-                status_desc = SERVICE_STATUS_DESC.get(raw_str, raw_str)
-
-                # Para el color, consideramos "Running" o 3 como OK
-                is_running = (raw_str == "Running" or raw_str == "3")
-                cls = "ok" if is_running else "critical"
-
-                html += (
-                    f"<tr><td>{svc.get('Name')}</td>"
-                    f"<td>{svc.get('DisplayName')}</td>"
-                    f"<td class='{cls}'>{status_desc}</td></tr>"
-                )
-            html += "</table>"
+def _server_disks(s) -> str:
+    eval_res = s.resources_eval
+    html = ""
+    disk = s.resources.get("disk") or []
+    html += "<h3>Discos</h3>"
+    html += "<table><tr><th>Disco</th><th>Tamaño (GB)</th><th>Libre (GB)</th><th>Alerta</th></tr>"
+    warning_disks = {d["DeviceID"]: d["FreeGB"] for d in eval_res.disk_warnings}
+    for d in disk:
+        dev = d.get("DeviceID")
+        size = d.get("SizeGB")
+        free = d.get("FreeGB")
+        if dev in warning_disks:
+            cls = "warning"
+            alert = "Espacio bajo"
         else:
+            cls = "ok"
+            alert = ""
+        html += f"<tr><td>{dev}</td><td>{size}</td><td>{free}</td><td class='{cls}'>{alert}</td></tr>"
+    html += "</table>"
+    return html
+
+
+def _server_updates(s) -> str:
+    html = ""
+    upd = s.updates
+    html += "<h3>Actualizaciones de Seguridad</h3>"
+
+    pending = upd.get("PendingCount", 0)
+    pending_sec = upd.get("PendingSecurityCount", 0)
+
+    cls = "ok" if pending == 0 and pending_sec == 0 else "warning"
+
+    html += "<table>"
+    html += f"<tr><th>Actualizaciones pendientes (totales)</th><td class='{cls}'>{pending}</td></tr>"
+    html += f"<tr><th>Actualizaciones de seguridad pendientes</th><td class='{cls}'>{pending_sec}</td></tr>"
+    if upd.get("JobPending"):
+        html += "<tr><th>Job remoto</th><td class='warning'>En curso; el resultado se toma en la próxima pasada</td></tr>"
+    elif upd.get("CollectedAt"):
+        html += f"<tr><th>Resultado del job remoto</th><td>{upd['CollectedAt']}</td></tr>"
+    html += "</table>"
+
+    ptitles = upd.get("PendingTitles") or []
+
+    # 👇 NORMALIZAMOS AQUÍ
+    if isinstance(ptitles, str):
+        # Un solo título en string → lo convertimos a lista con un solo elemento
+        ptitles = [ptitles]
+    elif isinstance(ptitles, dict):
+        # Si por alguna razón vino como objeto, lo convertimos a string
+        ptitles = [str(ptitles)]
+
+    if ptitles:
+        html += "<h4>Listado de actualizaciones pendientes</h4>"
+        html += "<ul>"
+        for t in ptitles:
+            html += f"<li>{t}</li>"
+        html += "</ul>"
+    else:
+        html += "<p class='small'>No se encontraron títulos de actualizaciones pendientes (0 o no disponible).</p>"
+    return html
+
+
+def _server_logons(s) -> str:
+    html = ""
+    login_summary = s.logons
+    html += "<h3>Autenticaciones (últimas 24 horas)</h3>"
+    html += "<table>"
+    html += f"<tr><th>Logons correctos</th><td>{login_summary.ok_count}</td></tr>"
+    html += (
+        "<tr><th>Logons fallidos</th>"
+        f"<td><span class='warning'>{login_summary.fail_count}</span></td></tr>"
+    )
+    html += "</table>"
+
+    fail_samples = login_summary.fail_samples
+    if fail_samples:
+        html += "<h4>Ejemplos de logons fallidos</h4>"
+        html += (
+            "<table><tr><th>Fecha/Hora</th><th>Cuenta</th><th>IP origen</th>"
+            "<th>Tipo logon</th><th>Motivo</th></tr>"
+        )
+        for e in fail_samples:
+            f = e.fields
+            account = f.get("TargetUserName", "")
+            if f.get("TargetDomainName"):
+                account = f"{f['TargetDomainName']}\\{account}"
+            reason = f.get("FailureReason")
+            if reason is None:
+                # Snapshots anteriores: solo el mensaje renderizado
+                reason = (e.message or "").replace("\r\n", " ")
+                if len(reason) > 200:
+                    reason = reason[:200] + "..."
             html += (
-                "<p class='small'>No se definieron servicios críticos "
-                "o no se pudo obtener la información.</p>"
+                f"<tr><td>{e.time_created}</td><td>{account}</td>"
+                f"<td>{f.get('IpAddress', '')}</td><td>{f.get('LogonType', '')}</td>"
+                f"<td>{reason}</td></tr>"
             )
+        html += "</table>"
+    return html
 
 
-        # ---- Conexiones activas ----
-        conn_sum = s.get("connections_summary", {})
-        html += "<h3>Conexiones Activas</h3>"
-        html += "<table>"
-        html += f"<tr><th>Total conexiones TCP</th><td>{conn_sum.get('total', 0)}</td></tr>"
-        html += "</table>"
+def _server_services(s) -> str:
+    html = ""
+    services = s.services
+    html += "<h3>Servicios Críticos</h3>"
+    if services:
+        html += "<table><tr><th>Nombre</th><th>DisplayName</th><th>Estado</th></tr>"
+        for svc in services:
+            raw_status = svc.get("Status")
+            raw_str = str(raw_status) if raw_status is not None else "Unknown"
+
+            # Buscamos descripción amigable: primero por la cadena tal cual,
+            # y si no, por la versión string del número
+            status_desc = SERVICE_STATUS_DESC.get(raw_str, raw_str)
 
-        by_state = conn_sum.get("by_state", {})
-        if by_state:
-            html += "<h4>Conexiones por estado</h4>"
-            html += "<table><tr><th>Estado</th><th>Cantidad</th></tr>"
-            for state, count in by_state.items():
-                state_str = str(state)
-                state_desc = TCP_STATE_DESC.get(state_str, state_str)
-                # Mostramos "Descripción (EstadoOriginal)"
-                html += f"<tr><td>{state_desc} ({state_str})</td><td>{count}</td></tr>"
-            html += "</table>"
-
-        # ---- Eventos críticos ----
-        crit_summary = s.get("critical_events_summary", {})
-        html += "<h3>Eventos Críticos (últimas 24 horas)</h3>"
-        html += "<table><tr><th>Log</th><th>Cantidad de eventos Error/Critical</th></tr>"
-        per_log = crit_summary.get("per_log", {})
-        for log_name, count in per_log.items():
-            cls = "ok" if count == 0 else "warning"
-            html += f"<tr><td>{log_name}</td><td class='{cls}'>{count}</td></tr>"
+            # Para el color, consideramos "Running" o 3 como OK
+            is_running = (raw_str == "Running" or raw_str == "3")
+            cls = "ok" if is_running else "critical"
+
+            html += (
+                f"<tr><td>{svc.get('Name')}</td>"
+                f"<td>{svc.get('DisplayName')}</td>"
+                f"<td class='{cls}'>{status_desc}</td></tr>"
+            )
         html += "</table>"
+    else:
+        html += (
+            "<p class='small'>No se definieron servicios críticos "
+            "o no se pudo obtener la información.</p>"
+        )
 
-        # ---- Crecimiento de logs ----
-        log_growth = s.get("log_growth", {})
-        html += "<h3>Crecimiento de Logs / Archivos de Sistema</h3>"
-        details = log_growth.get("details", [])
-        if not details:
-            html += "<p class='small'>No hay datos previos para comparar (primer día de ejecución o sin baseline).</p>"
-        else:
+    # ---- Cambios en servicios (inventario completo) ----
+    if s.service_changes:
+        html += "<h4>Cambios en servicios desde la ejecución anterior</h4>"
+        html += "<table><tr><th>Servicio</th><th>Cambio</th><th>Detalle</th></tr>"
+        for c in s.service_changes:
+            cls = "warning" if c["Change"] == "removed" else "critical"
+            if c["Change"] == "changed":
+                detail = "; ".join(f"{f}: {old} → {new}" for f, (old, new) in c["Fields"].items())
+            else:
+                detail = "; ".join(f"{f}: {v}" for f, v in c["Fields"].items())
             html += (
-                "<table><tr><th>Ruta</th><th>Tamaño anterior (GB)</th>"
-                "<th>Tamaño actual (GB)</th><th>Diferencia (GB)</th>"
-                "<th>Diferencia (%)</th><th>Estado</th></tr>"
+                f"<tr><td>{c['Name']}</td><td class='{cls}'>{SERVICE_CHANGE_DESC.get(c['Change'], c['Change'])}</td>"
+                f"<td class='small'>{detail}</td></tr>"
             )
-            for item in details:
-                cls = "ok"
-                if item.get("Status") == "warning":
-                    cls = "warning"
-                html += (
-                    f"<tr><td>{item.get('Path')}</td>"
-                    f"<td>{item.get('PrevGB')}</td>"
-                    f"<td>{item.get('CurrGB')}</td>"
-                    f"<td>{item.get('DiffGB')}</td>"
-                    f"<td>{item.get('DiffPercent')}</td>"
-                    f"<td class='{cls}'>{item.get('Status')}</td></tr>"
-                )
-            html += "</table>"
-
-        # ---- Binarios sin firma o firma inválida ----
-        unsigned = s.get("unsigned_binaries", [])
-        html += "<h3>Binarios sin firma o con firma digital inválida</h3>"
-        if not unsigned:
+        html += "</table>"
+    return html
+
+
+def _server_connections(s) -> str:
+    html = ""
+    conn_sum = s.connections_summary
+    html += "<h3>Conexiones Activas</h3>"
+    html += "<table>"
+    html += f"<tr><th>Total conexiones TCP</th><td>{conn_sum.total}</td></tr>"
+    html += "</table>"
+
+    by_state = conn_sum.by_state
+    if by_state:
+        html += "<h4>Conexiones por estado</h4>"
+        html += "<table><tr><th>Estado</th><th>Cantidad</th></tr>"
+        for state, count in by_state.items():
+            state_str = str(state)
+            state_desc = TCP_STATE_DESC.get(state_str, state_str)
+            # Mostramos "Descripción (EstadoOriginal)"
+            html += f"<tr><td>{state_desc} ({state_str})</td><td>{count}</td></tr>"
+        html += "</table>"
+    return html
+
+
+def _server_critical_events(s) -> str:
+    html = ""
+    crit_summary = s.critical_events_summary
+    html += "<h3>Eventos Críticos (últimas 24 horas)</h3>"
+    html += "<table><tr><th>Log</th><th>Cantidad de eventos Error/Critical</th></tr>"
+    per_log = crit_summary.get("per_log", {})
+    for log_name, count in per_log.items():
+        cls = "ok" if count == 0 else "warning"
+        html += f"<tr><td>{log_name}</td><td class='{cls}'>{count}</td></tr>"
+    html += "</table>"
+    return html
+
+
+def _server_log_growth(s) -> str:
+    html = ""
+    log_growth = s.log_growth
+    html += "<h3>Crecimiento de Logs / Archivos de Sistema</h3>"
+    details = log_growth.get("details", [])
+    if not details:
+        html += "<p class='small'>No hay datos previos para comparar (primer día de ejecución o sin baseline).</p>"
+    else:
+        html += (
+            "<table><tr><th>Ruta</th><th>Tamaño anterior (GB)</th>"
+            "<th>Tamaño actual (GB)</th><th>Diferencia (GB)</th>"
+            "<th>Diferencia (%)</th><th>Estado</th></tr>"
+        )
+        for item in details:
+            cls = "ok"
+            if item.get("Status") == "warning":
+                cls = "warning"
             html += (
-                "<p class='small'>No se detectaron binarios sin firma o con firma inválida "
-                "en los servicios/procesos analizados.</p>"
+                f"<tr><td>{item.get('Path')}</td>"
+                f"<td>{item.get('PrevGB')}</td>"
+                f"<td>{item.get('CurrGB')}</td>"
+                f"<td>{item.get('DiffGB')}</td>"
+                f"<td>{item.get('DiffPercent')}</td>"
+                f"<td class='{cls}'>{item.get('Status')}</td></tr>"
             )
-        else:
-            html += f"<p>Se detectaron <b>{len(unsigned)}</b> binarios con problemas de firma digital.</p>"
-            # Limitamos el detalle a los primeros 50 para no hacer el correo gigante
+        html += "</table>"
+    return html
+
+
+def _server_unsigned(s) -> str:
+    html = ""
+    unsigned = s.unsigned_binaries
+    html += "<h3>Binarios sin firma o con firma digital inválida</h3>"
+    if not unsigned:
+        html += (
+            "<p class='small'>No se detectaron binarios sin firma o con firma inválida "
+            "en los servicios/procesos analizados.</p>"
+        )
+    else:
+        html += f"<p>Se detectaron <b>{len(unsigned)}</b> binarios con problemas de firma digital.</p>"
+        # Limitamos el detalle a los primeros 50 para no hacer el correo gigante
+        html += (
+            "<table>"
+            "<tr><th>Tipo</th><th>Nombre</th><th>Ruta</th>"
+            "<th>PID</th><th>Estado firma</th><th>Cert.Subject</th></tr>"
+        )
+        for item in unsigned[:50]:
+            pid = item.pid if item.pid is not None else ""
+            status = item.signature_status
+            cert_subj = item.cert_subject or ""
+            if len(cert_subj) > 80:
+                cert_subj = cert_subj[:80] + "..."
+            cls = "warning"
+            status_str = str(status) if status is not None else "Unknown"
+            if status_str.lower() in ("notsigned", "not signed"):
+                cls = "critical"
             html += (
-                "<table>"
-                "<tr><th>Tipo</th><th>Nombre</th><th>Ruta</th>"
-                "<th>PID</th><th>Estado firma</th><th>Cert.Subject</th></tr>"
+                f"<tr><td>{item.type}</td>"
+                f"<td>{item.name}</td>"
+                f"<td>{item.path}</td>"
+                f"<td>{pid}</td>"
+                f"<td class='{cls}'>{status_str}</td>"
+                f"<td>{cert_subj}</td></tr>"
             )
-            for item in unsigned[:50]:
-                tipo = item.get("Type")
-                nombre = item.get("Name")
-                ruta = item.get("Path")
-                pid = item.get("Pid", "")
-                status = item.get("SignatureStatus")
-                cert_subj = item.get("CertSubject") or ""
-                if len(cert_subj) > 80:
-                    cert_subj = cert_subj[:80] + "..."
-                cls = "warning"
-                status_str = str(status) if status is not None else "Unknown"
-                if status_str.lower() in ("notsigned", "not signed"):
-                    cls = "critical"
-                html += (
-                    f"<tr><td>{tipo}</td>"
-                    f"<td>{nombre}</td>"
-                    f"<td>{ruta}</td>"
-                    f"<td>{pid}</td>"
-                    f"<td class='{cls}'>{status_str}</td>"
-                    f"<td>{cert_subj}</td></tr>"
-                )
-            html += "</table>"
-
-    html += "</body></html>"
-    return html
\ No newline at end of file
+        html += "</table>"
+    return html
+
+
+# Secciones en el orden del reporte
+FLEET_SECTIONS = {
+    "summary": _fleet_summary,
+    "campaigns": _fleet_campaigns,
+    "service_changes": _fleet_service_changes,
+    "forecast": _fleet_forecast,
+    "new_binaries": _fleet_new_binaries,
+}
+
+SERVER_SECTIONS = {
+    "resources": _server_resources,
+    "disks": _server_disks,
+    "updates": _server_updates,
+    "logons": _server_logons,
+    "services": _server_services,
+    "connections": _server_connections,
+    "critical_events": _server_critical_events,
+    "log_growth": _server_log_growth,
+    "unsigned": _server_unsigned,
+}
+
+REPORT_SECTIONS = list(FLEET_SECTIONS) + list(SERVER_SECTIONS)
+
+
+class ReportFragments:
+    """
+    Fragmentos HTML ya armados, por (sección, servidores). Seguro entre
+    hilos: si dos reportes piden el mismo fragmento a la vez, uno lo arma y
+    el otro espera el resultado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fragments = {}
+        self._building = {}
+        self.built = 0
+        self.reused = 0
+
+    def get(self, key, render) -> str:
+        with self._lock:
+            if key in self._fragments:
+                self.reused += 1
+                return self._fragments[key]
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._fragments:
+                    self.reused += 1
+                    return self._fragments[key]
+            html = render()
+            with self._lock:
+                self._fragments[key] = html
+                self._building.pop(key, None)
+                self.built += 1
+        return html
+
+
+def _page_header(title: str, date_str: str) -> str:
+    return f"""
+    <html>
+    <head>
+      <meta charset="utf-8"/>
+      <style>
+        body {{ font-family: Arial, sans-serif; font-size: 12px; }}
+        h1 {{ background-color: #003366; color: white; padding: 10px; }}
+        h2 {{ color: #003366; border-bottom: 1px solid #ccc; margin-top: 30px; }}
+        h3 {{ color: #003366; }}
+        h4 {{ color: #003366; }}
+        table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
+        th, td {{ border: 1px solid #ddd; padding: 6px; text-align: left; vertical-align: top; }}
+        th {{ background-color: #f2f2f2; }}
+        .ok {{ color: green; font-weight: bold; }}
+        .warning {{ color: #e69138; font-weight: bold; }}
+        .critical {{ color: red; font-weight: bold; }}
+        .skipped {{ color: #666; font-weight: bold; }}
+        .small {{ font-size: 10px; color: #666; }}
+      </style>
+    </head>
+    <body>
+      <h1>{title} - {date_str}</h1>
+      <p class="small">Generado automáticamente por el monitor de servidores Windows.</p>
+    """
+
+
+def build_html_report(servers_data, sections=None, fragments: ReportFragments = None,
+                      title: str = "Reporte Diario de Seguridad y Recursos", date_str: str = None):
+    """
+    Arma el reporte HTML. sections: nombres de REPORT_SECTIONS a incluir
+    (None = todas). fragments: caché compartida entre reportes de la misma
+    ejecución; los servidores deben ser los mismos objetos en todos ellos.
+    """
+    servers_data = [as_server_result(s) for s in servers_data]
+    wanted = set(REPORT_SECTIONS if sections is None else sections)
+    fragments = fragments or ReportFragments()
+    date_str = date_str or datetime.now().strftime("%Y-%m-%d %H:%M")
+    names = tuple(s.name for s in servers_data)
+
+    parts = [_page_header(title, date_str)]
+    for section, render in FLEET_SECTIONS.items():
+        if section in wanted:
+            parts.append(fragments.get((section, names), lambda render=render: render(servers_data)))
+
+    server_sections = [(section, render) for section, render in SERVER_SECTIONS.items() if section in wanted]
+    if server_sections:
+        for s in servers_data:
+            parts.append(fragments.get(("header", s.name), lambda s=s: _server_header(s)))
+            for section, render in server_sections:
+                parts.append(fragments.get((section, s.name), lambda s=s, render=render: render(s)))
+
+    parts.append("</body></html>")
+    return "".join(parts)
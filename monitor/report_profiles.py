@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fnmatch import fnmatch
+
+from monitor.models import as_server_result
+from monitor.report_html import REPORT_SECTIONS, ReportFragments, build_html_report
+
+# Perfiles de reporte: varios reportes por audiencia desde una sola pasada
+# de recolección.
+#
+# Cada perfil elige los servidores (por nombre con comodines, por grupo de
+# umbrales y/o por nivel de riesgo mínimo), las secciones del reporte y los
+# destinatarios. Todos se arman en paralelo a partir del mismo all_data y
+# comparten un ReportFragments: una sección de un servidor (o una sección de
+# flota con el mismo conjunto de servidores) se arma una sola vez aunque la
+# pidan varios perfiles.
+#
+# Config (sección "ReportProfiles", lista; sin perfiles se envía el reporte
+# completo a Smtp.To como siempre):
+#   Name:     nombre del perfil (requerido)
+#   Subject:  asunto del correo (por defecto "<asunto diario> - <Name>")
+#   To:       destinatarios (por defecto Smtp.To)
+#   Servers:  nombres o patrones ("BUR-*"); por defecto todos
+#   Groups:   grupos de umbrales (ThresholdGroups) a incluir
+#   MinLevel: nivel mínimo de riesgo: "WARNING" o "CRITICAL"
+#   Sections: secciones de report_html.REPORT_SECTIONS; por defecto todas
+#
+# Config (sección "Reports"):
+#   MaxWorkers: reportes armados/enviados a la vez (4)
+
+DEFAULT_SUBJECT = "Reporte Diario Seguridad & Recursos Servidores Windows"
+DEFAULT_MAX_WORKERS = 4
+
+_LEVEL_ORDER = {"OK": 0, "WARNING": 1, "CRITICAL": 2}
+
+
+def select_servers(profile: dict, servers_data, servers_conf) -> list:
+    """Servidores del perfil, en el orden de servers_data."""
+    patterns = profile.get("Servers")
+    groups = set(profile.get("Groups") or [])
+    group_of = {s["Name"]: s.get("Group") for s in servers_conf}
+    min_level = _LEVEL_ORDER.get(profile.get("MinLevel"), 0)
+
+    selected = []
+    for s in servers_data:
+        if patterns and not any(fnmatch(s.name.lower(), p.lower()) for p in patterns):
+            continue
+        if groups and group_of.get(s.name) not in groups:
+            continue
+        if min_level and _LEVEL_ORDER.get(s.risk.level, 0) < min_level:
+            continue
+        selected.append(s)
+    return selected
+
+
+def render_profile(profile: dict, servers_data, servers_conf, fragments: ReportFragments, date_str: str) -> str:
+    servers = select_servers(profile, servers_data, servers_conf)
+    return build_html_report(
+        servers,
+        sections=profile.get("Sections") or REPORT_SECTIONS,
+        fragments=fragments,
+        title=f"Reporte de Seguridad y Recursos - {profile['Name']}",
+        date_str=date_str,
+    )
+
+
+def run_report_profiles(profiles, servers_data, servers_conf, smtp_conf: dict, send=None,
+                        max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Arma (y con send(subject, html, smtp_conf) envía) el reporte de cada
+    perfil en paralelo. Un perfil que falla no afecta a los demás.
+    Devuelve {perfil: html} de los perfiles armados.
+    """
+    servers_data = [as_server_result(s) for s in servers_data]
+    fragments = ReportFragments()
+    date_str = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    def one(profile):
+        html = render_profile(profile, servers_data, servers_conf, fragments, date_str)
+        if send is not None:
+            send(
+                profile.get("Subject") or f"{DEFAULT_SUBJECT} - {profile['Name']}",
+                html,
+                {**smtp_conf, "To": profile.get("To") or smtp_conf["To"]},
+            )
+        return html
+
+    reports = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(profiles))), thread_name_prefix="report") as executor:
+        futures = [(p["Name"], executor.submit(one, p)) for p in profiles]
+        for name, fut in futures:
+            try:
+                reports[name] = fut.result()
+            except Exception as ex:
+                print(f"Error en el reporte '{name}': {ex}")
+    print(f"Reportes por perfil: {len(reports)}/{len(profiles)} armados; "
+          f"fragmentos armados {fragments.built}, reutilizados {fragments.reused}.")
+    return reports
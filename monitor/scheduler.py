@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+
+# Planificación del orden de recolección de la flota.
+#
+# Los servidores se despachan por:
+#   1. Priority declarada en config (menor = antes; p.ej. 0 para DCs)
+#   2. score de riesgo previo (mayor primero)
+#   3. duración histórica de la recolección (más larga primero, para reducir
+#      el tiempo total cuando se recolecta en paralelo)
+# Con Scheduler.RunDeadlineMinutes, los servidores que no alcanzaron a
+# completarse antes del plazo se reportan como omitidos. Los hilos de
+# recolección son daemon: uno colgado no retiene la ejecución ni la salida
+# del proceso. Cada resultado se acepta (accept_fn, p. ej. el checkpoint)
+# bajo el mismo lock con el que se cierra el plazo: un servidor aceptado
+# nunca se reporta como omitido y uno omitido nunca se acepta después.
+
+DEFAULT_PRIORITY = 100
+
+
+def order_servers(servers_conf, state: dict, scheduler_conf: dict = None):
+    """
+    Devuelve la lista de servidores en orden de despacho.
+    """
+    scheduler_conf = scheduler_conf or {}
+    default_priority = scheduler_conf.get("DefaultPriority", DEFAULT_PRIORITY)
+    prev_servers = state.get("servers", {})
+
+    def sort_key(item):
+        index, s = item
+        prev = prev_servers.get(s["Name"], {})
+        score = (prev.get("risk") or {}).get("score") or 0
+        duration = prev.get("collect_seconds") or 0
+        return (s.get("Priority", default_priority), -score, -duration, index)
+
+    return [s for _, s in sorted(enumerate(servers_conf), key=sort_key)]
+
+
+def run_scheduled(servers_conf, state: dict, scheduler_conf: dict, collect_fn, skipped_fn,
+                  accept_fn=None):
+    """
+    Ejecuta collect_fn(server_conf) para cada servidor según el orden de
+    order_servers, con hasta Scheduler.MaxParallelHosts en paralelo.
+
+    Devuelve { nombre_servidor: resultado }. accept_fn(server_conf,
+    resultado) se llama con cada resultado que llega antes del plazo; los
+    servidores que no se completaron a tiempo reciben skipped_fn(server_conf)
+    y lo que terminen después se descarta.
+    """
+    scheduler_conf = scheduler_conf or {}
+    max_parallel = max(1, int(scheduler_conf.get("MaxParallelHosts", 1)))
+    deadline_min = scheduler_conf.get("RunDeadlineMinutes")
+    deadline = time.monotonic() + deadline_min * 60 if deadline_min else None
+
+    expired = threading.Event()
+    accept_lock = threading.Lock()
+    ordered = order_servers(servers_conf, state, scheduler_conf)
+    todo = queue.Queue()
+    for s in ordered:
+        todo.put(s)
+    done = queue.Queue()   # (server_conf, resultado, excepción)
+
+    def worker():
+        while not expired.is_set():
+            try:
+                s = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = collect_fn(s)
+            except BaseException as ex:
+                done.put((s, None, ex))
+                continue
+            with accept_lock:
+                if expired.is_set():
+                    print(f"Resultado de {s['Name']} descartado: llegó después del plazo de ejecución.")
+                    return
+                if accept_fn is not None:
+                    accept_fn(s, result)
+                done.put((s, result, None))
+
+    for i in range(min(max_parallel, len(ordered))):
+        threading.Thread(target=worker, name=f"collector_{i}", daemon=True).start()
+
+    results = {}
+    pending = {s["Name"]: s for s in ordered}
+
+    def take(item):
+        s, result, error = item
+        if error is not None:
+            expired.set()
+            raise error
+        del pending[s["Name"]]
+        results[s["Name"]] = result
+
+    while pending:
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        try:
+            take(done.get(timeout=timeout))
+        except queue.Empty:
+            # No esperamos servidores colgados más allá del plazo; los ya
+            # aceptados antes de cerrarlo se cuentan como completados
+            with accept_lock:
+                expired.set()
+                while True:
+                    try:
+                        take(done.get_nowait())
+                    except queue.Empty:
+                        break
+            if pending:
+                print(f"Plazo de ejecución vencido: {len(pending)} servidores omitidos.")
+            for s in pending.values():
+                results[s["Name"]] = skipped_fn(s)
+            break
+
+    return results
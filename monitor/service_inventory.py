@@ -0,0 +1,141 @@
+import hashlib
+import json
+import threading
+
+from monitor.archive import open_index
+from monitor.collectors import get_service_inventory
+
+# Inventario completo de servicios por servidor, guardado como diffs.
+#
+# En lugar de consultar solo CriticalServices, cada recolección trae la
+# lista completa de servicios (nombre, estado, tipo de inicio y hash de la
+# ruta del binario). El índice del archivo guarda el último estado conocido
+# de cada servidor (service_inventory) y, por ejecución, solo los cambios
+# (service_changes): servicios nuevos, eliminados o con otra configuración
+# (tipo de inicio o ruta del binario). Un servicio nuevo o con otra ruta es
+# un indicador típico de persistencia. El estado (Running/Stopped) se guarda
+# en el inventario pero no se compara: cambia a diario y solo sería ruido.
+#
+# El estado de CriticalServices se deriva del mismo inventario, así que el
+# modo sigue costando una sola llamada WinRM.
+#
+# Config (sección "ServiceInventory"):
+#   Enabled: activar el inventario completo (false)
+
+_FIELDS = ("Status", "StartMode", "PathHash")
+_DIFF_FIELDS = ("StartMode", "PathHash")
+
+
+def path_hash(path: str) -> str:
+    return hashlib.sha1((path or "").strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+class ServiceInventoryStore:
+    def __init__(self, config: dict, run_ts: str):
+        self.config = config
+        self.run_ts = run_ts
+        self._lock = threading.Lock()
+        self._current = {}   # servidor -> {servicio: (Status, StartMode, PathHash)}
+        self._updated = {}   # servidores con inventario nuevo en esta ejecución
+        self._changes = []   # filas de service_changes
+
+        conn = open_index(config)
+        try:
+            for server, name, status, start_mode, p_hash in conn.execute(
+                "SELECT server, name, status, start_mode, path_hash FROM service_inventory"
+            ):
+                self._current.setdefault(server, {})[name] = (status, start_mode, p_hash)
+        finally:
+            conn.close()
+
+    def diff(self, server: str, services) -> list:
+        """
+        Compara el inventario actual del servidor con el último guardado.
+        Devuelve [{"Name", "Change": added|removed|changed, "Fields": {campo: [antes, después]}}].
+        La primera vez que se ve un servidor solo se toma como línea base.
+        """
+        snapshot = {
+            s["Name"]: (s.get("Status"), s.get("StartMode"), path_hash(s.get("PathName")))
+            for s in services if s.get("Name")
+        }
+        if not snapshot:
+            # Sin datos (error remoto): no se interpreta como servicios eliminados
+            return []
+        with self._lock:
+            previous = self._current.get(server)
+            self._current[server] = snapshot
+            self._updated[server] = snapshot
+
+        if previous is None:
+            return []
+
+        changes = []
+        for name, values in snapshot.items():
+            old = previous.get(name)
+            if old is None:
+                changes.append({"Name": name, "Change": "added", "Fields": dict(zip(_FIELDS, values))})
+            else:
+                fields = {
+                    f: [o, n] for f, o, n in zip(_FIELDS, old, values) if f in _DIFF_FIELDS and o != n
+                }
+                if fields:
+                    changes.append({"Name": name, "Change": "changed", "Fields": fields})
+        for name in previous.keys() - snapshot.keys():
+            changes.append({"Name": name, "Change": "removed", "Fields": dict(zip(_FIELDS, previous[name]))})
+        changes.sort(key=lambda c: (c["Change"], c["Name"]))
+
+        with self._lock:
+            self._changes.extend(
+                (server, self.run_ts, c["Name"], c["Change"], json.dumps(c["Fields"])) for c in changes
+            )
+        return changes
+
+    def checkpoint_data(self, server: str):
+        """Inventario y cambios que aportó el servidor en esta ejecución (para el checkpoint)."""
+        with self._lock:
+            if server not in self._updated:
+                return None
+            return {
+                "snapshot": {name: list(values) for name, values in self._updated[server].items()},
+                "changes": [list(row) for row in self._changes if row[0] == server],
+            }
+
+    def replay(self, server: str, data: dict) -> None:
+        """Vuelve a aplicar lo guardado por checkpoint_data (ejecución retomada)."""
+        snapshot = {name: tuple(values) for name, values in data["snapshot"].items()}
+        with self._lock:
+            self._current[server] = snapshot
+            self._updated[server] = snapshot
+            self._changes.extend(tuple(row) for row in data["changes"])
+
+    def save(self) -> None:
+        """Reemplaza el estado de los servidores inventariados y agrega sus cambios."""
+        conn = open_index(self.config)
+        try:
+            with conn:
+                for server, snapshot in self._updated.items():
+                    conn.execute("DELETE FROM service_inventory WHERE server = ?", (server,))
+                    conn.executemany(
+                        "INSERT INTO service_inventory VALUES (?, ?, ?, ?, ?)",
+                        [(server, name, *values) for name, values in snapshot.items()],
+                    )
+                conn.executemany("INSERT INTO service_changes VALUES (?, ?, ?, ?, ?)", self._changes)
+        finally:
+            conn.close()
+
+
+def critical_services_from_inventory(services, critical_names) -> list:
+    """Misma forma que get_critical_services_status, a partir del inventario."""
+    wanted = {n.lower() for n in critical_names or []}
+    return [
+        {"Name": s["Name"], "DisplayName": s.get("DisplayName"), "Status": s.get("Status")}
+        for s in services if (s.get("Name") or "").lower() in wanted
+    ]
+
+
+def collect_service_inventory(session, store: ServiceInventoryStore, server_conf: dict) -> dict:
+    services = get_service_inventory(session)
+    return {
+        "services": critical_services_from_inventory(services, server_conf.get("CriticalServices", [])),
+        "service_changes": store.diff(server_conf["Name"], services),
+    }
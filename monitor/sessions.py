@@ -0,0 +1,157 @@
+import os
+import subprocess
+import threading
+import time
+
+from monitor.profiling import wrap_session
+from monitor.simulated_host import SimulatedSession
+
+# Caché de sesiones WinRM por host.
+#
+# Cada sesión mantiene su shell remoto y su conexión HTTP keep-alive (ver
+# winrm_session.PersistentShellSession), así que la autenticación se paga una
+# vez por sesión y no por comando. Las sesiones liberadas quedan ociosas en
+# la caché y se reutilizan en los siguientes checks y, en modo exportador,
+# en las siguientes recolecciones. Como una sesión no se comparte entre
+# hilos, el tamaño útil del pool por host es Collectors.MaxShellsPerHost.
+#
+# Con "Transport": "kerberos" el password no se envía: se usa el TGT del
+# ccache (Auth.CCache / KRB5CCNAME). Si se configura Auth.Keytab, el TGT se
+# obtiene o renueva con kinit una vez por ejecución en lugar de por host.
+
+KINIT_CHECK_INTERVAL_SEC = 3600
+
+
+def server_transport(server_conf: dict, auth_conf: dict) -> str:
+    return server_conf.get("Transport") or auth_conf.get("Transport", "ntlm")
+
+
+def ensure_kerberos_ticket(auth_conf: dict) -> None:
+    """
+    Verifica que exista un TGT válido en el ccache y, si hay keytab
+    configurado, lo obtiene con kinit cuando falta o venció.
+    """
+    if auth_conf.get("CCache"):
+        os.environ["KRB5CCNAME"] = auth_conf["CCache"]
+
+    if subprocess.run(["klist", "-s"], check=False).returncode == 0:
+        return
+
+    keytab = auth_conf.get("Keytab")
+    principal = auth_conf.get("Principal")
+    if not keytab or not principal:
+        raise RuntimeError("No hay TGT de Kerberos válido y no se configuró Auth.Keytab / Auth.Principal")
+
+    print(f"Obteniendo TGT de Kerberos para {principal}...")
+    subprocess.run(["kinit", "-k", "-t", keytab, principal], check=True)
+
+
+def open_session(server_conf: dict, auth_conf: dict):
+    """
+    Abre una sesión nueva para el servidor según el transporte configurado.
+    """
+    transport = server_transport(server_conf, auth_conf)
+
+    if transport == "simulated":
+        return SimulatedSession(
+            server_conf["Host"],
+            latency_sec=auth_conf.get("SimulatedLatencySec", 0.0),
+        )
+
+    kwargs = {}
+    if "ReadTimeoutSec" in auth_conf:
+        kwargs["read_timeout_sec"] = auth_conf["ReadTimeoutSec"]
+    if "OperationTimeoutSec" in auth_conf:
+        kwargs["operation_timeout_sec"] = auth_conf["OperationTimeoutSec"]
+
+    password = server_conf.get("Password")
+    if transport == "kerberos":
+        password = None
+        if auth_conf.get("KerberosHostnameOverride"):
+            kwargs["kerberos_hostname_override"] = auth_conf["KerberosHostnameOverride"]
+
+    # pywinrm (y requests, cryptography, NTLM/spnego) se carga con la primera sesión real
+    from monitor.winrm_session import create_session
+
+    return create_session(
+        host=server_conf["Host"],
+        username=server_conf.get("Username") or auth_conf.get("Principal"),
+        password=password,
+        transport=transport,
+        **kwargs
+    )
+
+
+class SessionCache:
+    """
+    Pool de sesiones ociosas por (host, usuario, password, transporte).
+    Un cambio de credenciales en la configuración genera sesiones nuevas;
+    las de los servidores sin cambios se siguen reutilizando.
+    """
+
+    def __init__(self, auth_conf: dict = None, max_idle_per_host: int = 1):
+        self.auth_conf = auth_conf or {}
+        self.max_idle_per_host = max(1, max_idle_per_host)
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ticket_checked_at = None
+        self._closed = False
+
+    def _key(self, server_conf: dict):
+        return (
+            server_conf["Host"],
+            server_conf.get("Username"),
+            server_conf.get("Password"),
+            server_transport(server_conf, self.auth_conf),
+        )
+
+    def _check_ticket(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._ticket_checked_at is not None and now - self._ticket_checked_at < KINIT_CHECK_INTERVAL_SEC:
+                return
+            ensure_kerberos_ticket(self.auth_conf)
+            self._ticket_checked_at = now
+
+    def acquire(self, server_conf: dict):
+        key = self._key(server_conf)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        if key[3] == "kerberos":
+            self._check_ticket()
+        # En modo perfil la sesión mide el tiempo de espera remoto
+        return wrap_session(open_session(server_conf, self.auth_conf))
+
+    def release(self, server_conf: dict, session, ok: bool = True) -> None:
+        """
+        Devuelve la sesión al pool. Si hubo error (ok=False) o el pool del
+        host está lleno, se cierra.
+        """
+        key = self._key(server_conf)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            # Tras close_all (p.ej. un servidor que terminó después del plazo) no se guarda
+            if ok and not self._closed and len(idle) < self.max_idle_per_host:
+                idle.append(session)
+                return
+        _close(session)
+
+    def close_all(self) -> None:
+        """Cierra las sesiones ociosas; las que se liberen después se cierran al liberarlas."""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle = {}
+            self._closed = True
+        for session in sessions:
+            _close(session)
+
+
+def _close(session) -> None:
+    close = getattr(session, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
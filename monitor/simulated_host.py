@@ -0,0 +1,260 @@
+import base64
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+# Host Windows simulado para desarrollo y pruebas sin WinRM.
+#
+# SimulatedSession expone la misma interfaz que usan los recolectores
+# (run_ps -> objeto con std_out / std_err / status_code) y responde con
+# datos deterministas por host según palabras clave del script. Se activa
+# con "Transport": "simulated" (en Auth o por servidor). SimulatedLatencySec
+# agrega una espera por llamada para imitar el round-trip de WinRM.
+
+
+def _logon_properties(event_id: int, account: str, ip: str) -> list:
+    # Mismo orden de EventData que Windows (ver monitor/event_schema.py)
+    if event_id == 4625:
+        return [
+            "S-1-0-0", "-", "-", "0x0", "S-1-0-0", account, "CORP",
+            "3221225581", "%%2313", "3221225578", "3", "NtLmSsp ", "NTLM", "WS01",
+            "-", "-", "0", "0x0", "-", ip, "50123",
+        ]
+    return [
+        "S-1-5-18", "SRV$", "CORP", "0x3e7", "S-1-5-21-1", account, "CORP", "0x1a2b3c",
+        "3", "NtLmSsp ", "NTLM", "WS01", "{00000000-0000-0000-0000-000000000000}",
+        "-", "-", "0", "0x0", "-", ip, "50123",
+    ]
+
+
+# Jobs remotos simulados (monitor/remote_jobs.py): (host, job) -> (inicio, resultado)
+_REMOTE_JOBS = {}
+_REMOTE_JOBS_LOCK = threading.Lock()
+SIMULATED_JOB_SECONDS = 2
+
+
+def _simulated_signature(path: str) -> str:
+    bucket = zlib.crc32(path.encode("utf-8")) % 7
+    return {0: "NotSigned", 1: "HashMismatch"}.get(bucket, "Valid")
+
+
+class SimulatedResponse:
+    def __init__(self, std_out: bytes, status_code: int = 0, std_err: bytes = b""):
+        self.std_out = std_out
+        self.std_err = std_err
+        self.status_code = status_code
+
+
+class SimulatedSession:
+    def __init__(self, host: str, latency_sec: float = 0.0, events: int = 300):
+        self.host = host
+        self.latency_sec = latency_sec
+        self.events = events
+        self.calls = 0
+        # Semilla estable por host (hash() de str varía entre procesos)
+        self._seed = zlib.crc32(host.encode("utf-8"))
+
+    def _rng(self, salt: str) -> random.Random:
+        return random.Random(self._seed ^ zlib.crc32(salt.encode("utf-8")))
+
+    def run_ps(self, script: str) -> SimulatedResponse:
+        self.calls += 1
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        compress = "IO.Compression.GZipStream" in script
+        if compress:
+            # Envoltorio de salida comprimida de collectors._run_ps_json
+            script = script.split("(& {\n", 1)[1].rsplit("\n}) -join", 1)[0]
+        data = self._respond(script)
+        out = json.dumps(data, indent=2).encode("utf-8") if data is not None else b""
+        if compress:
+            out = b"GZ:" + base64.b64encode(gzip.compress(out))
+        return SimulatedResponse(out)
+
+    def iter_ps_lines(self, script: str):
+        """Salida de un script NDJSON: un objeto JSON compacto por línea."""
+        self.calls += 1
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        data = self._respond(script)
+        if data is None:
+            return
+        for item in (data if isinstance(data, list) else [data]):
+            yield json.dumps(item)
+
+    def close(self):
+        pass
+
+    def _remote_job(self, script: str):
+        # La "tarea" termina SIMULATED_JOB_SECONDS después de lanzada
+        name = script.split("$jobName = '", 1)[1].split("'", 1)[0]
+        key = (self.host, name)
+        out = {"Result": None, "FinishedAt": None, "Running": False, "Started": False}
+        with _REMOTE_JOBS_LOCK:
+            job = _REMOTE_JOBS.get(key)
+            if job is not None and time.monotonic() - job[0] < SIMULATED_JOB_SECONDS:
+                out["Running"] = True
+            elif job is not None:
+                out["Result"], out["FinishedAt"] = job[1], job[2]
+            if not out["Running"] and "$startJob = $true" in script:
+                body = script.split("$jobScript = @'\n", 1)[1].rsplit("\n'@", 1)[0]
+                finished_at = (datetime.utcnow() + timedelta(seconds=SIMULATED_JOB_SECONDS)).isoformat() + "Z"
+                _REMOTE_JOBS[key] = (time.monotonic(), json.dumps(self._respond(body)), finished_at)
+                out["Started"] = True
+        return out
+
+    def _respond(self, script: str):
+        rng = self._rng(script[:200])
+        now = datetime.utcnow()
+
+        if "$jobName = '" in script:
+            return self._remote_job(script)
+
+        if "$signaturePaths = @(" in script:
+            paths = script.split("$signaturePaths = @(", 1)[1].split(")\n", 1)[0]
+            return [
+                {"Path": p, "SignatureStatus": _simulated_signature(p), "CertSubject": None, "CertIssuer": None}
+                for p in (x.strip("'").replace("''", "'") for x in paths.split("','"))
+            ]
+        if "$serviceRows" in script:
+            # Inventario de servicios; de vez en cuando aparece uno nuevo o cambia de ruta
+            names = ["Spooler", "WinRM", "Netlogon", "LanmanServer", "mpssvc", "CryptSvc", "gpsvc", "Wuauserv"]
+            names += [f"Svc{i:02d}" for i in range(40)]
+            rows = [
+                [n, n, "Running" if rng.random() < 0.9 else "Stopped", "Auto",
+                 f"C:\\Windows\\System32\\svchost.exe -k {n}"]
+                for n in names
+            ]
+            day_rng = self._rng(now.date().isoformat())
+            if day_rng.random() < 0.3:
+                rows.append(["UpdHelper", "Update Helper", "Running", "Auto", "C:\\Users\\Public\\upd.exe"])
+            if day_rng.random() < 0.2:
+                rows[-2][4] = "C:\\ProgramData\\svc\\host.exe"
+            return rows
+        if "Get-FileHash" in script:
+            # Binarios comunes a toda la flota + alguno propio del host que cambia a diario
+            items = [
+                {"Type": "Service", "Name": f"agent{i}", "DisplayName": f"Agente {i}",
+                 "Path": f"C:\\Program Files\\Vendor{i}\\agent.exe"}
+                for i in range(15)
+            ]
+            items.append({"Type": "Process", "Name": "tool", "DisplayName": None, "Pid": rng.randint(4, 9000),
+                          "Path": f"C:\\Tools\\{self.host}\\tool.exe", "Day": now.date().isoformat()})
+            for item in items:
+                seed = item["Path"] + item.pop("Day", "")
+                item["Sha256"] = hashlib.sha256(seed.encode("utf-8")).hexdigest().upper()
+            return items
+
+        if "Get-Counter" in script:
+            def stat(low, high, digits=2):
+                values = sorted(round(rng.uniform(low, high), digits) for _ in range(5))
+                return {"Min": values[0], "Avg": round(sum(values) / 5, digits), "Max": values[-1]}
+            return {
+                "Counters": {
+                    "cpu_percent": stat(1, 95),
+                    "processor_queue": stat(0, 6, 0),
+                    "available_mb": stat(512, 8192, 0),
+                    "disk_queue": stat(0, 3),
+                    "disk_sec_per_transfer": stat(0.001, 0.040, 4),
+                    "net_bytes_per_sec": stat(1e4, 5e7, 0),
+                },
+                "CPUPercent": None,
+                "TotalMemoryGB": 16.0,
+                "FreeMemoryGB": round(rng.uniform(0.5, 8), 2),
+                "Disk": [
+                    {"DeviceID": "C:", "SizeGB": 100.0, "FreeGB": round(rng.uniform(5, 60), 2)},
+                    {"DeviceID": "D:", "SizeGB": 500.0, "FreeGB": round(rng.uniform(50, 400), 2)},
+                ],
+            }
+        if "Win32_LogicalDisk" in script:
+            return [
+                {"DeviceID": "C:", "SizeGB": 100.0, "FreeGB": round(rng.uniform(5, 60), 2)},
+                {"DeviceID": "D:", "SizeGB": 500.0, "FreeGB": round(rng.uniform(50, 400), 2)},
+            ]
+        if "Win32_OperatingSystem" in script:
+            return {"TotalGB": 16.0, "FreeGB": round(rng.uniform(0.5, 8), 2)}
+        if "Win32_Processor" in script:
+            return {"CPUPercent": round(rng.uniform(1, 95), 2)}
+        if "Get-WinEvent" in script and "LevelDisplayName -eq 'Error'" in script:
+            return [
+                {
+                    "TimeCreated": (now - timedelta(minutes=rng.randint(1, 1400))).isoformat(),
+                    "Id": rng.choice([7000, 7031, 1000, 6008]),
+                    "LevelDisplayName": "Error",
+                    "ProviderName": "Service Control Manager",
+                    "Message": "El servicio terminó de forma inesperada.",
+                }
+                for _ in range(rng.randint(0, 30))
+            ]
+        if "Get-WinEvent" in script:
+            events = []
+            for i in range(self.events):
+                event_id = 4625 if rng.random() < 0.1 else 4624
+                ip = f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 20)}"
+                if rng.random() < 0.02:
+                    # Origen externo que prueba contraseñas en toda la flota
+                    event_id, ip = 4625, "203.0.113.7"
+                account = f"user{rng.randint(1, 9)}"
+                time_created = (now - timedelta(minutes=i)).isoformat()
+                if "Properties" in script:
+                    events.append({
+                        "TimeCreated": time_created,
+                        "Id": event_id,
+                        "ProviderName": "Microsoft-Windows-Security-Auditing",
+                        "Properties": _logon_properties(event_id, account, ip),
+                    })
+                    continue
+                events.append({
+                    "TimeCreated": time_created,
+                    "Id": event_id,
+                    "LevelDisplayName": "Information",
+                    "ProviderName": "Microsoft-Windows-Security-Auditing",
+                    "Message": (
+                        "An account failed to log on." if event_id == 4625
+                        else "An account was successfully logged on."
+                    ) + f"\r\n\tLogon Type:\t\t3\r\n\tAccount Name:\t\t{account}"
+                      + f"\r\n\tSource Network Address:\t{ip}",
+                })
+            return events
+        if "Get-Service" in script:
+            names = [n.strip("'") for n in script.split("-Name @(", 1)[1].split(")", 1)[0].split(",") if n]
+            return [
+                {"Name": n, "DisplayName": n, "Status": "Running" if rng.random() < 0.95 else "Stopped"}
+                for n in names
+            ]
+        if "PSWindowsUpdate" in script:
+            pending = rng.randint(0, 12)
+            return {
+                "PendingCount": pending,
+                "PendingSecurityCount": rng.randint(0, pending),
+                "PendingTitles": [f"Security Update KB50{rng.randint(10000, 99999)}" for _ in range(pending)],
+                "RecentInstalled": [],
+            }
+        if "Get-NetTCPConnection" in script:
+            return [
+                {
+                    "LocalAddress": "0.0.0.0", "LocalPort": rng.randint(1, 65535),
+                    "RemoteAddress": f"10.0.0.{rng.randint(1, 254)}", "RemotePort": rng.randint(1, 65535),
+                    "State": rng.choice([2, 5, 5, 5, 11]), "OwningProcess": rng.randint(4, 9000),
+                }
+                for _ in range(rng.randint(10, 200))
+            ]
+        if "Get-ChildItem -Path $path -Recurse" in script:
+            paths = script.split("foreach ($path in @(", 1)[1].split(")) {", 1)[0].split("','")
+            return [{"Path": p.strip("'"), "SizeGB": round(rng.uniform(0.1, 5), 3)} for p in paths]
+        if "Get-AuthenticodeSignature" in script:
+            return [
+                {
+                    "Type": "Service", "Name": f"svc{i}", "DisplayName": f"Servicio {i}",
+                    "Path": f"C:\\Program Files\\Vendor{i}\\agent.exe",
+                    "SignatureStatus": rng.choice(["NotSigned", "HashMismatch", "UnknownError"]),
+                    "CertSubject": None, "CertIssuer": None,
+                }
+                for i in range(rng.randint(0, 4))
+            ]
+        return None
@@ -0,0 +1,96 @@
+import codecs
+import warnings
+from base64 import b64encode
+
+import winrm
+from winrm.exceptions import WinRMError, WinRMOperationTimeoutError
+
+# Sesiones WinRM reales (pywinrm).
+#
+# pywinrm arrastra requests, cryptography y las pilas NTLM/spnego, así que
+# este módulo solo se importa al abrir la primera sesión real (ver
+# monitor/sessions.open_session). Los recolectores de monitor/collectors.py
+# solo usan la interfaz de la sesión (run_ps / iter_ps_lines), la misma que
+# implementa monitor/simulated_host.SimulatedSession.
+
+warnings.filterwarnings("ignore", category=UserWarning, module="winrm")
+
+
+class PersistentShellSession(winrm.Session):
+    """
+    winrm.Session que reutiliza un único shell remoto y la misma sesión HTTP
+    (keep-alive) para todos los comandos. winrm.Session.run_cmd abre y
+    cierra un shell por comando y además cierra la sesión de requests, con
+    lo que cada llamada repite la autenticación NTLM/Kerberos completa.
+    Una instancia no debe usarse desde dos hilos a la vez.
+    """
+
+    def __init__(self, target, auth, **kwargs):
+        super().__init__(target, auth, **kwargs)
+        self._shell_id = None
+
+    def _start_command(self, command, args=()):
+        if self._shell_id is None:
+            self._shell_id = self.protocol.open_shell()
+        try:
+            return self.protocol.run_command(self._shell_id, command, args)
+        except WinRMError:
+            # El shell pudo vencer del lado remoto (IdleTimeout); reabrimos una vez
+            self._shell_id = self.protocol.open_shell()
+            return self.protocol.run_command(self._shell_id, command, args)
+
+    def run_cmd(self, command, args=()):
+        command_id = self._start_command(command, args)
+        rs = winrm.Response(self.protocol.get_command_output(self._shell_id, command_id))
+        self.protocol.cleanup_command(self._shell_id, command_id)
+        return rs
+
+    def iter_ps_lines(self, script: str):
+        """
+        Ejecuta un script PowerShell y entrega su stdout línea a línea a
+        medida que llegan los bloques WSMan Receive, sin acumular la salida
+        completa en memoria.
+        """
+        encoded_ps = b64encode(script.encode("utf_16_le")).decode("ascii")
+        command_id = self._start_command(f"powershell -encodedcommand {encoded_ps}")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        pending = ""
+        done = False
+        try:
+            while not done:
+                try:
+                    stdout, _stderr, _code, done = self.protocol.get_command_output_raw(self._shell_id, command_id)
+                except WinRMOperationTimeoutError:
+                    # El comando sigue corriendo sin producir salida
+                    continue
+                pending += decoder.decode(stdout)
+                *lines, pending = pending.split("\n")
+                yield from lines
+            pending += decoder.decode(b"", final=True)
+            if pending:
+                yield pending
+        finally:
+            self.protocol.cleanup_command(self._shell_id, command_id)
+
+    def close(self):
+        try:
+            if self._shell_id is not None:
+                self.protocol.close_shell(self._shell_id)
+        except Exception:
+            pass
+        finally:
+            self._shell_id = None
+            self.protocol.transport.close_session()
+
+
+def create_session(host: str, username: str, password: str = None, transport: str = "ntlm",
+                   **kwargs) -> winrm.Session:
+    # Para dev en Windows y prod en Linux, WinRM funciona igual si tienes conectividad y credenciales.
+    # Con transport='kerberos' el password no se usa: se toma el TGT del ccache (ver monitor/sessions.py)
+    print (f"Creating WinRM session to {host} with user {username} ({transport})")
+    return PersistentShellSession(
+        target=host,
+        auth=(username, password),
+        transport=transport,
+        **kwargs
+    )
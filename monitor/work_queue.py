@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from monitor.archive import _ensure_columns
+from monitor.scheduler import order_servers
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cola de trabajo compartida para recolectar con varios nodos.
+#
+# En modo coordinador (WorkQueue.Enabled), "main.py run" no se conecta a los
+# servidores: encola un job por servidor en un archivo SQLite compartido y
+# espera los resultados. Los procesos "main.py worker" (en la misma máquina
+# o en otros nodos con acceso al archivo) toman jobs con un lease, corren los
+# recolectores de siempre y dejan el resultado (server_data + estado nuevo)
+# en la cola. Mientras recolecta, el worker renueva el lease; si el worker
+# muere, el lease vence y otro worker vuelve a tomar el job (hasta
+# MaxAttempts intentos). El coordinador arma el estado, el archivo y el
+# reporte con los resultados como en una ejecución normal.
+#
+# Cada worker solo toma jobs de los servidores de su propia configuración
+# que coinciden con WorkQueue.WorkerServers, así un nodo en otro segmento de
+# red recolecta los servidores que alcanza. Las credenciales y el transporte
+# salen de la configuración del worker; la profundidad, los umbrales y el
+# estado previo los manda el coordinador en el job.
+#
+# Varios coordinadores pueden compartir la cola (ejecuciones solapadas, un
+# --resume junto a una ejecución nueva): cada uno espera solo los jobs de su
+# run_ts y solo se borran los jobs con más de RetentionHours. Un job que
+# ningún worker toma durante ClaimTimeoutSeconds (p. ej. un servidor que no
+# coincide con ningún WorkerServers) se da por fallido, así el coordinador
+# termina aunque no haya RunDeadlineMinutes.
+#
+# Config (sección "WorkQueue"):
+#   Enabled:             "main.py run" actúa como coordinador (false)
+#   Path:                archivo SQLite de la cola ("queue.db")
+#   LeaseSeconds:        duración del lease; se renueva cada tercio (300)
+#   MaxAttempts:         intentos por job antes de darlo por fallido (3)
+#   PollSeconds:         intervalo de consulta de coordinador y workers (2)
+#   ClaimTimeoutSeconds: espera máxima de un job sin worker que lo tome (600)
+#   RetentionHours:      antigüedad a partir de la cual se borran jobs (48)
+#   WorkerServers:       patrones de servidores que toma este worker ([] = todos)
+#   WorkerParallelHosts: jobs en paralelo por worker (1)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_SECONDS = 2
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 600
+DEFAULT_RETENTION_HOURS = 48
+
+
+def _get_queue_path(config: dict) -> str:
+    path = config.get("WorkQueue", {}).get("Path", "queue.db")
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    return path
+
+
+class WorkQueue:
+    def __init__(self, config: dict):
+        conf = config.get("WorkQueue", {})
+        self.path = _get_queue_path(config)
+        self.lease_seconds = conf.get("LeaseSeconds", DEFAULT_LEASE_SECONDS)
+        self.max_attempts = conf.get("MaxAttempts", DEFAULT_MAX_ATTEMPTS)
+        self.claim_timeout = conf.get("ClaimTimeoutSeconds", DEFAULT_CLAIM_TIMEOUT_SECONDS)
+        self.retention_hours = conf.get("RetentionHours", DEFAULT_RETENTION_HOURS)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    run_ts      TEXT NOT NULL,
+                    server      TEXT NOT NULL,
+                    priority    INTEGER NOT NULL,
+                    status      TEXT NOT NULL,
+                    payload     TEXT,
+                    worker      TEXT,
+                    lease_until REAL,
+                    attempts    INTEGER NOT NULL DEFAULT 0,
+                    result      TEXT,
+                    error       TEXT,
+                    created_at  REAL,
+                    queued_at   REAL,
+                    PRIMARY KEY (run_ts, server)
+                )
+                """
+            )
+            # queued_at: desde cuándo el job espera un worker (encolado o devuelto a la cola)
+            _ensure_columns(conn, "jobs", (("created_at", "REAL"), ("queued_at", "REAL")))
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transacciones explícitas (BEGIN IMMEDIATE) para que el claim sea atómico entre procesos
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    # ---- coordinador ----
+
+    def enqueue(self, run_ts: str, jobs) -> int:
+        """
+        Encola [(servidor, payload)] en orden de prioridad. Se borran los
+        jobs con más de RetentionHours (de cualquier ejecución); los de
+        run_ts que ya existen (coordinador retomado) se conservan con su estado.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE run_ts != ? AND COALESCE(created_at, 0) < ?",
+                (run_ts, now - self.retention_hours * 3600),
+            )
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (run_ts, server, priority, status, payload, created_at, queued_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+                [
+                    (run_ts, server, priority, json.dumps(payload, ensure_ascii=False, default=str), now, now)
+                    for priority, (server, payload) in enumerate(jobs)
+                ],
+            )
+            return conn.total_changes - before
+
+    def expire(self, run_ts: str) -> int:
+        """
+        Da por fallidos los jobs con lease vencido que ya agotaron sus
+        intentos y los que esperan un worker hace más de ClaimTimeoutSeconds
+        (pendientes, o con lease vencido que nadie retomó).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ? "
+                "WHERE run_ts = ? AND status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (f"Lease vencido tras {self.max_attempts} intentos", run_ts, now, self.max_attempts),
+            ).rowcount
+            unclaimed = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = COALESCE(error || '; ', '') || ? "
+                "WHERE run_ts = ? AND ("
+                "(status = 'pending' AND COALESCE(queued_at, 0) < ?) OR "
+                "(status = 'leased' AND lease_until < ?))",
+                (f"Ningún worker tomó el job en {self.claim_timeout} s", run_ts,
+                 now - self.claim_timeout, now - self.claim_timeout),
+            ).rowcount
+            return expired + unclaimed
+
+    def finished(self, run_ts: str, servers) -> dict:
+        """{servidor: (status, result, error)} de los jobs terminados (done / failed) entre servers."""
+        servers = list(servers)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT server, status, result, error FROM jobs "
+                f"WHERE run_ts = ? AND status IN ('done', 'failed') AND server IN ({', '.join('?' * len(servers))})",
+                (run_ts, *servers),
+            ).fetchall()
+        finally:
+            conn.close()
+        return {server: (status, json.loads(result) if result else None, error) for server, status, result, error in rows}
+
+    def cancel(self, run_ts: str, servers) -> None:
+        """Quita de la cola jobs que ya no se esperan (plazo vencido)."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM jobs WHERE run_ts = ? AND server = ? AND status IN ('pending', 'leased')",
+                [(run_ts, s) for s in servers],
+            )
+
+    # ---- worker ----
+
+    def claim(self, worker: str, servers=None):
+        """
+        Toma el próximo job pendiente (o con lease vencido) de los servidores
+        indicados. Devuelve {"run_ts", "server", "payload", "attempts"} o None.
+        """
+        now = time.time()
+        sql = (
+            "SELECT run_ts, server, payload, attempts FROM jobs "
+            "WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) AND attempts < ?"
+        )
+        params = [now, self.max_attempts]
+        if servers is not None:
+            sql += f" AND server IN ({', '.join('?' * len(servers))})"
+            params.extend(servers)
+        sql += " ORDER BY priority LIMIT 1"
+
+        with self._transaction() as conn:
+            row = conn.execute(sql, params).fetchone()
+            if row is None:
+                return None
+            run_ts, server, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE run_ts = ? AND server = ?",
+                (worker, now + self.lease_seconds, run_ts, server),
+            )
+        return {"run_ts": run_ts, "server": server, "payload": json.loads(payload), "attempts": attempts + 1}
+
+    def renew(self, job: dict, worker: str) -> bool:
+        """Extiende el lease; False si el job ya no es de este worker."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE run_ts = ? AND server = ? AND status = 'leased' AND worker = ?",
+                (time.time() + self.lease_seconds, job["run_ts"], job["server"], worker),
+            ).rowcount == 1
+
+    def complete(self, job: dict, worker: str, result: dict) -> bool:
+        """
+        Guarda el resultado si el job sigue siendo de este worker. Si el
+        lease venció y otro worker lo tomó, se descarta (False).
+        """
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL "
+                "WHERE run_ts = ? AND server = ? AND status = 'leased' AND worker = ?",
+                (json.dumps(result, ensure_ascii=False, default=str), job["run_ts"], job["server"], worker),
+            ).rowcount == 1
+
+    def fail(self, job: dict, worker: str, error: str) -> None:
+        """Devuelve el job a la cola, o lo da por fallido si agotó sus intentos."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, worker = NULL, lease_until = NULL, queued_at = ? "
+                "WHERE run_ts = ? AND server = ? AND status = 'leased' AND worker = ?",
+                (self.max_attempts, error, time.time(), job["run_ts"], job["server"], worker),
+            )
+
+    @contextmanager
+    def keep_leased(self, job: dict, worker: str):
+        """Renueva el lease en segundo plano mientras dura el bloque."""
+        stop = threading.Event()
+
+        def renew_loop():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(job, worker):
+                        return
+                except sqlite3.Error as ex:
+                    print(f"No se pudo renovar el lease de {job['server']}: {ex}")
+
+        thread = threading.Thread(target=renew_loop, name=f"lease-{job['server']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+def run_queued(queue: WorkQueue, run_ts: str, servers_conf, state: dict, scheduler_conf: dict,
+               payload_fn, failed_fn, skipped_fn, done_fn=None, poll_seconds: float = DEFAULT_POLL_SECONDS,
+               completed: dict = None):
+    """
+    Contraparte de scheduler.run_scheduled para el modo coordinador: encola
+    un job por servidor (en el orden de order_servers) y espera los
+    resultados de los workers. Devuelve {nombre_servidor: (server_data, new_state)}.
+
+    payload_fn(s) arma el job; failed_fn(s, error) y skipped_fn(s) el
+    resultado de un job fallido o no terminado antes de
+    Scheduler.RunDeadlineMinutes; done_fn(name, server_data, new_state) se
+    llama con cada resultado recibido. completed: resultados ya conocidos (checkpoint).
+    """
+    scheduler_conf = scheduler_conf or {}
+    deadline_min = scheduler_conf.get("RunDeadlineMinutes")
+    deadline = time.monotonic() + deadline_min * 60 if deadline_min else None
+
+    completed = completed or {}
+    results = dict(completed)
+    by_name = {s["Name"]: s for s in servers_conf}
+    ordered = [s for s in order_servers(servers_conf, state, scheduler_conf) if s["Name"] not in completed]
+    added = queue.enqueue(run_ts, [(s["Name"], payload_fn(s)) for s in ordered])
+    print(f"Jobs encolados: {added} de {len(ordered)} servidores; esperando a los workers...")
+
+    waiting = {s["Name"] for s in ordered}
+    while waiting:
+        queue.expire(run_ts)
+        for name, (status, result, error) in queue.finished(run_ts, waiting).items():
+            waiting.discard(name)
+            if status == "done":
+                server_data, new_state = result["server_data"], result["new_state"]
+                results[name] = (server_data, new_state)
+                if done_fn is not None:
+                    done_fn(name, server_data, new_state)
+            else:
+                results[name] = failed_fn(by_name[name], error)
+        if not waiting:
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            print(f"Plazo de ejecución vencido: {len(waiting)} servidores omitidos.")
+            queue.cancel(run_ts, waiting)
+            for name in waiting:
+                results[name] = skipped_fn(by_name[name])
+            break
+        time.sleep(poll_seconds)
+    return results
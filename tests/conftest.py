@@ -0,0 +1,30 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from monitor.config_loader import MonitorConfig, compile_thresholds, validate_config  # noqa: E402
+
+
+@pytest.fixture
+def config(tmp_path):
+    """config/config.json con transporte simulado y todos los archivos en tmp_path."""
+    with open(os.path.join(ROOT, "config", "config.json"), "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    raw["Servers"] = raw["Servers"][:4]
+    raw["Auth"] = {"Transport": "simulated"}
+    raw["Archive"] = {"Path": str(tmp_path / "archive")}
+    raw["State"] = {"Path": str(tmp_path / "state.json")}
+    raw["Checkpoint"] = {"Path": str(tmp_path / "checkpoint.jsonl")}
+    raw["WorkQueue"] = {**raw.get("WorkQueue", {}), "Path": str(tmp_path / "queue.db")}
+    return raw
+
+
+@pytest.fixture
+def monitor_config(config):
+    validate_config(config)
+    return MonitorConfig(raw=config, thresholds=compile_thresholds(config))
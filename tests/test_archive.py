@@ -0,0 +1,115 @@
+import gzip
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from monitor.archive import (
+    INDEX_FILE,
+    _get_archive_dir,
+    _segment_name,
+    archive_run,
+    list_snapshots,
+    load_snapshot,
+    open_index,
+    prune_archive,
+)
+
+
+def run_ts(days_ago: int = 0) -> str:
+    return (datetime.utcnow().replace(microsecond=0) - timedelta(days=days_ago)).isoformat()
+
+
+def server(name: str, cpu: float) -> dict:
+    return {
+        "name": name,
+        "resources": {"disk": [{"DeviceID": "C:", "SizeGB": 100.0, "FreeGB": 42.5}]},
+        "resources_eval": {"cpu_value": cpu, "mem_free_gb": 3.0},
+        "logons": {"logons_ok_count": 4, "logons_fail_count": 2},
+        "unsigned_binaries": [{"Type": "Service", "Name": "x", "Path": "C:\\x.exe", "SignatureStatus": "NotSigned"}],
+        "risk": {"score": 30, "level": "OK", "notes": ["ñandú"]},
+        "collection": {"status": "ok", "depth": "deep"},
+    }
+
+
+def test_snapshots_round_trip_through_offsets(config):
+    ts = run_ts()
+    servers = [server("SRV1", 10.0), server("SRV2", 20.0), server("SRV3", 30.0)]
+    assert archive_run(config, ts, servers) == 3
+
+    for s in servers:
+        assert load_snapshot(config, s["name"], ts) == s
+    assert load_snapshot(config, "SRV2") == servers[1]
+    assert load_snapshot(config, "NOPE") is None
+
+
+def test_segment_is_a_valid_gzip_of_independent_members(config):
+    ts = run_ts()
+    servers = [server("SRV1", 10.0), server("SRV2", 20.0)]
+    archive_run(config, ts, servers)
+
+    with gzip.open(os.path.join(_get_archive_dir(config), _segment_name(ts)), "rt", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 2
+
+
+def test_latest_snapshot_and_listing(config):
+    older, newer = run_ts(2), run_ts(1)
+    archive_run(config, older, [server("SRV1", 10.0)])
+    archive_run(config, newer, [server("SRV1", 90.0)])
+
+    assert list_snapshots(config, "SRV1") == [older, newer]
+    assert load_snapshot(config, "SRV1")["resources_eval"]["cpu_value"] == 90.0
+    assert load_snapshot(config, "SRV1", older)["resources_eval"]["cpu_value"] == 10.0
+
+
+def test_facts_are_indexed(config):
+    ts = run_ts()
+    archive_run(config, ts, [server("SRV1", 55.0)])
+    conn = open_index(config)
+    try:
+        assert conn.execute(
+            "SELECT cpu_percent, logons_failed, unsigned_count, collection_status FROM server_metrics"
+        ).fetchall() == [(55.0, 2, 1, "ok")]
+        assert conn.execute("SELECT device, free_gb FROM disk_metrics").fetchall() == [("C:", 42.5)]
+        assert conn.execute("SELECT count(*) FROM unsigned_binaries").fetchone() == (1,)
+    finally:
+        conn.close()
+
+
+def test_prune_removes_runs_older_than_retention(config):
+    config["Archive"]["RetentionDays"] = 30
+    old, recent = run_ts(40), run_ts(1)
+    archive_run(config, old, [server("SRV1", 10.0)])
+    archive_run(config, recent, [server("SRV1", 20.0)])
+
+    # archive_run ya podó la ejecución vieja; una segunda pasada no borra nada
+    assert prune_archive(config) == 0
+    assert list_snapshots(config, "SRV1") == [recent]
+    assert not os.path.exists(os.path.join(_get_archive_dir(config), _segment_name(old)))
+    assert os.path.exists(os.path.join(_get_archive_dir(config), _segment_name(recent)))
+
+    assert prune_archive(config, now=datetime.utcnow() + timedelta(days=60)) == 1
+    assert list_snapshots(config, "SRV1") == []
+
+
+def test_old_index_gets_new_columns(config):
+    # Índice creado antes de collection_status / fixed_points
+    archive_dir = _get_archive_dir(config)
+    os.makedirs(archive_dir)
+    conn = sqlite3.connect(os.path.join(archive_dir, INDEX_FILE))
+    conn.execute(
+        "CREATE TABLE server_metrics (server TEXT NOT NULL, run_ts TEXT NOT NULL, risk_score INTEGER, "
+        "risk_level TEXT, cpu_percent REAL, mem_free_gb REAL, logons_ok INTEGER, logons_failed INTEGER, "
+        "pending_security INTEGER, critical_events INTEGER, unsigned_count INTEGER, PRIMARY KEY (server, run_ts))"
+    )
+    conn.execute("INSERT INTO server_metrics (server, run_ts, risk_score) VALUES ('SRV1', '2026-01-01T00:00:00', 5)")
+    conn.commit()
+    conn.close()
+
+    archive_run(config, run_ts(), [server("SRV1", 10.0)])
+    conn = open_index(config)
+    try:
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(server_metrics)")]
+        assert columns[-2:] == ["collection_status", "fixed_points"]
+        assert conn.execute("SELECT count(*) FROM server_metrics").fetchone() == (2,)
+    finally:
+        conn.close()
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import main
+from monitor.backtest import load_candidate, load_history, merge_candidate, run_backtest
+from monitor.config_loader import ConfigError
+
+
+@pytest.fixture
+def archived(monitor_config):
+    """Una ejecución simulada archivada."""
+    main.run_daily_monitor(send_email=False, monitor_config=monitor_config)
+    return monitor_config
+
+
+def test_replay_with_current_config_matches_archived_levels(archived):
+    history = load_history(archived.raw, 90)
+    assert len(history) == 4
+
+    result = run_backtest(archived.raw, archived, days=90, verify=10)
+    reported, current = result["scenarios"][0], result["scenarios"][1]
+    assert reported["alerts"] == current["alerts"]
+    assert result["verify"]["checked"] == 4
+    assert result["verify"]["mismatches"] == []
+
+
+def test_candidate_keeps_thresholds_it_does_not_set(archived, tmp_path):
+    path = tmp_path / "candidate.json"
+    path.write_text(json.dumps({"Thresholds": {"CpuWarning": 50}}), encoding="utf-8")
+    candidate = load_candidate(archived.raw, str(path))
+
+    name = archived.raw["Servers"][0]["Name"]
+    expected = {**archived.thresholds_for(name), "CpuWarning": 50}
+    assert candidate.thresholds_for(name) == expected
+
+    result = run_backtest(archived.raw, archived, candidate, days=90, verify=4)
+    by_rule = {r["rule"]: r for r in result["rules"]}
+    assert by_rule["disk"]["actual"] == by_rule["disk"]["candidata"]
+    assert result["verify"]["mismatches"] == []
+
+
+def test_merge_candidate_groups_and_servers():
+    base = {
+        "Thresholds": {"CpuWarning": 80, "DiskFreeGBWarning": 20},
+        "ThresholdGroups": {"dc": {"CpuWarning": 90, "RamFreeGBWarning": 4}},
+        "Servers": [{"Name": "A", "Thresholds": {"CpuWarning": 70, "CpuCritical": 95}}, {"Name": "B"}],
+    }
+    raw = merge_candidate(base, {
+        "ThresholdGroups": {"dc": {"CpuWarning": 60}},
+        "Servers": [{"Name": "A", "Thresholds": {"CpuWarning": 65}}],
+    })
+    assert raw["Thresholds"] == base["Thresholds"]
+    assert raw["ThresholdGroups"]["dc"] == {"CpuWarning": 60, "RamFreeGBWarning": 4}
+    assert raw["Servers"] == [{"Name": "A", "Thresholds": {"CpuWarning": 65, "CpuCritical": 95}}, {"Name": "B"}]
+
+    with pytest.raises(ConfigError):
+        merge_candidate(base, {"Servers": [{"Name": "C"}]})
@@ -0,0 +1,62 @@
+from monitor.checkpoint import RunCheckpoint, _get_checkpoint_path, _read_checkpoint
+from monitor.service_inventory import ServiceInventoryStore
+
+RUN_TS = "2026-01-10T08:00:00"
+
+
+def test_resume_restores_completed_servers(config):
+    checkpoint = RunCheckpoint.start(config, RUN_TS)
+    checkpoint.record("SRV1", {"name": "SRV1"}, {"collect_seconds": 1.0})
+
+    resumed = RunCheckpoint.start(config, "2026-01-10T09:00:00", resume=True)
+    assert resumed.run_ts == RUN_TS
+    assert resumed.completed == {"SRV1": ({"name": "SRV1"}, {"collect_seconds": 1.0})}
+
+
+def test_resume_outside_window_starts_new_run(config):
+    RunCheckpoint.start(config, RUN_TS).record("SRV1", {"name": "SRV1"}, {})
+
+    resumed = RunCheckpoint.start(config, "2026-01-12T08:00:00", resume=True)
+    assert resumed.run_ts == "2026-01-12T08:00:00"
+    assert resumed.completed == {}
+
+
+def test_torn_last_line_is_truncated_before_appending(config):
+    checkpoint = RunCheckpoint.start(config, RUN_TS)
+    checkpoint.record("SRV1", {"name": "SRV1"}, {})
+    path = _get_checkpoint_path(config)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"name": "SRV2", "server_da')
+
+    resumed = RunCheckpoint.start(config, RUN_TS, resume=True)
+    resumed.record("SRV3", {"name": "SRV3"}, {})
+
+    _, completed, _ = _read_checkpoint(path)
+    assert sorted(completed) == ["SRV1", "SRV3"]
+
+
+def test_records_after_finish_are_ignored(config):
+    checkpoint = RunCheckpoint.start(config, RUN_TS)
+    checkpoint.finish()
+    checkpoint.record("SRV1", {"name": "SRV1"}, {})
+    assert _read_checkpoint(_get_checkpoint_path(config)) == (None, {}, {})
+
+
+def test_inventory_updates_are_replayed_on_resume(config):
+    services = [{"Name": "Spooler", "Status": "Running", "StartMode": "Auto", "PathName": "C:\\spoolsv.exe"}]
+    store = ServiceInventoryStore(config, RUN_TS)
+    store.diff("SRV1", services)
+    checkpoint = RunCheckpoint.start(config, RUN_TS)
+    checkpoint.record("SRV1", {"name": "SRV1"}, {}, inventory={"service_inventory": store.checkpoint_data("SRV1")})
+
+    # Proceso nuevo: el store arranca vacío y recibe lo guardado en el checkpoint
+    resumed = RunCheckpoint.start(config, RUN_TS, resume=True)
+    replayed = ServiceInventoryStore(config, RUN_TS)
+    for name, inventory in resumed.inventory.items():
+        replayed.replay(name, inventory["service_inventory"])
+    replayed.save()
+
+    # La línea base avanzó: la ejecución siguiente no ve cambios
+    following = ServiceInventoryStore(config, "2026-01-11T08:00:00")
+    assert following.diff("SRV1", services) == []
+    assert following.diff("SRV1", services + [{"Name": "Evil", "Status": "Running"}])[0]["Change"] == "added"
@@ -0,0 +1,54 @@
+import main
+from monitor.registry import FLEET_OUTPUTS
+from monitor.sessions import SessionCache
+
+
+def test_light_collection_does_not_reuse_fleet_outputs(monitor_config):
+    s = monitor_config.raw["Servers"][0]
+    thresholds = monitor_config.thresholds_for(s["Name"])
+    cache = SessionCache({"Transport": "simulated"})
+    try:
+        previous, _ = main.collect_server(s, {}, thresholds, depth="deep", session_cache=cache)
+        previous.update({
+            "collected_at": "2026-01-09T08:00:00",
+            "logon_campaigns": [{"kind": "source", "key": "203.0.113.5", "servers_count": 9, "attempts": 90}],
+            "capacity_forecast": [{
+                "Kind": "disk", "Key": "C:", "Status": "warning", "DaysUntilThreshold": 5, "DaysUntilFull": 9,
+            }],
+            "new_binaries": [{"Sha256": "abc", "Path": "C:\\x.exe"}],
+        })
+
+        light, _ = main.collect_server(s, {}, thresholds, depth="light", previous_snapshot=previous, session_cache=cache)
+    finally:
+        cache.close_all()
+
+    assert light["collection"] == {"status": "ok", "depth": "light", "reused_from": "2026-01-09T08:00:00"}
+    assert light["updates"] == previous["updates"]
+    for key in FLEET_OUTPUTS:
+        assert not light.get(key)
+    notes = " ".join(light["risk"]["notes"])
+    assert "campaña" not in notes and "cruza el umbral" not in notes
+
+
+def test_planner_budget_uses_the_active_collector_modes():
+    from monitor.planner import depth_cost, plan_collection
+    from monitor.remote_jobs import RemoteJobRunner
+
+    s = {"Name": "SRV1", "LogPaths": ["C:\\Logs"]}
+    plain = depth_cost("deep", s)
+    assert depth_cost("light", s, {"perf_counters": {}}) == depth_cost("light", s) - 2
+    assert depth_cost("deep", s, {"binary_index": object()}) == plain + 1
+    assert depth_cost("deep", {"Name": "SRV1"}) == plain - 1
+    jobs = RemoteJobRunner({"PollSeconds": 10, "PollIntervalSeconds": 5})
+    assert depth_cost("deep", s, {"remote_jobs": jobs}) == plain + 4
+
+    # Dos servidores sin recolección profunda previa; el presupuesto alcanza
+    # para uno con CIM/WMI y para los dos con PerfCounters
+    servers = [{"Name": "A"}, {"Name": "B"}]
+    upgrade = depth_cost("deep", servers[0]) - depth_cost("light", servers[0])
+    budget = 2 * depth_cost("light", servers[0], {"perf_counters": {}}) + 2 * upgrade
+    conf = {"Enabled": True, "MaxWinRMCalls": budget}
+    plain_plan = plan_collection(servers, {}, conf)
+    perf_plan = plan_collection(servers, {}, conf, shared={"perf_counters": {}})
+    assert [p["depth"] for p in plain_plan.values()] == ["deep", "light"]
+    assert [p["depth"] for p in perf_plan.values()] == ["deep", "deep"]
@@ -0,0 +1,48 @@
+from monitor.correlation import apply_campaigns, correlate_failed_logons, index_failed_logons
+
+CONF = {"MinServers": 3, "MinAttempts": 6, "WindowHours": 72}
+
+
+def server(name, by_source=None, depth="deep"):
+    return {
+        "name": name,
+        "collection": {"status": "ok", "depth": depth},
+        "logons": {"logons_fail_by_source": by_source or {}, "logons_fail_by_account": {}},
+    }
+
+
+def test_campaign_across_servers_in_one_run():
+    servers = [server(f"SRV{i}", {"203.0.113.5": 2, "127.0.0.1": 50}) for i in range(3)]
+    campaigns, history = correlate_failed_logons(servers, None, CONF, "2026-01-10T08:00:00")
+
+    assert [(c["kind"], c["key"], c["servers_count"], c["attempts"]) for c in campaigns] == [
+        ("source", "203.0.113.5", 3, 6)
+    ]
+    assert [h["run_ts"] for h in history] == ["2026-01-10T08:00:00"]
+    assert apply_campaigns(servers, campaigns) == {"SRV0", "SRV1", "SRV2"}
+
+
+def test_previous_runs_inside_the_window_are_merged_with_max():
+    first = [server("SRV0", {"203.0.113.5": 3}), server("SRV1", {"203.0.113.5": 3})]
+    _, history = correlate_failed_logons(first, None, CONF, "2026-01-10T08:00:00")
+
+    second = [server("SRV0", {"203.0.113.5": 1}), server("SRV2", {"203.0.113.5": 2})]
+    campaigns, history = correlate_failed_logons(second, history, CONF, "2026-01-11T08:00:00")
+    assert campaigns[0]["servers"] == ["SRV0", "SRV1", "SRV2"]
+    assert campaigns[0]["attempts"] == 3 + 3 + 2
+    assert len(history) == 2
+
+
+def test_runs_older_than_the_window_are_dropped():
+    first = [server("SRV0", {"203.0.113.5": 3}), server("SRV1", {"203.0.113.5": 3})]
+    _, history = correlate_failed_logons(first, None, CONF, "2026-01-10T08:00:00")
+
+    second = [server("SRV2", {"203.0.113.5": 3})]
+    campaigns, history = correlate_failed_logons(second, history, CONF, "2026-01-14T08:00:00")
+    assert campaigns == []
+    assert [h["run_ts"] for h in history] == ["2026-01-14T08:00:00"]
+
+
+def test_light_collections_are_not_indexed_again():
+    servers = [server("SRV0", {"203.0.113.5": 3}, depth="light"), server("SRV1", {"203.0.113.5": 3})]
+    assert index_failed_logons(servers)["source"] == {"203.0.113.5": {"SRV1": 3}}
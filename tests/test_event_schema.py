@@ -0,0 +1,50 @@
+from monitor.event_schema import EVENT_SCHEMAS, extract_fields
+from monitor.simulated_host import _logon_properties
+
+
+def test_failed_logon_fields_come_from_their_eventdata_positions():
+    fields = extract_fields({"Id": 4625, "Properties": _logon_properties(4625, "admin", "10.0.0.7")})
+
+    assert fields["TargetUserName"] == "admin"
+    assert fields["TargetDomainName"] == "CORP"
+    assert fields["IpAddress"] == "10.0.0.7"
+    assert fields["IpPort"] == "50123"
+    assert fields["LogonType"] == 3
+    assert fields["WorkstationName"] == "WS01"
+    # NTSTATUS en decimal -> hex; el SubStatus explica el motivo
+    assert fields["Status"] == "0xC000006D"
+    assert fields["SubStatus"] == "0xC000006A"
+    assert fields["FailureReason"] == "Contraseña incorrecta"
+
+
+def test_successful_logon_fields():
+    fields = extract_fields({"Id": 4624, "Properties": _logon_properties(4624, "svc_backup", "10.0.0.8")})
+    assert fields == {
+        "TargetUserName": "svc_backup",
+        "TargetDomainName": "CORP",
+        "LogonType": 3,
+        "WorkstationName": "WS01",
+        "IpAddress": "10.0.0.8",
+        "IpPort": "50123",
+    }
+
+
+def test_every_schema_position_is_read():
+    for event_id, schema in EVENT_SCHEMAS.items():
+        props = [f"v{i}" for i in range(max(schema.values()) + 1)]
+        fields = extract_fields({"Id": event_id, "Properties": props})
+        for name, position in schema.items():
+            if name not in ("LogonType", "Status", "SubStatus", "FailureReason"):
+                assert fields[name] == f"v{position}"
+
+
+def test_short_properties_and_empty_values():
+    props = _logon_properties(4625, "admin", "-")[:12]
+    fields = extract_fields({"Id": 4625, "Properties": props})
+    assert fields["TargetUserName"] == "admin"
+    assert "IpAddress" not in fields and "WorkstationName" not in fields
+
+
+def test_unknown_event_or_missing_properties():
+    assert extract_fields({"Id": 4634, "Properties": ["a"]}) == {}
+    assert extract_fields({"Id": 4625}) == {}
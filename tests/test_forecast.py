@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from monitor.forecast import ForecastStore, forecast_fleet
+
+
+def day(n: int) -> str:
+    return (datetime(2026, 1, 1) + timedelta(days=n)).isoformat()
+
+
+def test_linear_series_without_decay_gives_exact_slope(config):
+    store = ForecastStore(config, half_life_days=0)
+    for n in range(1, 6):
+        store.observe("SRV1", "disk", "C:", day(n), 100.0 - 2.0 * n)
+
+    slope, last, points = store.trend("SRV1", "disk", "C:")
+    assert slope == pytest.approx(-2.0)
+    assert last == pytest.approx(90.0)
+    assert points == 5
+
+
+def test_repeated_run_ts_is_ignored(config):
+    store = ForecastStore(config, half_life_days=0)
+    store.observe("SRV1", "disk", "C:", day(1), 100.0)
+    store.observe("SRV1", "disk", "C:", day(2), 98.0)
+    store.observe("SRV1", "disk", "C:", day(2), 10.0)
+    assert store.trend("SRV1", "disk", "C:")[1:] == (98.0, 2)
+
+
+def test_decay_follows_the_recent_trend(config):
+    # 30 días estables y luego 10 días consumiendo 3 GB por día
+    values = [100.0] * 30 + [100.0 - 3.0 * n for n in range(1, 11)]
+    flat = ForecastStore(config, half_life_days=0)
+    recent = ForecastStore(config, half_life_days=3)
+    for n, value in enumerate(values):
+        flat.observe("SRV1", "disk", "C:", day(n), value)
+        recent.observe("SRV1", "disk", "C:", day(n), value)
+
+    flat_slope = flat.trend("SRV1", "disk", "C:")[0]
+    recent_slope = recent.trend("SRV1", "disk", "C:")[0]
+    assert -3.0 < recent_slope < -2.0
+    assert recent_slope < flat_slope < 0
+
+
+def test_series_survive_save_and_reload(config):
+    store = ForecastStore(config, half_life_days=30)
+    for n in range(1, 5):
+        store.observe("SRV1", "disk", "C:", day(n), 50.0 - n)
+    store.save()
+
+    reloaded = ForecastStore(config, half_life_days=30)
+    assert reloaded.trend("SRV1", "disk", "C:") == pytest.approx(store.trend("SRV1", "disk", "C:"))
+
+
+def test_forecast_fleet_flags_disks_crossing_the_threshold(config):
+    store = ForecastStore(config, half_life_days=0)
+    thresholds = {"DiskFreeGBWarning": 20, "CapacityDaysWarning": 30}
+    servers = []
+    for n in range(1, 5):
+        servers = [{
+            "name": "SRV1",
+            "collection": {"status": "ok", "depth": "light"},
+            "resources": {"disk": [{"DeviceID": "c:", "FreeGB": 60.0 - 5.0 * n}]},
+        }]
+        flagged = forecast_fleet(servers, store, day(n), lambda name: thresholds, min_points=3)
+
+    assert flagged == {"SRV1"}
+    entry = servers[0]["capacity_forecast"][0]
+    assert entry["Key"] == "C:" and entry["Status"] == "warning"
+    assert entry["DaysUntilThreshold"] == pytest.approx(4.0)
+    assert entry["DaysUntilFull"] == pytest.approx(8.0)
@@ -0,0 +1,30 @@
+from monitor.models import Event, LogonSummary
+
+
+def test_event_round_trip_keeps_only_source_keys():
+    sample = {"TimeCreated": "2026-01-10T08:00:00", "TargetUserName": "admin", "IpAddress": "10.0.0.7"}
+    assert Event.from_dict(sample).to_dict() == sample
+
+
+def test_full_event_round_trip():
+    event = {
+        "TimeCreated": "2026-01-10T08:00:00",
+        "Id": 4625,
+        "LevelDisplayName": "Information",
+        "ProviderName": "Microsoft-Windows-Security-Auditing",
+        "Message": "An account failed to log on.",
+        "LogonType": 3,
+    }
+    assert Event.from_dict(event).to_dict() == event
+
+
+def test_logon_summary_round_trip():
+    d = {
+        "logons_ok_count": 5,
+        "logons_fail_count": 1,
+        "logons_fail_samples": [{"TimeCreated": "2026-01-10T08:00:00", "TargetUserName": "admin"}],
+        "logons_fail_by_source": {"10.0.0.7": 1},
+        "logons_fail_by_account": {"admin": 1},
+        "logons_fail_by_type": {"3": 1},
+    }
+    assert LogonSummary.from_dict(d).to_dict() == d
@@ -0,0 +1,29 @@
+import os
+import threading
+
+from monitor.profiling import RunProfiler, stage
+
+
+def _parse_in_worker_thread():
+    return sum(i * i for i in range(20000))
+
+
+def test_cprofile_includes_worker_threads(tmp_path):
+    profiler = RunProfiler(str(tmp_path), interval_ms=1)
+    profiler.start()
+    try:
+        with stage("collect"):
+            threads = [threading.Thread(target=_parse_in_worker_thread, name=f"check-{i}") for i in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+    finally:
+        profiler.stop()
+    summary = profiler.write_reports()
+
+    with open(tmp_path / "cprofile.txt", encoding="utf-8") as f:
+        assert "_parse_in_worker_thread" in f.read()
+    for name in ("stacks.collapsed", "profile.speedscope.json", "cprofile.pstats", "allocations.txt", "summary.json"):
+        assert os.path.exists(tmp_path / name)
+    assert "collect" in str(summary)
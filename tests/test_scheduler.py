@@ -0,0 +1,27 @@
+import threading
+
+from monitor.scheduler import run_scheduled
+
+
+def test_late_result_is_skipped_and_never_accepted():
+    servers = [{"Name": "FAST"}, {"Name": "SLOW"}]
+    release = threading.Event()
+    accepted = []
+
+    def collect(s):
+        if s["Name"] == "SLOW":
+            release.wait(5)
+        return s["Name"] + "-ok"
+
+    results = run_scheduled(
+        servers, {}, {"MaxParallelHosts": 2, "RunDeadlineMinutes": 0.002},
+        collect, lambda s: s["Name"] + "-skipped",
+        accept_fn=lambda s, result: accepted.append(s["Name"]),
+    )
+    release.set()
+    for t in threading.enumerate():
+        if t.name.startswith("collector_"):
+            t.join(5)
+
+    assert results == {"FAST": "FAST-ok", "SLOW": "SLOW-skipped"}
+    assert accepted == ["FAST"]
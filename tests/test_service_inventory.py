@@ -0,0 +1,22 @@
+from monitor.service_inventory import ServiceInventoryStore
+
+RUN_TS = "2026-01-10T08:00:00"
+
+SPOOLER = {"Name": "Spooler", "Status": "Running", "StartMode": "Auto", "PathName": "C:\\spoolsv.exe"}
+
+
+def test_status_flip_is_not_a_change(config):
+    store = ServiceInventoryStore(config, RUN_TS)
+    store.diff("SRV1", [SPOOLER])
+
+    assert store.diff("SRV1", [{**SPOOLER, "Status": "Stopped"}]) == []
+
+
+def test_start_mode_and_path_changes_are_reported(config):
+    store = ServiceInventoryStore(config, RUN_TS)
+    store.diff("SRV1", [SPOOLER])
+
+    changes = store.diff("SRV1", [{**SPOOLER, "Status": "Stopped", "StartMode": "Manual", "PathName": "C:\\evil.exe"}])
+    assert len(changes) == 1
+    assert changes[0]["Change"] == "changed"
+    assert sorted(changes[0]["Fields"]) == ["PathHash", "StartMode"]
@@ -0,0 +1,142 @@
+import argparse
+import json
+import threading
+import time
+
+import pytest
+
+import main
+import monitor.config_loader as config_loader
+from monitor.config_loader import ConfigError, validate_config
+from monitor.work_queue import WorkQueue, run_queued
+
+SERVERS = [{"Name": "SRV1"}, {"Name": "SRV2"}]
+
+
+def make_queue(config, **overrides):
+    config["WorkQueue"].update(overrides)
+    return WorkQueue(config)
+
+
+def test_claim_complete_and_finished(config):
+    queue = make_queue(config)
+    assert queue.enqueue("r1", [("SRV1", {"depth": "deep"}), ("SRV2", {"depth": "light"})]) == 2
+
+    job = queue.claim("w1")
+    assert job["server"] == "SRV1" and job["payload"] == {"depth": "deep"} and job["attempts"] == 1
+    assert queue.claim("w2", servers=["SRV1"]) is None
+    assert queue.complete(job, "w1", {"server_data": {"name": "SRV1"}, "new_state": {}})
+
+    assert queue.finished("r1", ["SRV1", "SRV2"]) == {
+        "SRV1": ("done", {"server_data": {"name": "SRV1"}, "new_state": {}}, None)
+    }
+
+
+def test_expired_lease_is_reclaimed_and_stale_result_dropped(config):
+    queue = make_queue(config, LeaseSeconds=0.05)
+    queue.enqueue("r1", [("SRV1", {})])
+    stale = queue.claim("dead")
+    time.sleep(0.1)
+
+    job = queue.claim("w1")
+    assert job["server"] == "SRV1" and job["attempts"] == 2
+    assert not queue.complete(stale, "dead", {"server_data": {}, "new_state": {}})
+    assert queue.complete(job, "w1", {"server_data": {}, "new_state": {}})
+
+
+def test_failed_jobs_are_retried_until_max_attempts(config):
+    queue = make_queue(config, MaxAttempts=2)
+    queue.enqueue("r1", [("SRV1", {})])
+    queue.fail(queue.claim("w1"), "w1", "boom")
+    queue.fail(queue.claim("w1"), "w1", "boom again")
+
+    assert queue.claim("w1") is None
+    assert queue.finished("r1", ["SRV1"]) == {"SRV1": ("failed", None, "boom again")}
+
+
+def test_expired_lease_after_last_attempt_is_failed(config):
+    queue = make_queue(config, LeaseSeconds=0.05, MaxAttempts=1)
+    queue.enqueue("r1", [("SRV1", {})])
+    queue.claim("dead")
+    time.sleep(0.1)
+
+    assert queue.expire("r1") == 1
+    assert queue.finished("r1", ["SRV1"])["SRV1"][0] == "failed"
+
+
+def test_enqueue_keeps_jobs_of_other_running_coordinators(config):
+    queue = make_queue(config)
+    queue.enqueue("r1", [("SRV1", {})])
+    job = queue.claim("w1")
+    queue.complete(job, "w1", {"server_data": {"name": "SRV1"}, "new_state": {}})
+
+    queue.enqueue("r2", [("SRV1", {})])
+    assert queue.finished("r1", ["SRV1"])["SRV1"][0] == "done"
+
+
+def test_run_queued_ends_when_no_worker_claims_a_job(config):
+    queue = make_queue(config, ClaimTimeoutSeconds=0.2)
+    results = run_queued(
+        queue, "r1", SERVERS, {}, {},
+        payload_fn=lambda s: {},
+        failed_fn=lambda s, error: ("failed", error),
+        skipped_fn=lambda s: ("skipped", None),
+        poll_seconds=0.05,
+    )
+    assert {name: r[0] for name, r in results.items()} == {"SRV1": "failed", "SRV2": "failed"}
+
+
+def test_run_queued_merges_worker_results(config):
+    queue = make_queue(config)
+    done = []
+
+    # Otro proceso ya dejó el resultado de SRV1; SRV2 viene del checkpoint
+    queue.enqueue("r1", [("SRV1", {})])
+    job = queue.claim("w1")
+    queue.complete(job, "w1", {"server_data": {"name": "SRV1"}, "new_state": {"x": 1}})
+
+    results = run_queued(
+        queue, "r1", SERVERS, {}, {},
+        payload_fn=lambda s: {},
+        failed_fn=lambda s, error: ("failed", error),
+        skipped_fn=lambda s: ("skipped", None),
+        done_fn=lambda name, server_data, new_state: done.append(name),
+        poll_seconds=0.05,
+        completed={"SRV2": ({"name": "SRV2"}, {})},
+    )
+    assert results == {"SRV1": ({"name": "SRV1"}, {"x": 1}), "SRV2": ({"name": "SRV2"}, {})}
+    assert done == ["SRV1"]
+
+
+def test_queue_mode_rejects_run_local_inventories(config):
+    config["WorkQueue"]["Enabled"] = True
+    config["ServiceInventory"] = {"Enabled": True}
+    with pytest.raises(ConfigError, match="ServiceInventory"):
+        validate_config(config)
+
+
+def test_worker_fails_when_one_loop_raises(config, tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    monkeypatch.setattr(config_loader, "CONFIG_PATH", str(path))
+
+    def claim(self, worker, servers=None):
+        if threading.current_thread().name.endswith("_1"):
+            raise RuntimeError("cola no disponible")
+        return None
+
+    monkeypatch.setattr(WorkQueue, "claim", claim)
+    args = argparse.Namespace(id="w1", parallel=3, once=False)
+    errors = []
+
+    def run():
+        try:
+            main.run_worker(args)
+        except RuntimeError as ex:
+            errors.append(ex)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ["cola no disponible"]